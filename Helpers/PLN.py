@@ -234,6 +234,39 @@ class PLN:
         
         return df
     
+    def cargar_modelo_embeddings(self):
+        """Carga solo el modelo de embeddings (sin spaCy), p. ej. para indexar o buscar"""
+        if self.model_embeddings is None:
+            print("Cargando modelo de embeddings...")
+            self.model_embeddings = SentenceTransformer(self.modelo_embeddings_nombre)
+            print(f"Modelo de embeddings '{self.modelo_embeddings_nombre}' cargado correctamente")
+        return self.model_embeddings
+
+    def generar_embeddings(self, textos: List[str], tam_lote: int = 32,
+                           normalizar: bool = True) -> List[List[float]]:
+        """
+        Genera los embeddings de una lista de textos en lotes.
+        
+        Args:
+            textos: Textos a vectorizar (el modelo trunca cada uno a su longitud máxima)
+            tam_lote: Textos por lote del modelo
+            normalizar: Vectores de norma 1 (permite similitud dot_product en Elastic)
+            
+        Returns:
+            Lista de vectores (listas de float)
+        """
+        if not self.model_embeddings:
+            raise ValueError("Modelo de embeddings no está cargado. Llama a cargar_modelo_embeddings() primero.")
+        
+        if not textos:
+            return []
+        
+        embeddings = self.model_embeddings.encode(textos, batch_size=tam_lote,
+                                                  normalize_embeddings=normalizar,
+                                                  convert_to_numpy=True,
+                                                  show_progress_bar=False)
+        return embeddings.astype(np.float32).tolist()
+    
     def preprocesar_texto(self, texto: str, 
                           remover_stopwords: bool = True,
                           lematizar: bool = True,
@@ -1,5 +1,16 @@
 from .mongoDB import MongoDB
 from .funciones import Funciones
+from .indexadorBulk import IndexadorBulk
 from .elastic import ElasticSearch
+from .fronteraURL import FronteraURL
 from .webScraping import WebScraping
-__all__ = ['MongoDB', 'Funciones', 'ElasticSearch', 'WebScraping']
\ No newline at end of file
+from .extraccionParalela import ExtraccionParalela
+from .manifiestoCrawl import ManifiestoCrawl
+from .pipelineIngesta import PipelineIngesta
+from .deduplicacion import DetectorDuplicados
+from .cacheConsultas import CacheConsultas
+from .indiceVectorial import IndiceVectorial
+from .buscadorLocal import BuscadorLocal
+from .trabajos import GestorTrabajos, Trabajo, TrabajoCancelado
+__all__ = ['MongoDB', 'Funciones', 'ElasticSearch', 'IndexadorBulk', 'WebScraping', 'FronteraURL', 'ExtraccionParalela', 'ManifiestoCrawl',
+           'PipelineIngesta', 'DetectorDuplicados', 'CacheConsultas', 'IndiceVectorial', 'BuscadorLocal', 'GestorTrabajos', 'Trabajo', 'TrabajoCancelado']
\ No newline at end of file
@@ -0,0 +1,966 @@
+import calendar
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+from Helpers.funciones import Funciones
+
+
+# Palabras vacías del analizador 'spanish' (lista de Snowball, como en Elastic)
+PALABRAS_VACIAS = frozenset("""
+de la que el en y a los del se las por un para con no una su al lo como más pero sus le ya o
+este sí porque esta entre cuando muy sin sobre también me hasta hay donde quien desde todo nos
+durante todos uno les ni contra otros ese eso ante ellos e esto mí antes algunos qué unos yo
+otro otras otra él tanto esa estos mucho quienes nada muchos cual poco ella estar estas algunas
+algo nosotros mi mis tú te ti tu tus ellas nosotras vosotros vosotras os mío mía míos mías tuyo
+tuya tuyos tuyas suyo suya suyos suyas nuestro nuestra nuestros nuestras vuestro vuestra
+vuestros vuestras esos esas estoy estás está estamos estáis están esté estés estemos estéis
+estén estaré estarás estará estaremos estaréis estarán estaría estarías estaríamos estaríais
+estarían estaba estabas estábamos estabais estaban estuve estuviste estuvo estuvimos
+estuvisteis estuvieron estuviera estuvieras estuviéramos estuvierais estuvieran estuviese
+estuvieses estuviésemos estuvieseis estuviesen estando estado estada estados estadas estad he
+has ha hemos habéis han haya hayas hayamos hayáis hayan habré habrás habrá habremos habréis
+habrán habría habrías habríamos habríais habrían había habías habíamos habíais habían hube
+hubiste hubo hubimos hubisteis hubieron hubiera hubieras hubiéramos hubierais hubieran
+hubiese hubieses hubiésemos hubieseis hubiesen habiendo habido habida habidos habidas soy
+eres es somos sois son sea seas seamos seáis sean seré serás será seremos seréis serán sería
+serías seríamos seríais serían era eras éramos erais eran fui fuiste fue fuimos fuisteis
+fueron fuera fueras fuéramos fuerais fueran fuese fueses fuésemos fueseis fuesen siendo sido
+tengo tienes tiene tenemos tenéis tienen tenga tengas tengamos tengáis tengan tendré tendrás
+tendrá tendremos tendréis tendrán tendría tendrías tendríamos tendríais tendrían tenía tenías
+teníamos teníais tenían tuve tuviste tuvo tuvimos tuvisteis tuvieron tuviera tuvieras
+tuviéramos tuvierais tuvieran tuviese tuvieses tuviésemos tuvieseis tuviesen teniendo tenido
+tenida tenidos tenidas tened
+""".split())
+
+_SIN_TILDES = str.maketrans("àáâäòóôöèéêëùúûüìíîï", "aaaaooooeeeeuuuuiiii")
+
+
+class _EstadoIndice:
+    """Lo que se mantiene en memoria de un índice: ids, documentos vigentes, longitudes y valores"""
+
+    def __init__(self):
+        self.ids: List[str] = []
+        self.num_de: Dict[str, int] = {}
+        self.hash_de: Dict[str, str] = {}
+        self.vivos = np.zeros(0, dtype=bool)
+        self.longitudes: Dict[str, np.ndarray] = {}
+        self.valores: Dict[str, Dict[int, list]] = {}
+        self.postings: "OrderedDict[Tuple[str, str, bool], Tuple[np.ndarray, ...]]" = OrderedDict()
+        self.comparables: Dict[str, Dict[int, list]] = {}
+        self.lock = threading.RLock()
+
+    @property
+    def borrados(self) -> int:
+        """Documentos reemplazados o eliminados que siguen en disco hasta optimizar()"""
+        return sum(1 for i in self.ids if i) - int(self.vivos.sum())
+
+    def crecer(self, n: int):
+        if n > len(self.vivos):
+            self.vivos = np.concatenate([self.vivos, np.zeros(n - len(self.vivos), dtype=bool)])
+            for campo, largos in self.longitudes.items():
+                self.longitudes[campo] = np.concatenate([largos, np.zeros(n - len(largos), dtype=np.int32)])
+
+
+class BuscadorLocal:
+    """
+    Motor de búsqueda full-text embebido (BM25) para desarrollo, pruebas y
+    respaldo cuando Elasticsearch no está disponible. Responde con la misma
+    interfaz que ElasticSearch.buscar / buscar_texto y entiende el subconjunto
+    de la DSL que usa la aplicación: match, match_phrase (con slop),
+    multi_match, query_string, bool, term(s), range (con date math), exists,
+    ids y match_all, y agregaciones terms, date_histogram y cardinality.
+
+    El análisis imita al analizador 'spanish' de Elastic: palabras Unicode en
+    minúsculas, palabras vacías (que conservan su posición) y el stemmer
+    light_spanish. Cada índice es un SQLite con una lista invertida por
+    término y segmento: documentos, frecuencias y posiciones codificados con
+    deltas en el entero más chico posible y comprimidos con zlib. Las
+    posiciones solo se decodifican para las frases.
+
+    Los segmentos se agregan a medida que llegan documentos (ver reflejar),
+    así que el índice se construye desde el mismo flujo de ingesta.
+    """
+
+    # Campos analizados como texto; los escalares de hasta 256 caracteres
+    # se guardan además como valores exactos (term, range, facetas)
+    CAMPOS_TEXTO = ('texto_completo', 'texto', 'contenido', 'titulo', 'nombre_archivo')
+    MAX_CARACTERES_VALOR = 256
+    # Campos que cambian en cada carga sin que cambie el documento
+    CAMPOS_VOLATILES = ('fecha', 'hash_contenido', 'indexado_en')
+
+    def __init__(self, ruta: str = "cache/buscador_local", campos_texto: Iterable[str] = None,
+                 obtener_id: Callable[[Dict], str] = None, k1: float = 1.2, b: float = 0.75,
+                 max_postings_cache: int = 4096, max_proporcion_borrados: Optional[float] = 0.3):
+        """
+        Args:
+            ruta: Carpeta con un archivo SQLite por índice
+            campos_texto: Campos analizados (por defecto CAMPOS_TEXTO)
+            obtener_id: _id de cada documento (por defecto 'id_documento' o hash del documento)
+            k1, b: Parámetros de BM25 (los de Elastic por defecto)
+            max_postings_cache: Listas invertidas decodificadas en memoria por índice
+            max_proporcion_borrados: Al terminar indexar()/reflejar(), optimizar() si los
+                documentos borrados superan esta fracción de los guardados (None: nunca)
+        """
+        self.ruta = ruta
+        self.campos_texto = tuple(campos_texto or self.CAMPOS_TEXTO)
+        self.obtener_id = obtener_id or self._id_por_defecto
+        self.k1 = k1
+        self.b = b
+        self.max_postings_cache = max_postings_cache
+        self.max_proporcion_borrados = max_proporcion_borrados
+        self._estados: Dict[str, _EstadoIndice] = {}
+        self._lock = threading.Lock()
+        os.makedirs(ruta, exist_ok=True)
+
+    @staticmethod
+    def _id_por_defecto(documento: Dict) -> str:
+        return documento.get('id_documento') or Funciones.calcular_hash_texto(
+            json.dumps(documento, sort_keys=True, ensure_ascii=False, default=str))
+
+    @classmethod
+    def hash_documento(cls, documento: Dict) -> str:
+        """Hash del documento sin campos volátiles: si no cambió, no se vuelve a escribir"""
+        estable = {k: v for k, v in documento.items() if k not in cls.CAMPOS_VOLATILES}
+        return Funciones.calcular_hash_texto(
+            json.dumps(estable, sort_keys=True, ensure_ascii=False, default=str))
+
+    # ------------------------------------------------------------------
+    # Análisis
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def raiz(palabra: str) -> str:
+        """Stemmer light_spanish (SpanishLightStemmer de Lucene)"""
+        if len(palabra) < 5:
+            return palabra
+        palabra = palabra.translate(_SIN_TILDES)
+        final = palabra[-1]
+        if final in 'oae':
+            return palabra[:-1]
+        if final == 's':
+            if palabra.endswith('eses'):
+                return palabra[:-2]
+            if palabra.endswith('ces'):
+                return palabra[:-3] + 'z'
+            if palabra[-2] in 'oae':
+                return palabra[:-2]
+        return palabra
+
+    @classmethod
+    def analizar(cls, texto: str) -> List[Tuple[str, int]]:
+        """
+        Términos (raíz, posición) de un texto. Las palabras vacías se omiten
+        pero ocupan su posición, como en Elastic, así que las frases respetan
+        la distancia original
+        """
+        return [(cls.raiz(palabra), posicion)
+                for posicion, palabra in enumerate(re.findall(r'\w+', str(texto).lower()))
+                if palabra not in PALABRAS_VACIAS]
+
+    # ------------------------------------------------------------------
+    # Almacenamiento
+    # ------------------------------------------------------------------
+
+    def _ruta_db(self, index: str) -> str:
+        nombre = re.sub(r'[^\w.-]', '_', index)
+        return os.path.join(self.ruta, f"{nombre}.db")
+
+    @contextmanager
+    def _conexion(self, index: str):
+        """Abre una conexión propia, confirma y la cierra"""
+        conn = sqlite3.connect(self._ruta_db(index), timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _crear_tablas(conn: sqlite3.Connection):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS documentos (
+                num INTEGER PRIMARY KEY,
+                id TEXT NOT NULL,
+                vivo INTEGER NOT NULL,
+                fuente BLOB NOT NULL,
+                hash TEXT
+            )
+        """)
+        # Índices creados antes de guardar el hash de cada documento
+        if 'hash' not in {columna[1] for columna in conn.execute("PRAGMA table_info(documentos)")}:
+            conn.execute("ALTER TABLE documentos ADD COLUMN hash TEXT")
+        conn.execute("CREATE TABLE IF NOT EXISTS longitudes (num INTEGER, campo TEXT, largo INTEGER)")
+        conn.execute("CREATE TABLE IF NOT EXISTS valores (num INTEGER, campo TEXT, valor TEXT)")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS postings (
+                campo TEXT NOT NULL,
+                termino TEXT NOT NULL,
+                segmento INTEGER NOT NULL,
+                docs BLOB NOT NULL,
+                frecuencias BLOB NOT NULL,
+                posiciones BLOB NOT NULL,
+                PRIMARY KEY (campo, termino, segmento)
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def _comprimir(valores, delta: bool = False) -> bytes:
+        """Enteros no negativos con deltas opcionales, en el tipo más chico posible + zlib"""
+        arr = np.asarray(valores, dtype=np.int64)
+        if delta:
+            arr = np.diff(arr, prepend=0)
+        maximo = int(arr.max()) if len(arr) else 0
+        tipo = np.uint8 if maximo < 1 << 8 else np.uint16 if maximo < 1 << 16 else np.uint32
+        return bytes([np.dtype(tipo).itemsize]) + zlib.compress(arr.astype(tipo).tobytes(), 1)
+
+    @staticmethod
+    def _descomprimir(datos: bytes, delta: bool = False) -> np.ndarray:
+        tipo = {1: np.uint8, 2: np.uint16, 4: np.uint32}[datos[0]]
+        arr = np.frombuffer(zlib.decompress(datos[1:]), dtype=tipo).astype(np.int64)
+        return np.cumsum(arr) if delta else arr
+
+    @staticmethod
+    def _inicios(frecuencias: np.ndarray) -> np.ndarray:
+        """Primera posición de cada documento dentro de la lista plana de posiciones"""
+        return np.concatenate([[0], np.cumsum(frecuencias)[:-1]]).astype(np.int64)
+
+    @classmethod
+    def _codificar_posiciones(cls, posiciones, frecuencias) -> bytes:
+        """Posiciones de varios documentos seguidas, con deltas que se reinician en cada documento"""
+        arr = np.asarray(posiciones, dtype=np.int64)
+        deltas = np.diff(arr, prepend=0)
+        inicios = cls._inicios(frecuencias)
+        deltas[inicios] = arr[inicios]
+        return cls._comprimir(deltas)
+
+    @classmethod
+    def _decodificar_posiciones(cls, datos: bytes, frecuencias: np.ndarray) -> np.ndarray:
+        acumulado = np.cumsum(cls._descomprimir(datos))
+        base = np.concatenate([[0], acumulado])[cls._inicios(frecuencias)]
+        return acumulado - np.repeat(base, frecuencias)
+
+    def _estado(self, index: str) -> _EstadoIndice:
+        """Estado en memoria del índice (se carga del SQLite la primera vez)"""
+        with self._lock:
+            estado = self._estados.get(index)
+            if estado is not None:
+                return estado
+            estado = _EstadoIndice()
+            with self._conexion(index) as conn:
+                self._crear_tablas(conn)
+                filas = conn.execute("SELECT num, id, vivo, hash FROM documentos ORDER BY num").fetchall()
+                n = (filas[-1][0] + 1) if filas else 0
+                estado.ids = [''] * n
+                estado.crecer(n)
+                for num, doc_id, vivo, hash_doc in filas:
+                    estado.ids[num] = doc_id
+                    if vivo:
+                        estado.vivos[num] = True
+                        estado.num_de[doc_id] = num
+                        if hash_doc:
+                            estado.hash_de[doc_id] = hash_doc
+                for num, campo, largo in conn.execute("SELECT num, campo, largo FROM longitudes"):
+                    estado.longitudes.setdefault(campo, np.zeros(n, dtype=np.int32))[num] = largo
+                for num, campo, valor in conn.execute("SELECT num, campo, valor FROM valores"):
+                    estado.valores.setdefault(campo, {}).setdefault(num, []).append(json.loads(valor))
+            self._estados[index] = estado
+            return estado
+
+    # ------------------------------------------------------------------
+    # Indexación
+    # ------------------------------------------------------------------
+
+    def _valores_exactos(self, documento: Dict) -> Iterator[Tuple[str, object]]:
+        for campo, valor in documento.items():
+            for v in (valor if isinstance(valor, list) else [valor]):
+                if isinstance(v, (bool, int, float)) or (isinstance(v, str) and len(v) <= self.MAX_CARACTERES_VALOR):
+                    yield campo, v
+
+    def indexar(self, index: str, documentos: Iterable[Dict], tam_segmento: int = 500) -> Dict:
+        """
+        Indexa documentos en segmentos de hasta tam_segmento. Un _id que ya
+        existe se reemplaza (el documento anterior queda marcado como borrado
+        hasta optimizar()), salvo que no haya cambiado.
+
+        Returns:
+            Dict con 'success', 'indexados' (escritos) y 'segmentos'
+        """
+        try:
+            conteo = {'indexados': 0, 'segmentos': 0}
+            lote = []
+            for documento in documentos:
+                lote.append(documento)
+                if len(lote) >= tam_segmento:
+                    conteo['indexados'] += self._escribir_segmento(index, lote)
+                    conteo['segmentos'] += 1
+                    lote = []
+            if lote:
+                conteo['indexados'] += self._escribir_segmento(index, lote)
+                conteo['segmentos'] += 1
+            self._optimizar_si_conviene(index)
+            return {'success': True, **conteo}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def _escribir_segmento(self, index: str, documentos: List[Dict]) -> int:
+        """Escribe un segmento y devuelve cuántos documentos escribió (los que no cambiaron se omiten)"""
+        estado = self._estado(index)
+        with estado.lock:
+            inicio = len(estado.ids)
+            invertido: Dict[Tuple[str, str], Dict[int, List[int]]] = {}
+            filas_docs, filas_largos, filas_valores, reemplazados = [], [], [], []
+            en_segmento: Dict[str, int] = {}
+            hashes_segmento: Dict[str, str] = {}
+
+            for documento in documentos:
+                doc_id = self.obtener_id(documento)
+                hash_doc = self.hash_documento(documento)
+                # Reescribir un documento igual solo dejaría una fila muerta más
+                if hashes_segmento.get(doc_id, estado.hash_de.get(doc_id)) == hash_doc:
+                    continue
+                num = inicio + len(filas_docs)
+                anterior = en_segmento.get(doc_id, estado.num_de.get(doc_id))
+                if anterior is not None:
+                    reemplazados.append(anterior)
+                en_segmento[doc_id] = num
+                hashes_segmento[doc_id] = hash_doc
+                filas_docs.append((num, doc_id, 1, zlib.compress(
+                    json.dumps(documento, ensure_ascii=False, default=str).encode('utf-8')), hash_doc))
+                for campo in self.campos_texto:
+                    if not documento.get(campo):
+                        continue
+                    terminos = self.analizar(documento[campo])
+                    filas_largos.append((num, campo, len(terminos)))
+                    for termino, posicion in terminos:
+                        invertido.setdefault((campo, termino), {}).setdefault(num, []).append(posicion)
+                filas_valores.extend((num, campo, json.dumps(v, ensure_ascii=False))
+                                     for campo, v in self._valores_exactos(documento))
+
+            filas_postings = []
+            for (campo, termino), por_doc in invertido.items():
+                nums = sorted(por_doc)
+                frecuencias = [len(por_doc[n]) for n in nums]
+                posiciones = [p for n in nums for p in por_doc[n]]
+                filas_postings.append((campo, termino, inicio, self._comprimir(nums, delta=True),
+                                       self._comprimir(frecuencias),
+                                       self._codificar_posiciones(posiciones, frecuencias)))
+
+            if not filas_docs:
+                return 0
+
+            with self._conexion(index) as conn:
+                conn.executemany("INSERT INTO documentos (num, id, vivo, fuente, hash) VALUES (?, ?, ?, ?, ?)",
+                                 filas_docs)
+                conn.executemany("INSERT INTO longitudes VALUES (?, ?, ?)", filas_largos)
+                conn.executemany("INSERT INTO valores VALUES (?, ?, ?)", filas_valores)
+                conn.executemany("INSERT INTO postings VALUES (?, ?, ?, ?, ?, ?)", filas_postings)
+                conn.executemany("UPDATE documentos SET vivo = 0 WHERE num = ?",
+                                 [(n,) for n in reemplazados])
+
+            # El estado en memoria se actualiza solo después de confirmar en SQLite
+            estado.crecer(inicio + len(filas_docs))
+            for num, doc_id, _, _, hash_doc in filas_docs:
+                estado.ids.append(doc_id)
+                estado.vivos[num] = True
+                estado.num_de[doc_id] = num
+                estado.hash_de[doc_id] = hash_doc
+            estado.vivos[reemplazados] = False
+            for num, campo, largo in filas_largos:
+                estado.longitudes.setdefault(campo, np.zeros(len(estado.vivos), dtype=np.int32))[num] = largo
+            for num, campo, valor in filas_valores:
+                estado.valores.setdefault(campo, {}).setdefault(num, []).append(json.loads(valor))
+            estado.postings.clear()
+            estado.comparables.clear()
+            return len(filas_docs)
+
+    def reflejar(self, index: str, documentos: Iterable[Dict], estadisticas: Dict = None,
+                 tam_segmento: int = 200) -> Iterator[Dict]:
+        """
+        Deja pasar los documentos de un flujo de ingesta (p. ej. hacia
+        ElasticSearch.indexar_streaming) y los indexa también aquí en segmentos
+        de tam_segmento; los que no cambiaron no se reescriben. Un fallo local
+        se informa sin cortar la ingesta.
+        """
+        lote = []
+
+        def vaciar():
+            if not lote:
+                return
+            try:
+                escritos = self._escribir_segmento(index, lote)
+                if estadisticas is not None:
+                    estadisticas['buscador_local'] = estadisticas.get('buscador_local', 0) + escritos
+            except Exception as e:
+                print(f"Error al indexar en el buscador local: {e}")
+            lote.clear()
+
+        try:
+            for documento in documentos:
+                # Copia: quien consume el flujo agrega campos (hash, vector) al original
+                lote.append(dict(documento))
+                if len(lote) >= tam_segmento:
+                    vaciar()
+                yield documento
+        finally:
+            vaciar()
+            try:
+                self._optimizar_si_conviene(index)
+            except Exception as e:
+                print(f"Error al optimizar el buscador local: {e}")
+
+    def eliminar(self, index: str, ids: Iterable[str]) -> int:
+        """Marca documentos como borrados; devuelve cuántos existían"""
+        estado = self._estado(index)
+        with estado.lock:
+            nums = [estado.num_de[doc_id] for doc_id in ids if doc_id in estado.num_de]
+            if nums:
+                with self._conexion(index) as conn:
+                    conn.executemany("UPDATE documentos SET vivo = 0 WHERE num = ?", [(n,) for n in nums])
+                estado.vivos[nums] = False
+                for n in nums:
+                    estado.num_de.pop(estado.ids[n], None)
+                    estado.hash_de.pop(estado.ids[n], None)
+            return len(nums)
+
+    def optimizar(self, index: str) -> Dict:
+        """
+        Une los segmentos de cada término en una sola lista y borra del disco
+        los documentos reemplazados o eliminados
+
+        Returns:
+            Dict con 'terminos' y 'documentos_borrados'
+        """
+        estado = self._estado(index)
+        with estado.lock:
+            muertos = [n for n in range(len(estado.vivos)) if estado.ids[n] and not estado.vivos[n]]
+            with self._conexion(index) as conn:
+                terminos = conn.execute("SELECT DISTINCT campo, termino FROM postings").fetchall()
+                for campo, termino in terminos:
+                    docs, frecuencias, posiciones = self._postings_disco(conn, campo, termino,
+                                                                         con_posiciones=True)
+                    vigentes = estado.vivos[docs]
+                    conn.execute("DELETE FROM postings WHERE campo = ? AND termino = ?", (campo, termino))
+                    if vigentes.any():
+                        posiciones = posiciones[np.repeat(vigentes, frecuencias)]
+                        conn.execute("INSERT INTO postings VALUES (?, ?, ?, ?, ?, ?)",
+                                     (campo, termino, 0,
+                                      self._comprimir(docs[vigentes], delta=True),
+                                      self._comprimir(frecuencias[vigentes]),
+                                      self._codificar_posiciones(posiciones, frecuencias[vigentes])))
+                for tabla in ('documentos', 'longitudes', 'valores'):
+                    conn.executemany(f"DELETE FROM {tabla} WHERE num = ?", [(n,) for n in muertos])
+            for n in muertos:
+                estado.ids[n] = ''
+                for valores in estado.valores.values():
+                    valores.pop(n, None)
+            estado.postings.clear()
+            estado.comparables.clear()
+        with self._conexion(index) as conn:
+            conn.execute("VACUUM")
+        return {'terminos': len(terminos), 'documentos_borrados': len(muertos)}
+
+    def _optimizar_si_conviene(self, index: str) -> Optional[Dict]:
+        """optimizar() si los documentos borrados superan max_proporcion_borrados de los guardados"""
+        if self.max_proporcion_borrados is None:
+            return None
+        estado = self._estado(index)
+        guardados = sum(1 for i in estado.ids if i)
+        if not guardados or estado.borrados / guardados <= self.max_proporcion_borrados:
+            return None
+        return self.optimizar(index)
+
+    def eliminar_indice(self, index: str) -> bool:
+        """Borra el índice local completo"""
+        with self._lock:
+            self._estados.pop(index, None)
+            for sufijo in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self._ruta_db(index) + sufijo)
+                except FileNotFoundError:
+                    pass
+        return True
+
+    # ------------------------------------------------------------------
+    # Listas invertidas y puntaje
+    # ------------------------------------------------------------------
+
+    def _postings_disco(self, conn: sqlite3.Connection, campo: str, termino: str,
+                        con_posiciones: bool = False) -> Tuple[np.ndarray, ...]:
+        """
+        (docs, frecuencias) de todos los segmentos del término, en orden de
+        documento; con_posiciones agrega las posiciones de todos los documentos
+        seguidas (las de cada uno ocupan 'frecuencia' lugares)
+        """
+        columnas = "docs, frecuencias, posiciones" if con_posiciones else "docs, frecuencias"
+        filas = conn.execute(f"SELECT {columnas} FROM postings WHERE campo = ? AND termino = ? "
+                             "ORDER BY segmento", (campo, termino)).fetchall()
+        vacio = np.zeros(0, dtype=np.int64)
+        if not filas:
+            return (vacio,) * (3 if con_posiciones else 2)
+        docs = [self._descomprimir(fila[0], delta=True) for fila in filas]
+        frecuencias = [self._descomprimir(fila[1]) for fila in filas]
+        if not con_posiciones:
+            return np.concatenate(docs), np.concatenate(frecuencias)
+        posiciones = [self._decodificar_posiciones(fila[2], f) for fila, f in zip(filas, frecuencias)]
+        return np.concatenate(docs), np.concatenate(frecuencias), np.concatenate(posiciones)
+
+    def _postings(self, index: str, estado: _EstadoIndice, conn, campo: str,
+                  termino: str, con_posiciones: bool = False) -> Tuple[np.ndarray, ...]:
+        """
+        Documentos vigentes con el término y su frecuencia (con cache LRU).
+        con_posiciones devuelve (docs, frecuencias, inicios, posiciones) de
+        todos los documentos, vigentes o no: las posiciones del documento
+        docs[k] son posiciones[inicios[k]:inicios[k] + frecuencias[k]]
+        """
+        clave = (campo, termino, con_posiciones)
+        if clave in estado.postings:
+            estado.postings.move_to_end(clave)
+            return estado.postings[clave]
+        if con_posiciones:
+            docs, frecuencias, posiciones = self._postings_disco(conn, campo, termino, con_posiciones=True)
+            resultado = (docs, frecuencias, self._inicios(frecuencias), posiciones)
+        else:
+            docs, frecuencias = self._postings_disco(conn, campo, termino)
+            vigentes = estado.vivos[docs] if len(docs) else np.zeros(0, dtype=bool)
+            resultado = (docs[vigentes], frecuencias[vigentes])
+        estado.postings[clave] = resultado
+        while len(estado.postings) > self.max_postings_cache:
+            estado.postings.popitem(last=False)
+        return resultado
+
+    def _bm25(self, estado: _EstadoIndice, campo: str, docs: np.ndarray, frecuencias: np.ndarray,
+              idf: float) -> np.ndarray:
+        largos = estado.longitudes.get(campo)
+        if largos is None or not len(docs):
+            return np.zeros(len(docs), dtype=np.float32)
+        vigentes = largos[estado.vivos[:len(largos)]]
+        promedio = float(vigentes.mean()) if len(vigentes) else 1.0
+        norma = self.k1 * (1 - self.b + self.b * largos[docs] / max(promedio, 1e-9))
+        return (idf * frecuencias * (self.k1 + 1) / (frecuencias + norma)).astype(np.float32)
+
+    @staticmethod
+    def _idf(total: int, df: int) -> float:
+        return math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+    # ------------------------------------------------------------------
+    # Evaluación de consultas (máscara de documentos + puntaje)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _campo_y_boost(campo: str) -> Tuple[str, float]:
+        nombre, _, boost = campo.partition('^')
+        return nombre, float(boost) if boost else 1.0
+
+    @staticmethod
+    def _minimo_coincidencias(minimo, total: int) -> int:
+        if minimo is None:
+            return 1
+        if isinstance(minimo, str) and minimo.endswith('%'):
+            porcentaje = int(minimo[:-1])
+            cantidad = int(total * abs(porcentaje) / 100)
+            return max(1, cantidad if porcentaje >= 0 else total - cantidad)
+        minimo = int(minimo)
+        return max(1, minimo if minimo >= 0 else total + minimo)
+
+    def _match(self, ctx: Dict, campo: str, texto: str, operador: str = 'or',
+               minimo=None) -> Tuple[np.ndarray, np.ndarray]:
+        terminos = sorted({termino for termino, _ in self.analizar(texto)})
+        requeridas = (len(terminos) if operador.lower() == 'and'
+                      else self._minimo_coincidencias(minimo, len(terminos)))
+        return self._terminos(ctx, campo, terminos, requeridas)
+
+    def _terminos(self, ctx: Dict, campo: str, terminos: List[str],
+                  requeridas: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Suma BM25 de los términos ya analizados; exige 'requeridas' coincidencias"""
+        estado, n = ctx['estado'], ctx['n']
+        mascara = np.zeros(n, dtype=bool)
+        puntaje = np.zeros(n, dtype=np.float32)
+        if not terminos:
+            return mascara, puntaje
+
+        coincidencias = np.zeros(n, dtype=np.int32)
+        total = int(estado.vivos.sum())
+        for termino in terminos:
+            docs, frecuencias = self._postings(ctx['index'], estado, ctx['conn'], campo, termino)
+            if not len(docs):
+                continue
+            puntaje[docs] += self._bm25(estado, campo, docs, frecuencias, self._idf(total, len(docs)))
+            coincidencias[docs] += 1
+
+        mascara = coincidencias >= requeridas
+        puntaje[~mascara] = 0
+        return mascara, puntaje
+
+    def _frase(self, ctx: Dict, campo: str, texto: str, slop: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        match_phrase: los términos en orden, cada uno a la distancia de la
+        consulta con a lo sumo 'slop' posiciones de diferencia en total (las
+        palabras vacías de la consulta cuentan como hueco, igual que en
+        Elastic). A diferencia de Elastic, el slop no permite invertir el orden.
+        """
+        estado, conn, n = ctx['estado'], ctx['conn'], ctx['n']
+        mascara = np.zeros(n, dtype=bool)
+        puntaje = np.zeros(n, dtype=np.float32)
+        terminos = self.analizar(texto)
+        if not terminos:
+            return mascara, puntaje
+        if len(terminos) == 1:
+            return self._terminos(ctx, campo, [terminos[0][0]], 1)
+
+        listas = [self._postings(ctx['index'], estado, conn, campo, termino) for termino, _ in terminos]
+        if any(not len(docs) for docs, _ in listas):
+            return mascara, puntaje
+        # Intersección empezando por el término más raro
+        candidatos = listas[int(np.argmin([len(docs) for docs, _ in listas]))][0]
+        for docs, _ in listas:
+            candidatos = np.intersect1d(candidatos, docs, assume_unique=True)
+            if not len(candidatos):
+                return mascara, puntaje
+
+        por_termino = {termino: self._postings(ctx['index'], estado, conn, campo, termino, con_posiciones=True)
+                       for termino, _ in terminos}
+
+        def posiciones_en(termino: str, num: int) -> np.ndarray:
+            docs, frecuencias, inicios, posiciones = por_termino[termino]
+            k = int(np.searchsorted(docs, num))
+            return posiciones[inicios[k]:inicios[k] + frecuencias[k]]
+
+        frecuencias = np.zeros(len(candidatos), dtype=np.float32)
+        for i, num in enumerate(candidatos.tolist()):
+            anteriores = posiciones_en(terminos[0][0], num)
+            holgura = np.zeros(len(anteriores), dtype=np.int64)
+            for j in range(1, len(terminos)):
+                posiciones = posiciones_en(terminos[j][0], num)
+                esperadas = anteriores + (terminos[j][1] - terminos[j - 1][1])
+                # La posición más cercana a la esperada, antes o después, sin volver atrás
+                indice = np.searchsorted(posiciones, esperadas)
+                despues = posiciones[np.minimum(indice, len(posiciones) - 1)]
+                antes = posiciones[np.maximum(indice - 1, 0)]
+                d_despues = np.where(indice < len(posiciones), despues - esperadas, slop + 1)
+                d_antes = np.where((indice > 0) & (antes > anteriores), esperadas - antes, slop + 1)
+                encontradas = np.where(d_antes < d_despues, antes, despues)
+                holgura = holgura + np.minimum(d_antes, d_despues)
+                validas = holgura <= slop
+                anteriores, holgura = encontradas[validas], holgura[validas]
+                if not len(anteriores):
+                    break
+            # Como en Lucene, una coincidencia con holgura d vale 1 / (1 + d)
+            frecuencias[i] = float((1.0 / (1 + holgura)).sum()) if len(anteriores) else 0.0
+
+        encontrados = candidatos[frecuencias > 0]
+        if not len(encontrados):
+            return mascara, puntaje
+        total = int(estado.vivos.sum())
+        idf = sum(self._idf(total, len(docs)) for docs, _ in listas)
+        mascara[encontrados] = True
+        puntaje[encontrados] = self._bm25(estado, campo, encontrados, frecuencias[frecuencias > 0], idf)
+        return mascara, puntaje
+
+    def _query_string(self, ctx: Dict, texto: str, campos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """Frases entre comillas + palabras sueltas (OR), el mejor campo por documento"""
+        frases = re.findall(r'"([^"]+)"', texto)
+        sueltas = re.sub(r'"[^"]*"|\b(AND|OR|NOT)\b', ' ', texto)
+        mascara = np.zeros(ctx['n'], dtype=bool)
+        puntaje = np.zeros(ctx['n'], dtype=np.float32)
+        for campo in campos:
+            nombre, boost = self._campo_y_boost(campo)
+            partes = [self._frase(ctx, nombre, frase) for frase in frases]
+            if sueltas.strip():
+                partes.append(self._match(ctx, nombre, sueltas))
+            for m, p in partes:
+                mascara |= m
+                puntaje = np.maximum(puntaje, p * boost)
+        return mascara, puntaje
+
+    def _valores_campo(self, estado: _EstadoIndice, campo: str) -> Dict[int, list]:
+        nombre = campo[:-len('.keyword')] if campo.endswith('.keyword') else campo
+        return estado.valores.get(nombre, {})
+
+    @staticmethod
+    def _sumar_intervalo(fecha: datetime, cantidad: int, unidad: str) -> datetime:
+        if unidad in ('y', 'M'):
+            meses = fecha.month - 1 + cantidad * (12 if unidad == 'y' else 1)
+            año, mes = fecha.year + meses // 12, meses % 12 + 1
+            return fecha.replace(year=año, month=mes, day=min(fecha.day, calendar.monthrange(año, mes)[1]))
+        segundos = {'w': 604800, 'd': 86400, 'h': 3600, 'H': 3600, 'm': 60, 's': 1}[unidad]
+        return fecha + timedelta(seconds=cantidad * segundos)
+
+    @classmethod
+    def _fecha(cls, valor) -> Optional[datetime]:
+        """Fecha ISO (UTC, sin zona) con date math de Elastic ('...||+1y'), o None"""
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            return datetime.fromtimestamp(valor / 1000, tz=timezone.utc).replace(tzinfo=None)
+        if not isinstance(valor, str):
+            return None
+        base, _, operaciones = valor.partition('||')
+        if base == 'now':
+            base, operaciones = '', valor[3:]
+        try:
+            fecha = (datetime.fromisoformat(base.replace('Z', '+00:00')) if base
+                     else datetime.now(timezone.utc))
+        except ValueError:
+            return None
+        if fecha.tzinfo:
+            fecha = fecha.astimezone(timezone.utc).replace(tzinfo=None)
+        for signo, cantidad, unidad in re.findall(r'([+-])(\d+)([yMwdhHms])', operaciones):
+            fecha = cls._sumar_intervalo(fecha, int(cantidad) * (1 if signo == '+' else -1), unidad)
+        return fecha
+
+    @classmethod
+    def _comparable(cls, valor):
+        if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+            return 0, float(valor)
+        fecha = cls._fecha(valor) if isinstance(valor, str) else None
+        if fecha is not None:
+            return 1, fecha
+        return 2, str(valor)
+
+    def _rango(self, ctx: Dict, campo: str, condiciones: Dict) -> np.ndarray:
+        operadores = {'gt': lambda a, b: a > b, 'gte': lambda a, b: a >= b,
+                      'lt': lambda a, b: a < b, 'lte': lambda a, b: a <= b}
+        limites = [(operadores[op], self._comparable(v)) for op, v in condiciones.items() if op in operadores]
+        estado = ctx['estado']
+        nombre = campo[:-len('.keyword')] if campo.endswith('.keyword') else campo
+        if nombre not in estado.comparables:
+            # Las fechas guardadas se interpretan una sola vez hasta el próximo cambio del índice
+            estado.comparables[nombre] = {num: [self._comparable(v) for v in valores]
+                                          for num, valores in self._valores_campo(estado, campo).items()}
+        mascara = np.zeros(ctx['n'], dtype=bool)
+        for num, valores in estado.comparables[nombre].items():
+            for tipo, comparable in valores:
+                if all(t == tipo and op(comparable, limite) for op, (t, limite) in limites):
+                    mascara[num] = True
+                    break
+        return mascara
+
+    def _evaluar(self, ctx: Dict, consulta: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        n = ctx['n']
+        if not consulta:
+            return ctx['estado'].vivos[:n].copy(), np.ones(n, dtype=np.float32)
+        tipo, cuerpo = next(iter(consulta.items()))
+
+        if tipo == 'match_all':
+            return ctx['estado'].vivos[:n].copy(), np.ones(n, dtype=np.float32)
+
+        if tipo == 'bool':
+            mascara = ctx['estado'].vivos[:n].copy()
+            puntaje = np.zeros(n, dtype=np.float32)
+            lista = lambda c: c if isinstance(c, list) else [c]
+            must, should = lista(cuerpo.get('must', [])), lista(cuerpo.get('should', []))
+            for clausula in must:
+                m, p = self._evaluar(ctx, clausula)
+                mascara &= m
+                puntaje += p
+            for clausula in lista(cuerpo.get('filter', [])):
+                mascara &= self._evaluar(ctx, clausula)[0]
+            for clausula in lista(cuerpo.get('must_not', [])):
+                mascara &= ~self._evaluar(ctx, clausula)[0]
+            if should:
+                minimo = cuerpo.get('minimum_should_match',
+                                    0 if must or cuerpo.get('filter') else 1)
+                coincidencias = np.zeros(n, dtype=np.int32)
+                for clausula in should:
+                    m, p = self._evaluar(ctx, clausula)
+                    coincidencias += m
+                    puntaje += np.where(m, p, 0)
+                if minimo:
+                    mascara &= coincidencias >= self._minimo_coincidencias(minimo, len(should))
+            puntaje[~mascara] = 0
+            return mascara, puntaje
+
+        if tipo in ('match', 'match_phrase'):
+            campo, parametros = next(iter(cuerpo.items()))
+            if not isinstance(parametros, dict):
+                parametros = {'query': parametros}
+            if tipo == 'match_phrase':
+                return self._frase(ctx, campo, parametros['query'], int(parametros.get('slop', 0)))
+            return self._match(ctx, campo, parametros['query'], parametros.get('operator', 'or'),
+                               parametros.get('minimum_should_match'))
+
+        if tipo == 'multi_match':
+            campos = cuerpo.get('fields') or list(self.campos_texto)
+            mascara = np.zeros(n, dtype=bool)
+            puntaje = np.zeros(n, dtype=np.float32)
+            for campo in campos:
+                nombre, boost = self._campo_y_boost(campo)
+                if cuerpo.get('type') == 'phrase':
+                    m, p = self._frase(ctx, nombre, cuerpo['query'], int(cuerpo.get('slop', 0)))
+                else:
+                    m, p = self._match(ctx, nombre, cuerpo['query'], cuerpo.get('operator', 'or'),
+                                       cuerpo.get('minimum_should_match'))
+                mascara |= m
+                puntaje = np.maximum(puntaje, p * boost)
+            return mascara, puntaje
+
+        if tipo in ('query_string', 'simple_query_string'):
+            campos = cuerpo.get('fields') or ([cuerpo['default_field']] if cuerpo.get('default_field')
+                                              else list(self.campos_texto))
+            return self._query_string(ctx, cuerpo['query'], campos)
+
+        if tipo in ('term', 'terms'):
+            campo, buscados = next(iter(cuerpo.items()))
+            if tipo == 'term':
+                buscados = [buscados.get('value') if isinstance(buscados, dict) else buscados]
+            buscados = set(buscados)
+            mascara = np.zeros(n, dtype=bool)
+            for num, valores in self._valores_campo(ctx['estado'], campo).items():
+                if any(v in buscados for v in valores):
+                    mascara[num] = True
+            return mascara, mascara.astype(np.float32)
+
+        if tipo == 'range':
+            campo, condiciones = next(iter(cuerpo.items()))
+            mascara = self._rango(ctx, campo, condiciones)
+            return mascara, mascara.astype(np.float32)
+
+        if tipo == 'exists':
+            campo = cuerpo['field']
+            mascara = np.zeros(n, dtype=bool)
+            mascara[list(self._valores_campo(ctx['estado'], campo))] = True
+            largos = ctx['estado'].longitudes.get(campo)
+            if largos is not None:
+                mascara[:len(largos)] |= largos[:n] > 0
+            return mascara, mascara.astype(np.float32)
+
+        if tipo == 'ids':
+            mascara = np.zeros(n, dtype=bool)
+            mascara[[ctx['estado'].num_de[i] for i in cuerpo.get('values', []) if i in ctx['estado'].num_de]] = True
+            return mascara, mascara.astype(np.float32)
+
+        raise ValueError(f"Consulta no soportada por el buscador local: {tipo}")
+
+    # ------------------------------------------------------------------
+    # Agregaciones
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _truncar_fecha(fecha: datetime, intervalo: str) -> datetime:
+        if intervalo in ('year', '1y'):
+            return datetime(fecha.year, 1, 1)
+        if intervalo in ('quarter', '1q'):
+            return datetime(fecha.year, 3 * ((fecha.month - 1) // 3) + 1, 1)
+        if intervalo in ('month', '1M'):
+            return datetime(fecha.year, fecha.month, 1)
+        if intervalo in ('week', '1w'):
+            dia = datetime(fecha.year, fecha.month, fecha.day)
+            return dia - timedelta(days=dia.weekday())
+        return datetime(fecha.year, fecha.month, fecha.day)
+
+    def _agregar(self, estado: _EstadoIndice, aggs: Dict, mascara: np.ndarray) -> Dict:
+        docs = np.flatnonzero(mascara)
+        resultado = {}
+        for nombre, definicion in (aggs or {}).items():
+            if 'terms' in definicion:
+                columna = self._valores_campo(estado, definicion['terms']['field'])
+                conteo = Counter(v for num in docs for v in set(map(str, columna.get(int(num), []))))
+                orden = sorted(conteo.items(), key=lambda kv: (-kv[1], kv[0]))
+                tamaño = definicion['terms'].get('size', 10)
+                resultado[nombre] = {
+                    'doc_count_error_upper_bound': 0,
+                    'sum_other_doc_count': sum(c for _, c in orden[tamaño:]),
+                    'buckets': [{'key': k, 'doc_count': c} for k, c in orden[:tamaño]]
+                }
+            elif 'date_histogram' in definicion:
+                histograma = definicion['date_histogram']
+                intervalo = histograma.get('calendar_interval') or histograma.get('interval', 'year')
+                columna = self._valores_campo(estado, histograma['field'])
+                conteo = Counter()
+                for num in docs:
+                    claves = set()
+                    for valor in columna.get(int(num), []):
+                        fecha = self._fecha(valor)
+                        if fecha is not None:
+                            claves.add(self._truncar_fecha(fecha, intervalo))
+                    conteo.update(claves)
+                resultado[nombre] = {'buckets': [
+                    {'key_as_string': clave.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                     'key': int(clave.replace(tzinfo=timezone.utc).timestamp() * 1000),
+                     'doc_count': conteo[clave]}
+                    for clave in sorted(conteo)]}
+            elif 'cardinality' in definicion:
+                columna = self._valores_campo(estado, definicion['cardinality']['field'])
+                resultado[nombre] = {'value': len({str(v) for num in docs for v in columna.get(int(num), [])})}
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Búsquedas (misma interfaz que ElasticSearch)
+    # ------------------------------------------------------------------
+
+    def buscar(self, index: str, query: Dict, aggs=None, size: int = 10, campos: List[str] = None) -> Dict:
+        """
+        Ejecuta una búsqueda con la DSL de Elastic (subconjunto soportado) y
+        devuelve lo mismo que ElasticSearch.buscar
+
+        Args:
+            campos: Campos del _source a devolver (None = todos)
+        """
+        try:
+            inicio = time.perf_counter()
+            q = query.get("query") if "query" in query else query
+            estado = self._estado(index)
+            with estado.lock, self._conexion(index) as conn:
+                ctx = {'index': index, 'estado': estado, 'conn': conn, 'n': len(estado.vivos)}
+                mascara, puntaje = self._evaluar(ctx, q)
+                mascara &= estado.vivos[:ctx['n']]
+                docs = np.flatnonzero(mascara)
+                orden = docs[np.argsort(-puntaje[docs], kind='stable')][:size]
+
+                fuentes = {}
+                if len(orden):
+                    marcas = ','.join('?' * len(orden))
+                    fuentes = {num: json.loads(zlib.decompress(fuente))
+                               for num, fuente in conn.execute(
+                                   f"SELECT num, fuente FROM documentos WHERE num IN ({marcas})",
+                                   [int(n) for n in orden])}
+                resultados = []
+                for num in orden:
+                    fuente = fuentes.get(int(num), {})
+                    if campos:
+                        fuente = {c: fuente[c] for c in campos if c in fuente}
+                    resultados.append({'_index': index, '_id': estado.ids[num],
+                                       '_score': float(puntaje[num]), '_source': fuente})
+
+                return {
+                    "success": True,
+                    "total": int(len(docs)),
+                    "resultados": resultados,
+                    "aggs": self._agregar(estado, aggs, mascara),
+                    "took": round((time.perf_counter() - inicio) * 1000, 2)
+                }
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def buscar_texto(self, index: str, texto: str, campos: List[str] = None, size: int = 10) -> Dict:
+        """Búsqueda simple por texto"""
+        if campos:
+            query = {"query": {"multi_match": {"query": texto, "fields": campos, "type": "best_fields"}}}
+        else:
+            query = {"query": {"query_string": {"query": texto}}}
+        return self.buscar(index, query, size=size)
+
+    def estadisticas(self, index: str) -> Dict:
+        """Documentos vigentes, borrados, segmentos, términos y tamaño en disco"""
+        estado = self._estado(index)
+        with self._conexion(index) as conn:
+            # Máximo de segmentos por término: lo que recorre una consulta antes de optimizar()
+            segmentos = conn.execute("SELECT MAX(c) FROM (SELECT COUNT(*) AS c FROM postings "
+                                     "GROUP BY campo, termino)").fetchone()[0] or 0
+            terminos = conn.execute("SELECT COUNT(*) FROM (SELECT DISTINCT campo, termino FROM postings)").fetchone()[0]
+        return {
+            'documentos': int(estado.vivos.sum()),
+            'borrados': estado.borrados,
+            'segmentos': segmentos,
+            'terminos': terminos,
+            'mb': round(os.path.getsize(self._ruta_db(index)) / 1048576, 2)
+        }
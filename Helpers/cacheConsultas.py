@@ -0,0 +1,160 @@
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Tuple
+
+
+class CacheConsultas:
+    """
+    Cache en memoria (LRU + TTL) de resultados de búsqueda con coalescencia:
+    si llegan varias peticiones idénticas mientras la primera está en curso,
+    solo esa va a Elasticsearch y las demás esperan su resultado.
+
+    La cache es local al proceso: con varios workers cada uno tiene la suya y
+    la invalidación solo alcanza al propio proceso (el TTL acota lo demás).
+    """
+
+    def __init__(self, max_entradas: int = 256, ttl: float = 300):
+        """
+        Args:
+            max_entradas: Resultados guardados como máximo (se descartan los menos usados)
+            ttl: Segundos que un resultado sigue siendo válido
+        """
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._en_curso: Dict[str, Future] = {}
+        self._generacion = 0
+        self._lock = threading.Lock()
+        self._contadores = {'aciertos': 0, 'fallos': 0, 'coalescidas': 0,
+                            'expiradas': 0, 'invalidaciones': 0}
+
+    @staticmethod
+    def normalizar_texto(texto: str) -> str:
+        """Minúsculas, Unicode NFC y espacios colapsados (los acentos se conservan)"""
+        texto = unicodedata.normalize('NFC', texto or '').lower()
+        return re.sub(r'\s+', ' ', texto).strip()
+
+    @classmethod
+    def clave(cls, texto: str, **parametros) -> str:
+        """Clave de cache a partir del texto normalizado y el resto de parámetros"""
+        return json.dumps([cls.normalizar_texto(texto), parametros],
+                          sort_keys=True, ensure_ascii=False, default=str)
+
+    def obtener(self, clave: str, calcular: Callable[[], Any],
+                guardar: Callable[[Any], bool] = None) -> Tuple[Any, str]:
+        """
+        Devuelve el resultado guardado o lo calcula una sola vez aunque haya
+        peticiones concurrentes con la misma clave. Los errores no se guardan:
+        se propagan a todas las peticiones que esperaban ese cálculo. Si
+        guardar(resultado) es False, el resultado se entrega (también a las
+        peticiones coalescidas) pero no se guarda.
+
+        Returns:
+            (resultado, origen) con origen 'acierto', 'coalescida' o 'fallo'
+        """
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None:
+                if entrada[0] > time.monotonic():
+                    self._entradas.move_to_end(clave)
+                    self._contadores['aciertos'] += 1
+                    return entrada[1], 'acierto'
+                del self._entradas[clave]
+                self._contadores['expiradas'] += 1
+
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                self._contadores['coalescidas'] += 1
+                propio = False
+            else:
+                futuro = Future()
+                self._en_curso[clave] = futuro
+                self._contadores['fallos'] += 1
+                generacion = self._generacion
+                propio = True
+
+        if not propio:
+            return futuro.result(), 'coalescida'
+
+        try:
+            resultado = calcular()
+        except BaseException as e:
+            with self._lock:
+                self._en_curso.pop(clave, None)
+            futuro.set_exception(e)
+            raise
+
+        with self._lock:
+            self._en_curso.pop(clave, None)
+            # Un resultado calculado antes de una invalidación ya puede estar viejo
+            if generacion == self._generacion and (guardar is None or guardar(resultado)):
+                self._entradas[clave] = (time.monotonic() + self.ttl, resultado)
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+        futuro.set_result(resultado)
+        return resultado, 'fallo'
+
+    def consultar(self, claves: List[str]) -> Dict[str, Any]:
+        """Resultados vigentes de varias claves sin calcular los que faltan"""
+        ahora = time.monotonic()
+        encontrados = {}
+        with self._lock:
+            for clave in claves:
+                entrada = self._entradas.get(clave)
+                if entrada is not None and entrada[0] > ahora:
+                    self._entradas.move_to_end(clave)
+                    encontrados[clave] = entrada[1]
+            self._contadores['aciertos'] += len(encontrados)
+            self._contadores['fallos'] += len(claves) - len(encontrados)
+        return encontrados
+
+    def guardar(self, valores: Dict[str, Any], generacion: int = None):
+        """
+        Guarda resultados calculados por fuera de obtener(). Con 'generacion'
+        (leída de self.generacion antes de calcular) se descartan si hubo una
+        invalidación mientras tanto.
+        """
+        with self._lock:
+            if generacion is not None and generacion != self._generacion:
+                return
+            vence = time.monotonic() + self.ttl
+            for clave, valor in valores.items():
+                self._entradas[clave] = (vence, valor)
+                self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    @property
+    def generacion(self) -> int:
+        """Cambia con cada invalidación"""
+        return self._generacion
+
+    def invalidar(self, *_):
+        """Descarta todos los resultados (se llama cuando se escribe en el índice)"""
+        with self._lock:
+            self._entradas.clear()
+            self._generacion += 1
+            self._contadores['invalidaciones'] += 1
+
+    def estadisticas(self) -> Dict:
+        """Contadores de aciertos, fallos, coalescencias e invalidaciones"""
+        with self._lock:
+            contadores = dict(self._contadores)
+            entradas = len(self._entradas)
+            en_curso = len(self._en_curso)
+        consultas = contadores['aciertos'] + contadores['fallos'] + contadores['coalescidas']
+        return {
+            **contadores,
+            'entradas': entradas,
+            'en_curso': en_curso,
+            'max_entradas': self.max_entradas,
+            'ttl': self.ttl,
+            'tasa_aciertos': round((contadores['aciertos'] + contadores['coalescidas']) / consultas, 3)
+            if consultas else None
+        }
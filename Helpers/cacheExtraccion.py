@@ -0,0 +1,141 @@
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+
+class CacheExtraccion:
+    """Caché persistente (SQLite) de texto extraído, indexada por el SHA-256 del archivo"""
+
+    def __init__(self, ruta_db: str = "cache/extraccion.db", max_mb: float = 512):
+        """
+        Inicializa la caché
+
+        Args:
+            ruta_db: Ruta del archivo SQLite
+            max_mb: Tamaño máximo del texto almacenado; al superarlo se expulsan
+                    las entradas usadas hace más tiempo (LRU)
+        """
+        self.ruta_db = ruta_db
+        self.max_bytes = int(max_mb * 1024 * 1024)
+
+        carpeta = os.path.dirname(ruta_db)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS extracciones (
+                    hash TEXT PRIMARY KEY,
+                    texto TEXT NOT NULL,
+                    paginas INTEGER,
+                    metodo TEXT,
+                    tamaño INTEGER NOT NULL,
+                    creado REAL NOT NULL,
+                    ultimo_acceso REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_ultimo_acceso ON extracciones(ultimo_acceso)")
+
+    @contextmanager
+    def _conexion(self):
+        """Abre una conexión propia (cada proceso del pool usa la suya), confirma y la cierra"""
+        conn = sqlite3.connect(self.ruta_db, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def obtener(self, hash_archivo: str) -> Optional[Dict]:
+        """
+        Busca una extracción previa y la marca como usada recientemente
+
+        Returns:
+            Dict con 'texto', 'paginas' y 'metodo', o None si no existe
+        """
+        try:
+            with self._conexion() as conn:
+                fila = conn.execute(
+                    "SELECT texto, paginas, metodo FROM extracciones WHERE hash = ?",
+                    (hash_archivo,)
+                ).fetchone()
+                if not fila:
+                    return None
+                conn.execute("UPDATE extracciones SET ultimo_acceso = ? WHERE hash = ?",
+                             (time.time(), hash_archivo))
+            return {'texto': fila[0], 'paginas': fila[1], 'metodo': fila[2]}
+        except Exception as e:
+            print(f"Error al leer caché de extracción: {e}")
+            return None
+
+    def guardar(self, hash_archivo: str, texto: str, paginas: int, metodo: str) -> bool:
+        """
+        Guarda (o reemplaza) la extracción de un archivo y aplica la expulsión LRU
+
+        Args:
+            hash_archivo: SHA-256 del contenido del archivo
+            texto: Texto extraído
+            paginas: Número de páginas del documento
+            metodo: 'texto' (capa de texto completa), 'parcial' (capa de texto con
+                    páginas escaneadas sin reconocer), 'mixto', 'ocr' u
+                    'ocr_completo' (OCR de todo el documento, guardado con la
+                    clave '<hash>:ocr')
+        """
+        try:
+            tamaño = len(texto.encode('utf-8'))
+            if tamaño > self.max_bytes:
+                return False
+
+            ahora = time.time()
+            with self._conexion() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO extracciones "
+                    "(hash, texto, paginas, metodo, tamaño, creado, ultimo_acceso) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (hash_archivo, texto, paginas, metodo, tamaño, ahora, ahora)
+                )
+                self._expulsar(conn)
+            return True
+        except Exception as e:
+            print(f"Error al guardar en caché de extracción: {e}")
+            return False
+
+    def _expulsar(self, conn: sqlite3.Connection):
+        """Elimina las entradas menos usadas hasta respetar el tamaño máximo"""
+        total = conn.execute("SELECT COALESCE(SUM(tamaño), 0) FROM extracciones").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        exceso = total - self.max_bytes
+        borrar = []
+        for hash_archivo, tamaño in conn.execute(
+                "SELECT hash, tamaño FROM extracciones ORDER BY ultimo_acceso ASC"):
+            borrar.append((hash_archivo,))
+            exceso -= tamaño
+            if exceso <= 0:
+                break
+        conn.executemany("DELETE FROM extracciones WHERE hash = ?", borrar)
+
+    def estadisticas(self) -> Dict:
+        """Retorna número de entradas y bytes ocupados"""
+        try:
+            with self._conexion() as conn:
+                entradas, total = conn.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(tamaño), 0) FROM extracciones"
+                ).fetchone()
+            return {'entradas': entradas, 'bytes': total, 'max_bytes': self.max_bytes}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def limpiar(self) -> bool:
+        """Elimina todas las entradas"""
+        try:
+            with self._conexion() as conn:
+                conn.execute("DELETE FROM extracciones")
+            return True
+        except Exception as e:
+            print(f"Error al limpiar caché de extracción: {e}")
+            return False
@@ -0,0 +1,357 @@
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+import zlib
+import hashlib
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+import numpy as np
+
+
+class DetectorDuplicados:
+    """
+    Detección de casi-duplicados con MinHash + LSH. Cada documento se resume en
+    una firma de num_permutaciones mínimos sobre sus shingles de palabras; la
+    firma se parte en bandas y dos documentos son candidatos si coinciden en
+    alguna banda completa. Solo los candidatos se comparan, así que el costo por
+    documento no crece con el tamaño del corpus. Las firmas se guardan en SQLite
+    por índice para reconocer copias entre cargas distintas.
+    """
+
+    MODOS = ('unico', 'version', 'omitir')
+
+    def __init__(self, ruta_db: str = "cache/duplicados.db", modo: str = 'unico',
+                 umbral: float = 0.85, num_permutaciones: int = 128, bandas: int = 16,
+                 tam_shingle: int = 5, semilla: int = 42,
+                 existe_original: Callable[[str, str], bool] = None, vigencia_sin_verificar: float = 3600):
+        """
+        Inicializa el detector
+
+        Args:
+            ruta_db: Ruta del archivo SQLite con las firmas
+            modo: Qué hacer con un casi-duplicado de un documento ya visto:
+                  'unico'   -> no se indexa; queda registrado en el grupo del original
+                  'version' -> se indexa con 'version_de' y 'grupo_duplicados'
+                               (las búsquedas muestran solo el original)
+                  'omitir'  -> se descarta sin registrarlo
+            umbral: Similitud de Jaccard estimada a partir de la cual es duplicado
+            num_permutaciones: Longitud de la firma MinHash
+            bandas: Bandas LSH (num_permutaciones debe ser múltiplo); más bandas
+                    = más candidatos y más recall
+            tam_shingle: Palabras por shingle
+            semilla: Semilla de las funciones hash (debe ser fija para comparar
+                     firmas entre ejecuciones)
+            existe_original: Función (indice, id_documento) -> bool que confirma que el
+                             original de un grupo sigue indexado antes de descartar una
+                             copia; si ya no está, la copia se vuelve a clasificar. Sin
+                             ella se confía en lo registrado
+            vigencia_sin_verificar: Segundos durante los que un original recién
+                                    registrado no se verifica (puede no estar
+                                    indexado todavía: la carga sigue en curso)
+        """
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de deduplicación no soportado: {modo}")
+        if num_permutaciones % bandas:
+            raise ValueError("num_permutaciones debe ser múltiplo de bandas")
+
+        self.ruta_db = ruta_db
+        self.modo = modo
+        self.umbral = umbral
+        self.num_permutaciones = num_permutaciones
+        self.bandas = bandas
+        self.filas_por_banda = num_permutaciones // bandas
+        self.tam_shingle = tam_shingle
+        self.existe_original = existe_original
+        self.vigencia_sin_verificar = vigencia_sin_verificar
+
+        # Hash multiplicativo (a * x + b) >> 32 sobre 64 bits: una permutación por fila
+        rng = np.random.default_rng(semilla)
+        self._a = (rng.integers(1, 2 ** 63, size=(num_permutaciones, 1), dtype=np.uint64) | np.uint64(1))
+        self._b = rng.integers(0, 2 ** 63, size=(num_permutaciones, 1), dtype=np.uint64)
+
+        carpeta = os.path.dirname(ruta_db)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS firmas (
+                    indice TEXT NOT NULL,
+                    id_documento TEXT NOT NULL,
+                    grupo TEXT NOT NULL,
+                    duplicado INTEGER NOT NULL,
+                    similitud REAL,
+                    nombre TEXT,
+                    ruta TEXT,
+                    firma BLOB NOT NULL,
+                    creado REAL NOT NULL,
+                    PRIMARY KEY (indice, id_documento)
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bandas (
+                    indice TEXT NOT NULL,
+                    banda INTEGER NOT NULL,
+                    clave INTEGER NOT NULL,
+                    id_documento TEXT NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_bandas ON bandas(indice, banda, clave)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_grupo ON firmas(indice, grupo)")
+
+    @contextmanager
+    def _conexion(self):
+        """Abre una conexión propia, confirma y la cierra"""
+        conn = sqlite3.connect(self.ruta_db, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Firmas
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _palabras(texto: str) -> List[str]:
+        """Palabras normalizadas: minúsculas, sin tildes ni puntuación"""
+        texto = unicodedata.normalize('NFKD', texto.lower())
+        texto = ''.join(c for c in texto if not unicodedata.combining(c))
+        return re.findall(r'\w+', texto)
+
+    def _shingles(self, texto: str) -> np.ndarray:
+        """Hashes de 32 bits (estables entre procesos) de los shingles de palabras"""
+        palabras = self._palabras(texto)
+        if not palabras:
+            return np.empty(0, dtype=np.uint64)
+        hashes = np.fromiter((zlib.crc32(p.encode('utf-8')) for p in palabras),
+                             dtype=np.uint64, count=len(palabras))
+        k = min(self.tam_shingle, len(hashes))
+        n = len(hashes) - k + 1
+        # Combinación polinómica de k palabras consecutivas, reducida a 32 bits
+        combinado = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            combinado = combinado * np.uint64(1000003) + hashes[j:j + n]
+        return np.unique(combinado & np.uint64(0xFFFFFFFF))
+
+    def firma(self, texto: str, tam_bloque: int = 4096) -> Optional[np.ndarray]:
+        """
+        Firma MinHash de un texto (uint32 de longitud num_permutaciones), o None
+        si el texto no tiene palabras
+        """
+        shingles = self._shingles(texto)
+        if not len(shingles):
+            return None
+        firma = np.full(self.num_permutaciones, np.iinfo(np.uint32).max, dtype=np.uint64)
+        # Por bloques para acotar la matriz permutaciones x shingles en memoria
+        for inicio in range(0, len(shingles), tam_bloque):
+            bloque = shingles[inicio:inicio + tam_bloque][np.newaxis, :]
+            valores = (self._a * bloque + self._b) >> np.uint64(32)
+            np.minimum(firma, valores.min(axis=1), out=firma)
+        return firma.astype(np.uint32)
+
+    def _claves_bandas(self, firma: np.ndarray) -> List[int]:
+        claves = []
+        for banda in range(self.bandas):
+            trozo = firma[banda * self.filas_por_banda:(banda + 1) * self.filas_por_banda]
+            digest = hashlib.blake2b(trozo.tobytes(), digest_size=8).digest()
+            claves.append(int.from_bytes(digest, 'big', signed=True))
+        return claves
+
+    @staticmethod
+    def similitud(firma_a: np.ndarray, firma_b: np.ndarray) -> float:
+        """Jaccard estimada: fracción de posiciones iguales de las firmas"""
+        return float(np.mean(firma_a == firma_b))
+
+    # ------------------------------------------------------------------
+    # Clasificación
+    # ------------------------------------------------------------------
+
+    def _original_vigente(self, conn: sqlite3.Connection, indice: str, grupo: str) -> bool:
+        """Indica si el original de un grupo sigue registrado y, si se puede comprobar, indexado"""
+        fila = conn.execute("SELECT creado FROM firmas WHERE indice = ? AND id_documento = ? AND duplicado = 0",
+                            (indice, grupo)).fetchone()
+        if not fila:
+            return False
+        if self.existe_original is None or time.time() - fila[0] < self.vigencia_sin_verificar:
+            return True
+        try:
+            return bool(self.existe_original(indice, grupo))
+        except Exception as e:
+            # Sin poder comprobarlo se mantiene la clasificación
+            print(f"No se pudo comprobar el original {grupo}: {e}")
+            return True
+
+    @staticmethod
+    def _olvidar(conn: sqlite3.Connection, indice: str, id_documento: str):
+        """Borra la firma y las bandas de un documento"""
+        conn.execute("DELETE FROM firmas WHERE indice = ? AND id_documento = ?", (indice, id_documento))
+        conn.execute("DELETE FROM bandas WHERE indice = ? AND id_documento = ?", (indice, id_documento))
+
+    def clasificar(self, indice: str, id_documento: str, texto: str,
+                   nombre: str = None, ruta: str = None) -> Dict:
+        """
+        Clasifica un documento y registra su firma
+
+        Returns:
+            Dict con 'duplicado' (bool), 'grupo' (id del original del grupo) y
+            'similitud' con el original (1.0 si es el original)
+        """
+        with self._conexion() as conn:
+            previo = conn.execute(
+                "SELECT grupo, duplicado, similitud FROM firmas WHERE indice = ? AND id_documento = ?",
+                (indice, id_documento)
+            ).fetchone()
+            if previo:
+                # El mismo documento recargado conserva su clasificación, salvo
+                # que sea copia de un original que ya no existe
+                if not previo[1] or self._original_vigente(conn, indice, previo[0]):
+                    return {'duplicado': bool(previo[1]), 'grupo': previo[0], 'similitud': previo[2]}
+                self._olvidar(conn, indice, previo[0])
+                self._olvidar(conn, indice, id_documento)
+
+            firma = self.firma(texto)
+            if firma is None:
+                return {'duplicado': False, 'grupo': id_documento, 'similitud': 1.0}
+            claves = self._claves_bandas(firma)
+
+            candidatos = set()
+            for banda, clave in enumerate(claves):
+                for (candidato,) in conn.execute(
+                        "SELECT id_documento FROM bandas WHERE indice = ? AND banda = ? AND clave = ?",
+                        (indice, banda, clave)):
+                    candidatos.add(candidato)
+
+            coincidencias = []
+            for candidato in candidatos:
+                fila = conn.execute(
+                    "SELECT grupo, firma FROM firmas WHERE indice = ? AND id_documento = ?",
+                    (indice, candidato)
+                ).fetchone()
+                if not fila:
+                    continue
+                sim = self.similitud(firma, np.frombuffer(fila[1], dtype=np.uint32))
+                if sim >= self.umbral:
+                    coincidencias.append((sim, fila[0]))
+
+            # El original más parecido que siga existiendo; los borrados se olvidan
+            mejor = None
+            for sim, grupo in sorted(coincidencias, reverse=True):
+                if self._original_vigente(conn, indice, grupo):
+                    mejor = (grupo, sim)
+                    break
+                self._olvidar(conn, indice, grupo)
+
+            duplicado = mejor is not None
+            grupo, sim = mejor if duplicado else (id_documento, 1.0)
+
+            if duplicado and self.modo == 'omitir':
+                return {'duplicado': True, 'grupo': grupo, 'similitud': sim}
+
+            conn.execute(
+                "INSERT INTO firmas (indice, id_documento, grupo, duplicado, similitud, nombre, ruta, firma, creado) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (indice, id_documento, grupo, int(duplicado), sim, nombre, ruta,
+                 firma.tobytes(), time.time())
+            )
+            # Solo los originales entran a las bandas: los duplicados se agrupan con ellos
+            if not duplicado:
+                conn.executemany(
+                    "INSERT INTO bandas (indice, banda, clave, id_documento) VALUES (?, ?, ?, ?)",
+                    [(indice, banda, clave, id_documento) for banda, clave in enumerate(claves)]
+                )
+
+        return {'duplicado': duplicado, 'grupo': grupo, 'similitud': sim}
+
+    def filtrar(self, indice: str, documentos: Iterable[Dict], estadisticas: Dict = None) -> Iterator[Dict]:
+        """
+        Etapa de la ingesta entre extracción e indexación: aplica el modo a cada
+        documento con 'texto_completo'; el resto pasa sin cambios
+
+        Args:
+            indice: Índice de destino (las firmas se comparan solo dentro de él)
+            documentos: Iterable de documentos con 'id_documento' y 'texto_completo'
+            estadisticas: Dict opcional donde se acumulan 'revisados' y 'duplicados'
+
+        Returns:
+            Iterador de documentos a indexar
+        """
+        if estadisticas is None:
+            estadisticas = {}
+        estadisticas.setdefault('revisados', 0)
+        estadisticas.setdefault('duplicados', 0)
+
+        for doc in documentos:
+            texto = doc.get('texto_completo')
+            id_documento = doc.get('id_documento')
+            if not texto or not id_documento:
+                yield doc
+                continue
+
+            estadisticas['revisados'] += 1
+            resultado = self.clasificar(indice, id_documento, texto,
+                                        doc.get('nombre_archivo'), doc.get('ruta'))
+            if not resultado['duplicado']:
+                if self.modo == 'version':
+                    doc['grupo_duplicados'] = resultado['grupo']
+                yield doc
+                continue
+
+            estadisticas['duplicados'] += 1
+            if self.modo == 'version':
+                doc['grupo_duplicados'] = resultado['grupo']
+                doc['version_de'] = resultado['grupo']
+                doc['similitud_original'] = round(resultado['similitud'], 3)
+                yield doc
+
+    # ------------------------------------------------------------------
+    # Consulta y mantenimiento
+    # ------------------------------------------------------------------
+
+    def grupo(self, indice: str, id_documento: str) -> List[Dict]:
+        """Documentos registrados en el mismo grupo que id_documento (original primero)"""
+        try:
+            with self._conexion() as conn:
+                fila = conn.execute("SELECT grupo FROM firmas WHERE indice = ? AND id_documento = ?",
+                                    (indice, id_documento)).fetchone()
+                if not fila:
+                    return []
+                return [
+                    {'id_documento': d, 'duplicado': bool(dup), 'similitud': sim, 'nombre': n, 'ruta': r}
+                    for d, dup, sim, n, r in conn.execute(
+                        "SELECT id_documento, duplicado, similitud, nombre, ruta FROM firmas "
+                        "WHERE indice = ? AND grupo = ? ORDER BY duplicado, creado",
+                        (indice, fila[0]))
+                ]
+        except Exception as e:
+            print(f"Error al consultar grupo de duplicados: {e}")
+            return []
+
+    def estadisticas(self, indice: str = None) -> Dict:
+        """Documentos, duplicados y grupos registrados (de un índice o de todos)"""
+        try:
+            filtro, parametros = ("WHERE indice = ?", (indice,)) if indice else ("", ())
+            with self._conexion() as conn:
+                total, duplicados, grupos = conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(duplicado), 0), COUNT(DISTINCT grupo) FROM firmas {filtro}",
+                    parametros
+                ).fetchone()
+            return {'documentos': total, 'duplicados': duplicados, 'grupos': grupos}
+        except Exception as e:
+            return {'error': str(e)}
+
+    def limpiar(self, indice: str = None) -> bool:
+        """Elimina las firmas de un índice (p. ej. al borrarlo) o todas"""
+        try:
+            filtro, parametros = ("WHERE indice = ?", (indice,)) if indice else ("", ())
+            with self._conexion() as conn:
+                conn.execute(f"DELETE FROM firmas {filtro}", parametros)
+                conn.execute(f"DELETE FROM bandas {filtro}", parametros)
+            return True
+        except Exception as e:
+            print(f"Error al limpiar firmas de duplicados: {e}")
+            return False
@@ -1,10 +1,60 @@
-from elasticsearch import Elasticsearch
-from elasticsearch.helpers import bulk
-from typing import Dict, List, Optional, Any
+from elasticsearch import Elasticsearch, ConnectionError as ErrorConexion, ConnectionTimeout
+from Helpers.funciones import Funciones
+from Helpers.indexadorBulk import IndexadorBulk
+from typing import Callable, Dict, Iterable, List, Optional, Any, Tuple
+from contextlib import contextmanager, ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+import base64
+import html
 import json
+import os
+import re
+import socket
+import threading
+import time
 
 
 class ElasticSearch:
+    # Sufijo del índice compañero con los pasajes de cada documento
+    SUFIJO_FRAGMENTOS = "_fragmentos"
+    # Sufijo de las versiones concretas detrás de un alias (index_proyecto_v1, _v2...)
+    SUFIJO_VERSION = "_v"
+
+    MAPPINGS_FRAGMENTOS = {
+        "properties": {
+            "id_padre": {"type": "keyword"},
+            "numero": {"type": "integer"},
+            "texto": {"type": "text", "analyzer": "spanish"},
+            "nombre_archivo": {
+                "type": "text",
+                "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}
+            },
+            "ruta": {"type": "keyword"},
+            "fecha": {"type": "date"},
+            "grupo_duplicados": {"type": "keyword"},
+            "version_de": {"type": "keyword"}
+        }
+    }
+
+    # Campo dense_vector con el embedding de cada documento y de cada pasaje
+    CAMPO_VECTOR = "vector"
+    # Marca liviana de que el documento ya tiene vector (se consulta sin traer el vector)
+    CAMPO_CON_VECTOR = "con_vector"
+
+    # Ajustes aplicados mientras dura una carga masiva (ver modo_carga_masiva)
+    AJUSTES_CARGA_MASIVA = {"refresh_interval": "-1", "number_of_replicas": 0}
+    # Ajustes originales de las cargas en curso y los procesos que las hacen
+    # ("host:pid" -> inicio), para restaurarlos si el proceso muere
+    RUTA_CARGAS_PENDIENTES = "cache/cargas_masivas.json"
+    # Segundos tras los que una carga de otro proceso se da por muerta aunque
+    # su PID siga existiendo (o no se pueda comprobar: otro host, Windows)
+    VIGENCIA_CARGA_MASIVA = 24 * 3600
+
+    # Cargas masivas en curso por índice en este proceso, compartidas entre hilos y trabajos
+    _cargas_activas: Dict[str, int] = {}
+    _lock_cargas = threading.Lock()
+
     def __init__(self, cloud_id: str, api_key: str):
         """Inicializa conexión a Elasticsearch Cloud"""
         self.client = Elasticsearch(
@@ -12,6 +62,29 @@ class ElasticSearch:
             api_key=api_key,
             verify_certs=True
         )
+        # Funciones llamadas con el índice tras cada escritura (p. ej. invalidar caches)
+        self.al_escribir: List[Callable[[str], None]] = []
+        # Funciones llamadas con el nombre de cada índice que se elimina (p. ej. borrar firmas)
+        self.al_eliminar_indice: List[Callable[[str], None]] = []
+        # Índices en los que ya se comprobó el mapping del campo vector
+        self._vectores_mapeados = set()
+
+    def notificar_escritura(self, index: str):
+        """Avisa a los suscriptores de al_escribir que cambió el contenido de 'index'"""
+        for funcion in self.al_escribir:
+            try:
+                funcion(index)
+            except Exception as e:
+                print(f"Error al notificar escritura en {index}: {e}")
+
+    def notificar_eliminacion(self, index: str):
+        """Avisa a los suscriptores de al_eliminar_indice que 'index' ya no existe"""
+        for funcion in self.al_eliminar_indice:
+            try:
+                funcion(index)
+            except Exception as e:
+                print(f"Error al notificar eliminación de {index}: {e}")
+        self.notificar_escritura(index)
 
     def test_connection(self) -> bool:
         """Prueba la conexión a Elasticsearch"""
@@ -23,6 +96,11 @@ class ElasticSearch:
             print(f"❌ Error al conectar con Elastic: {e}")
             return False
 
+    @staticmethod
+    def es_error_conexion(e: Exception) -> bool:
+        """Indica si el error es que el clúster no responde (y no un error de la petición)"""
+        return isinstance(e, (ErrorConexion, ConnectionTimeout))
+
     # ---------------------------------------------------------------------
     # COMANDOS ADMIN
     # ---------------------------------------------------------------------
@@ -45,15 +123,18 @@ class ElasticSearch:
                     body["settings"] = settings
 
                 resp = self.client.indices.create(index=index, body=body)
+                self.notificar_escritura(index)
                 return {"success": True, "data": resp}
 
             elif operacion == 'eliminar_index':
                 resp = self.client.indices.delete(index=index)
+                self.notificar_eliminacion(index)
                 return {"success": True, "data": resp}
 
             elif operacion == 'actualizar_mappings':
                 mappings = comando.get('mappings', {})
                 resp = self.client.indices.put_mapping(index=index, body=mappings)
+                self.notificar_escritura(index)
                 return {"success": True, "data": resp}
 
             elif operacion == 'info_index':
@@ -82,6 +163,7 @@ class ElasticSearch:
                 body["settings"] = settings
 
             self.client.indices.create(index=nombre_index, body=body)
+            self.notificar_escritura(nombre_index)
             return True
         except Exception as e:
             print(f"Error al crear índice: {e}")
@@ -91,6 +173,7 @@ class ElasticSearch:
         """Elimina un índice"""
         try:
             self.client.indices.delete(index=nombre_index)
+            self.notificar_eliminacion(nombre_index)
             return True
         except Exception as e:
             print(f"Error al eliminar índice: {e}")
@@ -125,26 +208,991 @@ class ElasticSearch:
     def indexar_documento(self, index: str, documento: Dict, doc_id: str = None) -> bool:
         """Indexa un documento individual"""
         try:
+            documento = self.marcar_escritura(documento)
             if doc_id:
                 self.client.index(index=index, id=doc_id, document=documento)
             else:
                 self.client.index(index=index, document=documento)
+            self.notificar_escritura(index)
             return True
         except Exception as e:
             print(f"Error al indexar documento: {e}")
             return False
 
-    def indexar_bulk(self, index: str, documentos: List[Dict]) -> Dict:
-        """Indexación masiva"""
+    def indexar_bulk(self, index: str, documentos: List[Dict], op_type: str = "index",
+                     estrategia_id: str = "contenido", omitir_sin_cambios: bool = True) -> Dict:
+        """
+        Indexación masiva de una lista de documentos con _id estable (ver indexar_streaming)
+
+        Returns:
+            Dict con 'success', 'indexados', 'creados', 'actualizados', 'sin_cambios',
+            'existentes', 'errores' (cantidad) y 'documentos' (resultado por documento)
+        """
+        return self.indexar_streaming(index, documentos, op_type=op_type,
+                                      estrategia_id=estrategia_id,
+                                      omitir_sin_cambios=omitir_sin_cambios)
+
+    # Momento (UTC) de la última escritura de cada documento hecha por la aplicación;
+    # reindexar_con_alias copia por él lo que cambió mientras copiaba
+    CAMPO_INDEXADO_EN = "indexado_en"
+
+    # Campos que cambian en cada carga sin que cambie el documento
+    CAMPOS_VOLATILES = ("fecha", "hash_contenido", CAMPO_VECTOR, CAMPO_CON_VECTOR, CAMPO_INDEXADO_EN)
+
+    @staticmethod
+    def marca_tiempo(segundos: float = 0) -> str:
+        """Instante actual (más 'segundos') en UTC, ISO 8601 con milisegundos"""
+        return (datetime.now(timezone.utc) + timedelta(seconds=segundos)).isoformat(timespec="milliseconds")
+
+    @classmethod
+    def marcar_escritura(cls, documento: Dict) -> Dict:
+        """Copia del documento con CAMPO_INDEXADO_EN en el instante actual"""
+        return {**documento, cls.CAMPO_INDEXADO_EN: cls.marca_tiempo()}
+
+    @classmethod
+    def hash_contenido(cls, documento: Dict) -> str:
+        """SHA-256 del documento serializado de forma canónica, sin campos volátiles"""
+        estable = {k: v for k, v in documento.items() if k not in cls.CAMPOS_VOLATILES}
+        return Funciones.calcular_hash_texto(
+            json.dumps(estable, sort_keys=True, ensure_ascii=False, default=str))
+
+    @classmethod
+    def id_estable(cls, documento: Dict, estrategia: str = "contenido") -> str:
+        """
+        _id determinista de un documento, para que recargar el mismo origen
+        reemplace el documento en vez de duplicarlo
+
+        Args:
+            estrategia: 'contenido' -> 'id_documento' (hash del archivo o del texto) o,
+                        si no existe, hash del documento completo;
+                        'url' -> hash de 'url' o 'ruta' de origen (una versión nueva
+                        del mismo archivo reemplaza a la anterior)
+        """
+        if estrategia == "url":
+            origen = documento.get("url") or documento.get("ruta")
+            if origen:
+                return Funciones.calcular_hash_texto(origen)
+        return documento.get("id_documento") or cls.hash_contenido(documento)
+
+    def _hashes_guardados(self, index: str, ids: List[str]) -> Dict[str, Dict]:
+        """hash_contenido y marca de vector almacenados para cada _id existente (una sola petición _mget)"""
+        try:
+            resp = self.client.mget(index=index, ids=ids, source=["hash_contenido", self.CAMPO_CON_VECTOR])
+            return {d["_id"]: d.get("_source", {}) for d in resp.get("docs", []) if d.get("found")}
+        except Exception:
+            # Índice inexistente o error transitorio: se indexa todo
+            return {}
+
+    def indexar_streaming(self, index: str, documentos: Iterable[Dict], chunk_size: int = 100,
+                          max_mb_por_lote: float = 10, hilos: int = 1, took_objetivo_ms: int = 1000,
+                          max_reintentos: int = 5, max_errores_detalle: int = 20, trabajo=None,
+                          fragmentos: bool = False, op_type: str = "index",
+                          estrategia_id: str = "contenido", omitir_sin_cambios: bool = True,
+                          max_detalle_documentos: int = 1000, carga_masiva_desde: int = None,
+                          force_merge: bool = False,
+                          vectorizador: Callable[[List[str]], List[List[float]]] = None) -> Dict:
+        """
+        Indexa documentos a medida que llegan desde un iterable o generador.
+        Nunca se materializa la lista completa: los lotes se arman con hasta
+        chunk_size documentos o max_mb_por_lote MB y se envían en cuanto están
+        listos, así que los documentos son buscables mientras el lote sigue.
+        El envío lo hace IndexadorBulk: reintenta con backoff los rechazos 429 / 503
+        y ajusta el tamaño del lote y las peticiones en paralelo (hasta 'hilos')
+        según el 'took' de cada respuesta.
+
+        Cada documento recibe un _id estable (id_estable) y un 'hash_contenido';
+        antes de enviar cada grupo de chunk_size documentos se consulta con _mget
+        el hash guardado y se omiten los que no cambiaron, así que recargar la
+        misma carpeta no duplica documentos ni reenvía texto.
+
+        Con 'vectorizador' cada documento (y cada pasaje, si hay fragmentos)
+        recibe su embedding en el campo CAMPO_VECTOR. Se calcula por grupo de
+        chunk_size documentos (una llamada al modelo para los documentos y otra
+        para todos sus pasajes) y solo para los que sí se envían; un documento
+        sin cambios que todavía no tiene vector (CAMPO_CON_VECTOR) también se
+        envía, para completar los vectores de cargas anteriores.
+
+        Args:
+            index: Índice destino
+            documentos: Iterable de documentos
+            chunk_size: Documentos máximos por petición _bulk
+            max_mb_por_lote: Tamaño máximo de cada petición _bulk en MB
+            hilos: Peticiones _bulk concurrentes como máximo (1 = streaming secuencial)
+            took_objetivo_ms: 'took' por lote buscado al ajustar el tamaño del lote
+            max_reintentos: Reintentos de cada lote ante 429 / 503 antes de contarlo como error
+            max_errores_detalle: Errores individuales incluidos en la respuesta
+            trabajo: Trabajo de GestorTrabajos opcional para reportar progreso y cancelar
+            fragmentos: Si True, también indexa los pasajes de cada documento en el
+                        índice compañero (ver indice_fragmentos)
+            op_type: 'index' (crea o reemplaza), 'create' (solo crea; los existentes
+                     se reportan en 'existentes') o 'update' (actualización parcial
+                     con upsert)
+            estrategia_id: 'contenido' o 'url' (ver id_estable)
+            omitir_sin_cambios: No reenviar documentos cuyo hash_contenido coincide
+            max_detalle_documentos: Resultados por documento incluidos en la respuesta
+            carga_masiva_desde: Al llegar a este número de documentos se pasa el
+                                índice a modo_carga_masiva hasta el final (None = nunca)
+            force_merge: Fusionar segmentos al salir del modo carga masiva
+            vectorizador: Función que recibe una lista de textos y devuelve sus
+                          vectores (p. ej. PLN.generar_embeddings); None = sin vectores
+
+        Returns:
+            Dict con 'success', 'indexados' (creados + actualizados), 'creados',
+            'actualizados', 'sin_cambios', 'existentes', 'fragmentos', 'errores',
+            'errores_detalle', 'documentos' ([{'_id', 'resultado', 'error'?}]) y
+            'bulk' (lotes, reintentos, throughput y últimos lotes; ver IndexadorBulk)
+            y 'carga_masiva' (si se usó el modo carga masiva)
+        """
+        if op_type not in ("index", "create", "update"):
+            return {"success": False, "error": f"op_type no soportado: {op_type}"}
+
         try:
-            acciones = [{"_index": index, "_source": doc} for doc in documentos]
+            if fragmentos:
+                self.asegurar_indice_fragmentos(index)
+
+            conteo = {"creados": 0, "actualizados": 0, "sin_cambios": 0, "existentes": 0,
+                      "errores": 0, "fragmentos": 0}
+            detalle = []
+            errores_detalle = []
+            num_fragmentos = {}
+            padres_reemplazados = []
+            usa_carga_masiva = []
+
+            def registrar(doc_id: str, resultado: str, error=None):
+                if len(detalle) < max_detalle_documentos:
+                    detalle.append({"_id": doc_id, "resultado": resultado, **({"error": error} if error else {})})
+
+            def accion(doc_id: str, doc: Dict) -> Dict:
+                if op_type == "update":
+                    return {"_op_type": "update", "_index": index, "_id": doc_id,
+                            "doc": doc, "doc_as_upsert": True}
+                return {"_op_type": op_type, "_index": index, "_id": doc_id, "_source": doc}
+
+            def acciones():
+                grupo = []
+                for n, doc in enumerate(documentos, 1):
+                    if n == carga_masiva_desde:
+                        activos = carga_masiva.enter_context(
+                            self.modo_carga_masiva(index, fragmentos=fragmentos, force_merge=force_merge))
+                        usa_carga_masiva.extend(activos)
+                    grupo.append(doc)
+                    if len(grupo) >= chunk_size:
+                        yield from acciones_grupo(grupo)
+                        grupo = []
+                if grupo:
+                    yield from acciones_grupo(grupo)
 
-            success, errors = bulk(self.client, acciones, raise_on_error=False)
+            def acciones_grupo(grupo: List[Dict]):
+                preparados = []
+                for doc in grupo:
+                    doc["hash_contenido"] = self.hash_contenido(doc)
+                    preparados.append((self.id_estable(doc, estrategia_id), doc))
+
+                guardados = {}
+                if omitir_sin_cambios and op_type != "create":
+                    guardados = self._hashes_guardados(index, [doc_id for doc_id, _ in preparados])
+
+                pendientes = []
+                marca = self.marca_tiempo()
+                for doc_id, doc in preparados:
+                    guardado = guardados.get(doc_id, {})
+                    # Con vectorizador, un documento igual pero sin vector se reenvía
+                    # (p. ej. al activar los embeddings después de la primera carga)
+                    falta_vector = (vectorizador is not None and doc.get("texto_completo")
+                                    and not guardado.get(self.CAMPO_CON_VECTOR))
+                    if guardado.get("hash_contenido") == doc["hash_contenido"] and not falta_vector:
+                        conteo["sin_cambios"] += 1
+                        registrar(doc_id, "sin_cambios")
+                        if trabajo:
+                            trabajo.avanzar('indexacion')
+                        continue
+                    # Los pasajes la heredan al copiar los metadatos del padre
+                    doc[self.CAMPO_INDEXADO_EN] = marca
+                    pendientes.append((doc_id, doc))
+
+                if vectorizador and pendientes:
+                    self._agregar_vectores(index, [doc for _, doc in pendientes], vectorizador,
+                                           campo_texto="texto_completo", fragmentos=fragmentos)
+
+                por_documento = {}
+                if fragmentos:
+                    por_documento = {doc_id: list(self.generar_acciones_fragmentos(index, doc, id_padre=doc_id))
+                                     for doc_id, doc in pendientes}
+                    # Los pasajes de todo el grupo en una sola llamada al modelo
+                    if vectorizador:
+                        self._agregar_vectores(index, [a["_source"] for acciones_doc in por_documento.values()
+                                                       for a in acciones_doc],
+                                               vectorizador, campo_texto="texto", fragmentos=fragmentos)
+
+                for doc_id, doc in pendientes:
+                    yield accion(doc_id, doc)
+                    if fragmentos:
+                        yield from por_documento[doc_id]
+                        num_fragmentos[doc_id] = len(por_documento[doc_id])
+
+            indexador = IndexadorBulk(self.client, max_hilos=hilos, max_docs_por_lote=chunk_size,
+                                      max_mb_por_lote=max_mb_por_lote,
+                                      took_objetivo_ms=took_objetivo_ms,
+                                      max_reintentos=max_reintentos)
+
+            with ExitStack() as carga_masiva:
+                for ok, item in indexador.ejecutar(acciones()):
+                    respuesta = next(iter(item.values()), {})
+                    if fragmentos and self.es_indice_fragmentos(respuesta.get('_index', ''), index):
+                        if ok:
+                            conteo["fragmentos"] += 1
+                        else:
+                            conteo["errores"] += 1
+                            if len(errores_detalle) < max_errores_detalle:
+                                errores_detalle.append(item)
+                        continue
+
+                    doc_id = respuesta.get('_id')
+                    if ok and respuesta.get('result') == 'created':
+                        conteo["creados"] += 1
+                        registrar(doc_id, "creado")
+                    elif ok and respuesta.get('result') == 'noop':
+                        conteo["sin_cambios"] += 1
+                        registrar(doc_id, "sin_cambios")
+                    elif ok:
+                        conteo["actualizados"] += 1
+                        registrar(doc_id, "actualizado")
+                        padres_reemplazados.append(doc_id)
+                    elif respuesta.get('status') == 409 and op_type == "create":
+                        conteo["existentes"] += 1
+                        registrar(doc_id, "existente")
+                    else:
+                        conteo["errores"] += 1
+                        registrar(doc_id, "error", respuesta.get('error'))
+                        if len(errores_detalle) < max_errores_detalle:
+                            errores_detalle.append(item)
+                    if trabajo:
+                        trabajo.avanzar('indexacion', errores=0 if ok else 1)
+
+                if fragmentos and padres_reemplazados:
+                    self._eliminar_fragmentos_sobrantes(
+                        index, {doc_id: num_fragmentos.get(doc_id, 0) for doc_id in padres_reemplazados})
 
             return {
                 "success": True,
-                "indexados": success,
-                "errores": errors
+                "indexados": conteo["creados"] + conteo["actualizados"],
+                **conteo,
+                "errores_detalle": errores_detalle,
+                "documentos": detalle,
+                "bulk": indexador.estadisticas(),
+                "carga_masiva": bool(usa_carga_masiva)
+            }
+        except Exception as e:
+            if trabajo and trabajo.cancelado():
+                raise
+            return {"success": False, "error": str(e)}
+        finally:
+            # También tras un fallo: los lotes ya enviados quedaron escritos
+            self.notificar_escritura(index)
+
+    # ---------------------------------------------------------------------
+    # EMBEDDINGS (campo dense_vector para la búsqueda semántica)
+    # ---------------------------------------------------------------------
+
+    def asegurar_campo_vector(self, index: str, dims: int, fragmentos: bool = False) -> bool:
+        """
+        Agrega el campo CAMPO_VECTOR (dense_vector indexado para kNN) al mapping
+        de 'index' y, con fragmentos, al de su índice de pasajes. Los vectores se
+        guardan normalizados, así que se usa la similitud dot_product.
+        Sin este paso Elastic mapearía la lista de números como float.
+        """
+        mapping = {self.CAMPO_VECTOR: {"type": "dense_vector", "dims": dims, "index": True,
+                                       "similarity": "dot_product"}}
+        indices = [index] + ([self.indice_fragmentos(index)] if fragmentos else [])
+        ok = True
+        for indice in indices:
+            if indice in self._vectores_mapeados:
+                continue
+            try:
+                if not self.existe_indice(indice):
+                    self.crear_index(indice)
+                self.client.indices.put_mapping(index=indice, properties=mapping)
+                self._vectores_mapeados.add(indice)
+            except Exception as e:
+                # Un mapping previo distinto (otras dims u otro tipo) no se puede cambiar
+                # sin reindexar (ver reindexar_con_alias)
+                print(f"Error al mapear el campo vector en {indice}: {e}")
+                ok = False
+        return ok
+
+    def _agregar_vectores(self, index: str, fuentes: List[Dict],
+                          vectorizador: Callable[[List[str]], List[List[float]]],
+                          campo_texto: str, fragmentos: bool = False,
+                          max_caracteres: int = 2000):
+        """
+        Calcula en una sola llamada los embeddings de 'fuentes' (a partir de
+        'campo_texto', recortado a max_caracteres porque el modelo trunca de
+        todas formas) y los guarda en CAMPO_VECTOR. Si el modelo falla, los
+        documentos se indexan igual, sin vector.
+        """
+        con_texto = [fuente for fuente in fuentes if fuente.get(campo_texto)]
+        if not con_texto:
+            return
+        try:
+            vectores = vectorizador([str(fuente[campo_texto])[:max_caracteres] for fuente in con_texto])
+        except Exception as e:
+            print(f"Error al generar embeddings: {e}")
+            return
+        if vectores:
+            self.asegurar_campo_vector(index, len(vectores[0]), fragmentos=fragmentos)
+        for fuente, vector in zip(con_texto, vectores):
+            fuente[self.CAMPO_VECTOR] = [float(x) for x in vector]
+            fuente[self.CAMPO_CON_VECTOR] = True
+
+    # ---------------------------------------------------------------------
+    # MODO CARGA MASIVA (sin refresh ni réplicas mientras se indexa)
+    # ---------------------------------------------------------------------
+
+    def _leer_cargas_pendientes(self) -> Dict[str, Dict]:
+        """{índice: {'originales': ajustes, 'cargas': {"host:pid": inicio}}}"""
+        try:
+            with open(self.RUTA_CARGAS_PENDIENTES, 'r', encoding='utf-8') as f:
+                pendientes = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        # Formato anterior: solo los ajustes originales, sin procesos
+        return {index: entrada if 'originales' in entrada else {'originales': entrada, 'cargas': {}}
+                for index, entrada in pendientes.items()}
+
+    @staticmethod
+    def _proceso_actual() -> str:
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def _carga_viva(self, proceso: str, inicio: float) -> bool:
+        """Indica si la carga masiva de otro proceso puede seguir en curso"""
+        if time.time() - inicio > self.VIGENCIA_CARGA_MASIVA:
+            return False
+        host, _, pid = proceso.rpartition(':')
+        # En Windows os.kill(pid, 0) termina el proceso: ahí solo cuenta la vigencia
+        if host != socket.gethostname() or os.name == 'nt':
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except (ProcessLookupError, ValueError):
+            return False
+        except OSError:
+            pass
+        return True
+
+    def _cargas_de_otros(self, entrada: Dict) -> Dict[str, float]:
+        """Cargas vigentes de otros procesos sobre el índice de 'entrada'"""
+        propio = self._proceso_actual()
+        return {proceso: inicio for proceso, inicio in entrada.get('cargas', {}).items()
+                if proceso != propio and self._carga_viva(proceso, inicio)}
+
+    def _guardar_cargas_pendientes(self, pendientes: Dict[str, Dict]):
+        try:
+            carpeta = os.path.dirname(self.RUTA_CARGAS_PENDIENTES)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            temporal = f"{self.RUTA_CARGAS_PENDIENTES}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(pendientes, f, ensure_ascii=False)
+            os.replace(temporal, self.RUTA_CARGAS_PENDIENTES)
+        except Exception as e:
+            print(f"Error al guardar cargas masivas pendientes: {e}")
+
+    def _ajustes_indice(self, index: str) -> Dict:
+        """Valores actuales de los ajustes que cambia la carga masiva (None = por defecto)"""
+        resp = self.client.indices.get_settings(index=index, flat_settings=True)
+        ajustes = next(iter(resp.values()), {}).get("settings", {})
+        return {clave: ajustes.get(f"index.{clave}") for clave in self.AJUSTES_CARGA_MASIVA}
+
+    def _aplicar_ajustes(self, index: str, ajustes: Dict, reintentos: int = 3) -> bool:
+        """put_settings ajuste por ajuste (un clúster puede rechazar las réplicas y aceptar el refresh)"""
+        todos = True
+        for clave, valor in ajustes.items():
+            for intento in range(reintentos):
+                try:
+                    self.client.indices.put_settings(index=index, settings={"index": {clave: valor}})
+                    break
+                except Exception as e:
+                    if intento == reintentos - 1:
+                        print(f"Error al cambiar {clave} de {index}: {e}")
+                        todos = False
+                    else:
+                        time.sleep(2 ** intento)
+        return todos
+
+    def _iniciar_carga_masiva(self, index: str) -> bool:
+        """Guarda los ajustes originales y desactiva refresh y réplicas (solo la primera carga)"""
+        with self._lock_cargas:
+            activas = self._cargas_activas.get(index, 0)
+            self._cargas_activas[index] = activas + 1
+            if activas:
+                return True
+
+            pendientes = self._leer_cargas_pendientes()
+            entrada = pendientes.get(index)
+            try:
+                # Si otra carga (viva o interrumpida) ya los guardó, los originales son esos
+                originales = entrada['originales'] if entrada else self._ajustes_indice(index)
+            except Exception as e:
+                print(f"Error al leer ajustes de {index}: {e}")
+                self._cargas_activas[index] = 0
+                return False
+
+            cargas = self._cargas_de_otros(entrada) if entrada else {}
+            cargas[self._proceso_actual()] = time.time()
+            pendientes[index] = {'originales': originales, 'cargas': cargas}
+            self._guardar_cargas_pendientes(pendientes)
+            self._aplicar_ajustes(index, self.AJUSTES_CARGA_MASIVA)
+            return True
+
+    def _terminar_carga_masiva(self, index: str, force_merge: bool, max_segmentos: int):
+        """Restaura los ajustes originales cuando termina la última carga sobre el índice"""
+        with self._lock_cargas:
+            self._cargas_activas[index] -= 1
+            if self._cargas_activas[index] > 0:
+                return
+
+            pendientes = self._leer_cargas_pendientes()
+            entrada = pendientes.get(index)
+            if entrada is not None:
+                entrada['cargas'] = self._cargas_de_otros(entrada)
+                # Si otro proceso sigue cargando, restaura él al terminar
+                if not entrada['cargas'] and self._aplicar_ajustes(index, entrada['originales']):
+                    del pendientes[index]
+                self._guardar_cargas_pendientes(pendientes)
+
+        try:
+            self.client.indices.refresh(index=index)
+            if force_merge:
+                self.client.options(request_timeout=3600).indices.forcemerge(
+                    index=index, max_num_segments=max_segmentos)
+        except Exception as e:
+            print(f"Error al refrescar {index} tras la carga masiva: {e}")
+
+    @contextmanager
+    def modo_carga_masiva(self, index: str, fragmentos: bool = False, force_merge: bool = False,
+                          max_segmentos: int = 1):
+        """
+        Contexto para cargas grandes: desactiva refresh_interval y réplicas de
+        'index' (y de su índice de fragmentos) mientras dura el bloque, y al
+        salir, aunque la carga falle, restaura los ajustes originales, refresca
+        y opcionalmente hace force-merge. Cargas simultáneas sobre el mismo
+        índice comparten el modo: lo restaura la última en terminar. Los
+        originales quedan en RUTA_CARGAS_PENDIENTES hasta restaurarse, así que
+        un proceso que muere a mitad de carga los recupera con
+        restaurar_cargas_pendientes().
+
+        Args:
+            index: Índice destino (se crea si no existe)
+            fragmentos: Incluir el índice de fragmentos (se crea si no existe)
+            force_merge: Fusionar segmentos al terminar
+            max_segmentos: Segmentos por shard tras el force-merge
+
+        Yields:
+            Lista de índices en modo carga masiva
+        """
+        indices = []
+        if self.existe_indice(index) or self.crear_index(index):
+            indices.append(index)
+        if fragmentos and self.asegurar_indice_fragmentos(index):
+            indices.append(self.indice_fragmentos(index))
+
+        activos = []
+        try:
+            for nombre in indices:
+                if self._iniciar_carga_masiva(nombre):
+                    activos.append(nombre)
+            yield activos
+        finally:
+            for nombre in activos:
+                self._terminar_carga_masiva(nombre, force_merge, max_segmentos)
+
+    def restaurar_cargas_pendientes(self) -> List[str]:
+        """
+        Restaura los ajustes de cargas masivas interrumpidas por una caída del
+        proceso. Se saltan las cargas que otro proceso (p. ej. otro worker)
+        sigue haciendo, y si Elastic no responde la entrada se conserva para
+        el próximo intento.
+        """
+        restaurados = []
+        with self._lock_cargas:
+            pendientes = self._leer_cargas_pendientes()
+            cambios = False
+            for index, entrada in list(pendientes.items()):
+                if self._cargas_activas.get(index):
+                    continue
+                vivas = self._cargas_de_otros(entrada)
+                if vivas != entrada['cargas']:
+                    entrada['cargas'] = vivas
+                    cambios = True
+                if vivas:
+                    continue
+                try:
+                    existe = bool(self.client.indices.exists(index=index))
+                except Exception as e:
+                    print(f"No se pudo comprobar {index}; se restaurará más tarde: {e}")
+                    continue
+                if not existe or self._aplicar_ajustes(index, entrada['originales']):
+                    del pendientes[index]
+                    restaurados.append(index)
+                    cambios = True
+            if cambios:
+                self._guardar_cargas_pendientes(pendientes)
+        return restaurados
+
+    # ---------------------------------------------------------------------
+    # ALIAS Y REINDEXACIÓN SIN CORTE (blue/green)
+    # ---------------------------------------------------------------------
+
+    def indices_de_alias(self, alias: str) -> List[str]:
+        """Índices concretos a los que apunta un alias ([] si no es un alias)"""
+        try:
+            if not self.client.indices.exists_alias(name=alias):
+                return []
+            return sorted(self.client.indices.get_alias(name=alias).keys())
+        except Exception:
+            return []
+
+    def versiones_indice(self, alias: str) -> List[int]:
+        """Números de versión existentes de un alias (index_proyecto_v<n>)"""
+        patron = re.compile(rf"^{re.escape(alias + self.SUFIJO_VERSION)}(\d+)$")
+        try:
+            existentes = self.client.indices.get(index=f"{alias}{self.SUFIJO_VERSION}*",
+                                                 expand_wildcards="all")
+        except Exception:
+            return []
+        return sorted(int(m.group(1)) for m in map(patron.match, existentes) if m)
+
+    def nombre_version(self, alias: str, version: int) -> str:
+        """Nombre concreto de una versión; sus fragmentos van en indice_fragmentos(nombre)"""
+        return f"{alias}{self.SUFIJO_VERSION}{version}"
+
+    def _configuracion_de(self, index: str) -> Dict:
+        """Mappings y análisis de un índice existente, para copiarlos a una versión nueva"""
+        mappings = self.client.indices.get_mapping(index=index)
+        ajustes = self.client.indices.get_settings(index=index)
+        analisis = next(iter(ajustes.values()), {}).get("settings", {}).get("index", {}).get("analysis")
+        return {
+            "mappings": next(iter(mappings.values()), {}).get("mappings"),
+            "settings": {"analysis": analisis} if analisis else None
+        }
+
+    def crear_version(self, alias: str, mappings: Dict = None, settings: Dict = None,
+                      fragmentos: bool = None) -> Dict:
+        """
+        Crea la siguiente versión concreta de un alias sin tocar el alias. Sirve
+        para reindexar (reindexar_con_alias) o para re-ingestar directamente en
+        ella con indexar_streaming y luego activarla con cambiar_alias.
+
+        Args:
+            alias: Nombre público del índice (p. ej. index_proyecto)
+            mappings: Mappings nuevos; si es None se copian los del índice actual
+            settings: Settings nuevos; si es None se copia el análisis del índice actual
+            fragmentos: Crear también la versión del índice de fragmentos
+                        (None = solo si el alias ya tiene índice de fragmentos)
+
+        Returns:
+            Dict con 'success', 'version', 'indice' e 'indice_fragmentos' (o None)
+        """
+        actual = self.indices_de_alias(alias) or ([alias] if self.existe_indice(alias) else [])
+        actual_fragmentos = self.indice_fragmentos(alias)
+        if fragmentos is None:
+            fragmentos = self.existe_indice(actual_fragmentos)
+
+        try:
+            if actual and (mappings is None or settings is None):
+                copia = self._configuracion_de(actual[0])
+                mappings = copia["mappings"] if mappings is None else mappings
+                settings = copia["settings"] if settings is None else settings
+
+            version = max(self.versiones_indice(alias), default=0) + 1
+            indice = self.nombre_version(alias, version)
+            if not self.crear_index(indice, mappings=mappings, settings=settings):
+                return {"success": False, "error": f"No se pudo crear {indice}"}
+
+            indice_fragmentos = None
+            if fragmentos:
+                mappings_fragmentos = self.MAPPINGS_FRAGMENTOS
+                if self.existe_indice(actual_fragmentos):
+                    mappings_fragmentos = self._configuracion_de(actual_fragmentos)["mappings"]
+                indice_fragmentos = self.indice_fragmentos(indice)
+                if not self.crear_index(indice_fragmentos, mappings=mappings_fragmentos):
+                    self.eliminar_index(indice)
+                    return {"success": False, "error": f"No se pudo crear {indice_fragmentos}"}
+
+            return {"success": True, "version": version, "indice": indice,
+                    "indice_fragmentos": indice_fragmentos}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def cambiar_alias(self, alias: str, indice: str, eliminar_anteriores: bool = False) -> Dict:
+        """
+        Apunta el alias (y el de fragmentos, si la versión tiene) a 'indice' en
+        una sola llamada _aliases: las búsquedas pasan de la versión anterior a la
+        nueva sin ver nunca un índice vacío. También sirve para volver atrás.
+
+        Si 'alias' todavía es un índice concreto (antes de la primera migración)
+        se elimina en la misma operación, porque un alias no puede llamarse igual
+        que un índice; su contenido ya debe estar copiado en 'indice'.
+
+        Args:
+            alias: Nombre público del índice
+            indice: Versión concreta que pasa a recibir lecturas y escrituras
+            eliminar_anteriores: Borrar las versiones que dejan de estar detrás del alias
+
+        Returns:
+            Dict con 'success', 'indice' y 'anteriores'
+        """
+        pares = [(alias, indice)]
+        if self.existe_indice(self.indice_fragmentos(indice)):
+            pares.append((self.indice_fragmentos(alias), self.indice_fragmentos(indice)))
+
+        acciones = []
+        anteriores = []
+        for nombre_alias, destino in pares:
+            actuales = self.indices_de_alias(nombre_alias)
+            if actuales:
+                for viejo in actuales:
+                    if viejo != destino:
+                        acciones.append({"remove": {"index": viejo, "alias": nombre_alias}})
+                        anteriores.append(viejo)
+            elif self.existe_indice(nombre_alias):
+                acciones.append({"remove_index": {"index": nombre_alias}})
+            acciones.append({"add": {"index": destino, "alias": nombre_alias, "is_write_index": True}})
+
+        try:
+            self.client.indices.update_aliases(actions=acciones)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+        self.notificar_escritura(alias)
+
+        if eliminar_anteriores:
+            for viejo in anteriores:
+                self.eliminar_index(viejo)
+        return {"success": True, "indice": indice, "anteriores": anteriores}
+
+    def _ejecutar_reindex(self, origen: List[str], destino: str, slices="auto", query: Dict = None,
+                          trabajo=None, etapa: str = None, intervalo: float = 2.0) -> Dict:
+        """_reindex en segundo plano (con slices) siguiendo la tarea hasta que termina"""
+        fuente = {"index": origen}
+        if query:
+            fuente["query"] = query
+        tarea = self.client.reindex(source=fuente, dest={"index": destino}, slices=slices,
+                                    conflicts="proceed", wait_for_completion=False)["task"]
+        avance = 0
+        try:
+            while True:
+                estado = self.client.tasks.get(task_id=tarea)
+                status = estado.get("task", {}).get("status", {})
+                if trabajo and etapa:
+                    hechos = status.get("created", 0) + status.get("updated", 0)
+                    trabajo.etapa(etapa, total=status.get("total") or None)
+                    trabajo.avanzar(etapa, hechos - avance)
+                    avance = hechos
+                if estado.get("completed"):
+                    respuesta = estado.get("response", {})
+                    fallos = respuesta.get("failures", [])
+                    if estado.get("error") or fallos:
+                        raise RuntimeError(f"Reindex a {destino} con errores: {estado.get('error') or fallos[:3]}")
+                    if trabajo and etapa:
+                        trabajo.terminar_etapa(etapa)
+                    return {"total": respuesta.get("total", 0), "creados": respuesta.get("created", 0),
+                            "actualizados": respuesta.get("updated", 0)}
+                time.sleep(intervalo)
+        except BaseException:
+            try:
+                self.client.tasks.cancel(task_id=tarea)
+            except Exception:
+                pass
+            raise
+
+    # Segundos restados a las marcas de tiempo de los deltas (relojes desfasados)
+    MARGEN_RELOJ = 60
+
+    def _bloquear_escritura(self, indices: List[str], bloquear: bool):
+        """Activa o levanta index.blocks.write (lecturas y búsquedas siguen funcionando)"""
+        if not indices:
+            return
+        try:
+            self.client.indices.put_settings(index=indices,
+                                             settings={"index": {"blocks.write": True if bloquear else None}})
+        except Exception as e:
+            if bloquear:
+                raise
+            print(f"Error al desbloquear la escritura de {indices}: {e}")
+
+    def _copiar_delta(self, origen: List[str], destino: str, desde: str, slices, intervalo: float) -> int:
+        """Copia los documentos escritos por la aplicación desde el instante 'desde'"""
+        delta = self._ejecutar_reindex(origen, destino, slices,
+                                       query={"range": {self.CAMPO_INDEXADO_EN: {"gte": desde}}},
+                                       intervalo=intervalo)
+        return delta["total"]
+
+    def _propagar_borrados(self, origen: List[str], destino: str, tam_pagina: int = 5000) -> int:
+        """
+        Borra de 'destino' los documentos que ya no están en 'origen' (eliminados
+        durante la copia). Recorre los _id del destino con un PIT y los busca por
+        páginas en el origen.
+        """
+        self.client.indices.refresh(index=destino)
+        pit_id = self.client.open_point_in_time(index=destino, keep_alive="2m")["id"]
+        borrados = 0
+        try:
+            search_after = None
+            while True:
+                cuerpo = {"size": tam_pagina, "_source": False, "pit": {"id": pit_id, "keep_alive": "2m"},
+                          "sort": [{"_shard_doc": "asc"}]}
+                if search_after:
+                    cuerpo["search_after"] = search_after
+                hits = self.client.search(body=cuerpo)["hits"]["hits"]
+                if not hits:
+                    break
+                search_after = hits[-1]["sort"]
+                ids = [h["_id"] for h in hits]
+                encontrados = self.client.search(index=origen, query={"ids": {"values": ids}},
+                                                 size=len(ids), source=False)["hits"]["hits"]
+                ausentes = set(ids) - {h["_id"] for h in encontrados}
+                if ausentes:
+                    resp = self.client.delete_by_query(index=destino, query={"ids": {"values": list(ausentes)}},
+                                                       conflicts="proceed", refresh=False)
+                    borrados += resp.get("deleted", 0)
+        finally:
+            try:
+                self.client.close_point_in_time(id=pit_id)
+            except Exception:
+                pass
+        return borrados
+
+    def reindexar_con_alias(self, alias: str, mappings: Dict = None, settings: Dict = None,
+                            slices="auto", eliminar_anteriores: bool = False, trabajo=None,
+                            intervalo: float = 2.0) -> Dict:
+        """
+        Reindexación blue/green: crea una versión nueva con los mappings dados,
+        copia los documentos (y fragmentos) con _reindex en paralelo por slices
+        en modo carga masiva y copia en una segunda pasada lo escrito mientras
+        tanto (por CAMPO_INDEXADO_EN). Para el cambio, la versión anterior se
+        bloquea contra escritura (index.blocks.write), se copia el último delta,
+        se borran los documentos eliminados durante la copia y se cambia el
+        alias de forma atómica; al final se levanta el bloqueo. Las búsquedas
+        por el alias siguen respondiendo durante todo el proceso; las
+        escrituras que lleguen en esos segundos de bloqueo se rechazan (con
+        error para quien escribe), no se pierden en silencio.
+
+        Args:
+            alias: Nombre público del índice (p. ej. index_proyecto)
+            mappings: Mappings de la versión nueva (None = copiar los actuales)
+            settings: Settings de la versión nueva (None = copiar el análisis actual)
+            slices: Slices de _reindex ('auto' = uno por shard)
+            eliminar_anteriores: Borrar la versión anterior tras el cambio
+            trabajo: Trabajo de GestorTrabajos opcional (progreso y cancelación)
+            intervalo: Segundos entre consultas del estado de la tarea
+
+        Returns:
+            Dict con 'success', 'indice', 'anteriores', 'documentos', 'fragmentos',
+            'segunda_pasada', 'borrados' y 'duracion'
+        """
+        inicio = time.perf_counter()
+        origen = self.indices_de_alias(alias) or ([alias] if self.existe_indice(alias) else [])
+        origen_fragmentos = (self.indices_de_alias(self.indice_fragmentos(alias))
+                             or ([self.indice_fragmentos(alias)]
+                                 if self.existe_indice(self.indice_fragmentos(alias)) else []))
+
+        version = self.crear_version(alias, mappings, settings, fragmentos=bool(origen_fragmentos))
+        if not version["success"]:
+            return version
+        destino = version["indice"]
+        destino_fragmentos = version["indice_fragmentos"]
+
+        pares = []
+        if origen:
+            pares.append((origen, destino, "reindex_documentos"))
+        if origen_fragmentos and destino_fragmentos:
+            pares.append((origen_fragmentos, destino_fragmentos, "reindex_fragmentos"))
+
+        copiados = {"segunda_pasada": 0, "borrados": 0}
+        bloqueados = []
+        try:
+            try:
+                with ExitStack() as carga:
+                    for _, indice, _ in pares:
+                        carga.enter_context(self.modo_carga_masiva(indice))
+
+                    # Margen para relojes desfasados entre los servidores que escriben
+                    desde = self.marca_tiempo(-self.MARGEN_RELOJ)
+                    for fuente, indice, etapa in pares:
+                        copiados[etapa] = self._ejecutar_reindex(fuente, indice, slices, trabajo=trabajo,
+                                                                 etapa=etapa, intervalo=intervalo)
+
+                    # Lo escrito por el alias mientras corría la primera pasada
+                    ultimo_delta = self.marca_tiempo(-self.MARGEN_RELOJ)
+                    for fuente, indice, _ in pares:
+                        copiados["segunda_pasada"] += self._copiar_delta(fuente, indice, desde, slices, intervalo)
+
+                    # Sin escrituras en la versión anterior: el último delta y los
+                    # borrados quedan completos antes del cambio de alias
+                    for fuente, _, _ in pares:
+                        bloqueados.extend(fuente)
+                        self._bloquear_escritura(fuente, True)
+                    self.client.indices.refresh(index=bloqueados)
+                    for fuente, indice, _ in pares:
+                        copiados["segunda_pasada"] += self._copiar_delta(fuente, indice, ultimo_delta,
+                                                                         slices, intervalo)
+                        copiados["borrados"] += self._propagar_borrados(fuente, indice)
+            except BaseException as e:
+                # La versión a medio copiar se descarta; el alias sigue en la anterior
+                for indice in (destino, destino_fragmentos):
+                    if indice:
+                        self.eliminar_index(indice)
+                if isinstance(e, Exception) and not (trabajo and trabajo.cancelado()):
+                    return {"success": False, "error": str(e)}
+                raise
+
+            cambio = self.cambiar_alias(alias, destino, eliminar_anteriores=eliminar_anteriores)
+            if not cambio["success"]:
+                return cambio
+        finally:
+            if bloqueados:
+                # Si se borró la versión anterior (eliminar_anteriores) no hay nada que desbloquear
+                self._bloquear_escritura([i for i in bloqueados if self.existe_indice(i)], False)
+
+        return {
+            "success": True,
+            "indice": destino,
+            "anteriores": cambio["anteriores"],
+            "documentos": copiados.get("reindex_documentos", {}).get("total", 0),
+            "fragmentos": copiados.get("reindex_fragmentos", {}).get("total", 0),
+            "segunda_pasada": copiados["segunda_pasada"],
+            "borrados": copiados["borrados"],
+            "duracion": round(time.perf_counter() - inicio, 2)
+        }
+
+    # ---------------------------------------------------------------------
+    # ÍNDICE DE FRAGMENTOS (pasajes enlazados al documento padre)
+    # ---------------------------------------------------------------------
+
+    def indice_fragmentos(self, index: str) -> str:
+        """Nombre del índice compañero con los pasajes de 'index'"""
+        return f"{index}{self.SUFIJO_FRAGMENTOS}"
+
+    def es_indice_fragmentos(self, nombre: str, index: str) -> bool:
+        """
+        Indica si 'nombre' (el _index concreto de una respuesta) guarda los
+        fragmentos de 'index': el propio índice de fragmentos o, al escribir por
+        un alias, su versión concreta (index_proyecto_v2_fragmentos)
+        """
+        return nombre.startswith(self.indice_fragmentos(index)) or nombre.endswith(self.SUFIJO_FRAGMENTOS)
+
+    def existe_indice(self, index: str) -> bool:
+        """Indica si existe un índice o alias"""
+        try:
+            return bool(self.client.indices.exists(index=index))
+        except Exception:
+            return False
+
+    def asegurar_indice_fragmentos(self, index: str) -> bool:
+        """Crea el índice de fragmentos de 'index' si no existe"""
+        indice = self.indice_fragmentos(index)
+        if self.existe_indice(indice):
+            return True
+        return self.crear_index(indice, mappings=self.MAPPINGS_FRAGMENTOS)
+
+    def generar_acciones_fragmentos(self, index: str, documento: Dict, id_padre: str = None,
+                                    max_caracteres: int = 1500, solapamiento: int = 200):
+        """
+        Genera las acciones bulk con los pasajes de un documento. Cada pasaje
+        copia los metadatos del padre (sin texto_completo) y lo referencia por
+        'id_padre' (el _id del padre); su _id es determinista para que una
+        recarga lo reemplace.
+        """
+        texto = documento.get('texto_completo')
+        if not texto:
+            return
+
+        id_padre = id_padre or documento.get('id_documento') or Funciones.calcular_hash_texto(texto)
+        metadatos = {k: v for k, v in documento.items()
+                     if k not in ('texto_completo', self.CAMPO_VECTOR, self.CAMPO_CON_VECTOR)}
+        indice = self.indice_fragmentos(index)
+
+        for numero, pasaje in enumerate(
+                Funciones.dividir_en_fragmentos(texto, max_caracteres, solapamiento), 1):
+            yield {
+                "_index": indice,
+                "_id": f"{id_padre}-{numero:05d}",
+                "_source": {**metadatos, "id_padre": id_padre, "numero": numero, "texto": pasaje}
+            }
+
+    def _eliminar_fragmentos_sobrantes(self, index: str, num_fragmentos: Dict[str, int],
+                                       por_peticion: int = 200):
+        """
+        Tras reemplazar documentos, borra los pasajes de numeración mayor a la
+        nueva (una versión más corta no los sobrescribe)
+        """
+        padres = list(num_fragmentos.items())
+        for inicio in range(0, len(padres), por_peticion):
+            condiciones = [
+                {"bool": {"filter": [{"term": {"id_padre": doc_id}},
+                                     {"range": {"numero": {"gt": n}}}]}}
+                for doc_id, n in padres[inicio:inicio + por_peticion]
+            ]
+            try:
+                self.client.delete_by_query(index=self.indice_fragmentos(index),
+                                            query={"bool": {"should": condiciones}},
+                                            conflicts="proceed", refresh=True)
+            except Exception as e:
+                print(f"Error al limpiar fragmentos sobrantes: {e}")
+
+    def buscar_fragmentos(self, index: str, texto: str, size: int = 50, slop: int = 1,
+                          fragment_size: int = 200, number_of_fragments: int = 3,
+                          excluir_versiones: bool = True, filtros: List[Dict] = None) -> Dict:
+        """
+        Busca una frase en los pasajes, colapsa por documento padre y devuelve
+        el mejor pasaje de cada documento. El resaltado solo recorre el pasaje,
+        no el texto completo. Con excluir_versiones se omiten los documentos
+        marcados como versión casi duplicada de otro ('version_de'). 'filtros'
+        (p. ej. filtros_facetas) va en bool.filter: los pasajes copian los
+        metadatos del padre.
+
+        Returns:
+            Dict con 'success', 'total' (documentos distintos) y 'resultados'
+            (hits con _id del padre, _source del pasaje y highlight)
+        """
+        try:
+            consulta = {"bool": {"must": [{"match_phrase": {"texto": {"query": texto, "slop": slop}}}]}}
+            if excluir_versiones:
+                consulta["bool"]["must_not"] = [{"exists": {"field": "version_de"}}]
+            if filtros:
+                consulta["bool"]["filter"] = filtros
+
+            resp = self.client.search(
+                index=self.indice_fragmentos(index),
+                query=consulta,
+                collapse={"field": "id_padre"},
+                source={"excludes": [self.CAMPO_VECTOR]},
+                highlight={
+                    "encoder": "html",
+                    "fields": {
+                        "texto": {"fragment_size": fragment_size,
+                                  "number_of_fragments": number_of_fragments}
+                    }
+                },
+                aggs={"documentos": {"cardinality": {"field": "id_padre"}}},
+                size=size
+            )
+
+            resultados = []
+            for hit in resp["hits"]["hits"]:
+                fuente = hit.get("_source", {})
+                resultados.append({
+                    "_id": fuente.get("id_padre", hit["_id"]),
+                    "_index": index,
+                    "_score": hit.get("_score"),
+                    "_source": fuente,
+                    "highlight": hit.get("highlight", {})
+                })
+
+            return {
+                "success": True,
+                "total": resp.get("aggregations", {}).get("documentos", {}).get("value", len(resultados)),
+                "resultados": resultados
             }
         except Exception as e:
             return {"success": False, "error": str(e)}
@@ -155,8 +1203,9 @@ class ElasticSearch:
             self.client.update(
                 index=index,
                 id=doc_id,
-                body={"doc": datos}
+                body={"doc": self.marcar_escritura(datos)}
             )
+            self.notificar_escritura(index)
             return True
         except Exception as e:
             print(f"Error al actualizar documento: {e}")
@@ -166,6 +1215,7 @@ class ElasticSearch:
         """Elimina documento por ID"""
         try:
             self.client.delete(index=index, id=doc_id)
+            self.notificar_escritura(index)
             return True
         except Exception as e:
             print(f"Error al eliminar documento: {e}")
@@ -179,7 +1229,7 @@ class ElasticSearch:
             index = comando.get("index")
 
             if operacion in ["index", "create"]:
-                documento = comando.get("documento") or comando.get("body", {})
+                documento = self.marcar_escritura(comando.get("documento") or comando.get("body", {}))
                 doc_id = comando.get("id")
 
                 if doc_id:
@@ -187,27 +1237,31 @@ class ElasticSearch:
                 else:
                     resp = self.client.index(index=index, document=documento)
 
+                self.notificar_escritura(index)
                 return {"success": True, "data": resp}
 
             elif operacion == "update":
                 doc_id = comando.get("id")
-                doc = comando.get("doc") or comando.get("documento", {})
+                doc = self.marcar_escritura(comando.get("doc") or comando.get("documento", {}))
 
                 resp = self.client.update(
                     index=index,
                     id=doc_id,
                     body={"doc": doc}
                 )
+                self.notificar_escritura(index)
                 return {"success": True, "data": resp}
 
             elif operacion == "delete":
                 doc_id = comando.get("id")
                 resp = self.client.delete(index=index, id=doc_id)
+                self.notificar_escritura(index)
                 return {"success": True, "data": resp}
 
             elif operacion == "delete_by_query":
                 query = comando.get("query", {})
                 resp = self.client.delete_by_query(index=index, body={"query": query})
+                self.notificar_escritura(index)
                 return {"success": True, "data": resp}
 
             return {"success": False, "error": f"Operación DML no soportada: {operacion}"}
@@ -266,6 +1320,387 @@ class ElasticSearch:
         except Exception as e:
             return {"success": False, "error": str(e)}
 
+    @staticmethod
+    def _codificar_cursor(estado: Dict) -> str:
+        return base64.urlsafe_b64encode(json.dumps(estado).encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def _decodificar_cursor(cursor: str) -> Dict:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+
+    def _cerrar_pit(self, pit_id: str):
+        try:
+            self.client.close_point_in_time(id=pit_id)
+        except Exception:
+            pass
+
+    def buscar_paginado(self, index: str, query: Dict, campos: List[str] = None, size: int = 20,
+                        cursor: str = None, highlight_campos: List[str] = None,
+                        fragment_size: int = 150, number_of_fragments: int = 2,
+                        aggs: Dict = None, keep_alive: str = "2m") -> Dict:
+        """
+        Búsqueda liviana y paginada: devuelve solo 'campos' del _source y
+        fragmentos de resaltado acotados. La primera página es una búsqueda
+        simple (la mayoría de las búsquedas no pide más); al pedir la segunda se
+        abre un point-in-time y desde ahí se pagina con search_after, así que
+        la paginación ve la misma foto del índice aunque se sigan cargando
+        documentos. El point-in-time se cierra en la última página o con
+        cerrar_cursor() si el cliente abandona la búsqueda.
+
+        Args:
+            index: Índice o alias
+            query: Query DSL
+            campos: Campos del _source incluidos en cada hit (None o [] = ninguno)
+            size: Hits por página
+            cursor: Cursor devuelto por la página anterior (None = primera página)
+            highlight_campos: Campos resaltados con fragment_size / number_of_fragments
+            aggs: Agregaciones (solo se calculan en la primera página)
+            keep_alive: Vida del point-in-time entre páginas
+
+        Returns:
+            Dict con 'success', 'hits' ([{'_id', '_score', '_source'?, 'highlight'}]),
+            'cursor' (None en la última página), 'took' y, en la primera página,
+            'total', 'total_relacion' ('eq' o 'gte') y 'aggs'. Si el cursor venció
+            se devuelve 'cursor_expirado': True
+        """
+        pit_id = None
+        abierto = False
+        try:
+            parametros = {
+                "query": query,
+                "size": size,
+                "source": campos or False,
+                "track_total_hits": 10000 if not cursor else False
+            }
+            if cursor:
+                estado = self._decodificar_cursor(cursor)
+                pit_id = estado.get("pit")
+                if not pit_id:
+                    # Segunda página: recién ahora hace falta una foto estable del índice
+                    pit_id = self.client.open_point_in_time(index=index, keep_alive=keep_alive)["id"]
+                    abierto = True
+                parametros["pit"] = {"id": pit_id, "keep_alive": keep_alive}
+                # El mismo orden que la primera página (score y, en empates, shard y documento)
+                parametros["sort"] = [{"_score": "desc"}, {"_shard_doc": "asc"}]
+                if "after" in estado:
+                    parametros["search_after"] = estado["after"]
+                else:
+                    parametros["from"] = estado["desde"]
+            else:
+                parametros["index"] = index
+            if highlight_campos:
+                parametros["highlight"] = {
+                    # Textos largos: se resalta solo el comienzo en vez de fallar
+                    "max_analyzed_offset": 1000000,
+                    # El texto del documento se escapa: solo las etiquetas <em> son HTML
+                    "encoder": "html",
+                    "fields": {campo: {"fragment_size": fragment_size,
+                                       "number_of_fragments": number_of_fragments}
+                               for campo in highlight_campos}
+                }
+            if aggs and not cursor:
+                parametros["aggs"] = aggs
+
+            resp = self.client.search(**parametros)
+            pit_id = resp.get("pit_id", pit_id)
+            hits = resp["hits"]["hits"]
+
+            resultados = []
+            for hit in hits:
+                resultado = {"_id": hit["_id"], "_score": hit.get("_score")}
+                if "_source" in hit:
+                    resultado["_source"] = hit["_source"]
+                resultado["highlight"] = hit.get("highlight", {})
+                resultados.append(resultado)
+
+            respuesta = {"success": True, "hits": resultados, "cursor": None, "took": resp.get("took")}
+            if not cursor:
+                total = resp["hits"].get("total", {})
+                respuesta["total"] = total.get("value", len(resultados))
+                respuesta["total_relacion"] = total.get("relation", "eq")
+                respuesta["aggs"] = resp.get("aggregations", {})
+                if len(hits) == size and (respuesta["total"] > size or respuesta["total_relacion"] != "eq"):
+                    respuesta["cursor"] = self._codificar_cursor({"desde": size})
+            elif len(hits) == size:
+                respuesta["cursor"] = self._codificar_cursor({"pit": pit_id, "after": hits[-1]["sort"]})
+            else:
+                self._cerrar_pit(pit_id)
+            return respuesta
+        except Exception as e:
+            if cursor and not abierto and getattr(e, "status_code", None) == 404:
+                return {"success": False, "error": "El cursor venció; repita la búsqueda",
+                        "cursor_expirado": True}
+            if abierto:
+                self._cerrar_pit(pit_id)
+            return {"success": False, "error": str(e), "sin_conexion": self.es_error_conexion(e)}
+
+    def cerrar_cursor(self, cursor: str) -> bool:
+        """Cierra el point-in-time de un cursor de buscar_paginado que ya no se va a usar"""
+        try:
+            pit_id = self._decodificar_cursor(cursor).get("pit")
+        except Exception:
+            return False
+        if pit_id:
+            self._cerrar_pit(pit_id)
+        return True
+
+    # Unidad de date math para filtrar el bucket de un date_histogram
+    UNIDADES_INTERVALO = {"year": "y", "1y": "y", "quarter": "M", "1q": "M", "month": "M",
+                          "1M": "M", "week": "w", "1w": "w", "day": "d", "1d": "d"}
+
+    @classmethod
+    def filtros_facetas(cls, aggs: Dict, seleccion: Dict[str, List]) -> List[Dict]:
+        """
+        Traduce las facetas seleccionadas a cláusulas para bool.filter (contexto
+        de filtro: sin score y reutilizable por la cache de filtros de Elastic).
+        Dentro de una faceta los valores se combinan con OR y entre facetas con AND.
+
+        Args:
+            aggs: Definición de las agregaciones de faceta ({nombre: {"terms": ...}})
+            seleccion: {nombre de faceta: [valores]}; para un date_histogram los
+                       valores son el key_as_string del bucket
+
+        Returns:
+            Lista de cláusulas de filtro (las facetas desconocidas se ignoran)
+        """
+        filtros = []
+        for nombre, valores in (seleccion or {}).items():
+            definicion = aggs.get(nombre)
+            if not definicion or not valores:
+                continue
+            if not isinstance(valores, list):
+                valores = [valores]
+
+            if "terms" in definicion:
+                filtros.append({"terms": {definicion["terms"]["field"]: valores}})
+            elif "date_histogram" in definicion:
+                histograma = definicion["date_histogram"]
+                intervalo = histograma.get("calendar_interval", "year")
+                unidad = cls.UNIDADES_INTERVALO.get(intervalo, "y")
+                paso = "3M" if intervalo in ("quarter", "1q") else f"1{unidad}"
+                rangos = [{"range": {histograma["field"]: {"gte": valor, "lt": f"{valor}||+{paso}"}}}
+                          for valor in valores]
+                filtros.append(rangos[0] if len(rangos) == 1 else
+                               {"bool": {"should": rangos, "minimum_should_match": 1}})
+        return filtros
+
+    def contar_facetas(self, index: str, query: Dict, aggs: Dict) -> Dict:
+        """
+        Solo agregaciones (size 0 y request_cache): Elastic guarda la respuesta
+        por shard y la repite hasta el próximo refresh que cambie el índice
+
+        Returns:
+            Dict con 'success', 'total' y 'aggs'
+        """
+        try:
+            resp = self.client.search(index=index, query=query, aggs=aggs, size=0,
+                                      request_cache=True, track_total_hits=True)
+            return {"success": True, "total": resp["hits"]["total"]["value"],
+                    "aggs": resp.get("aggregations", {}), "took": resp.get("took")}
+        except Exception as e:
+            return {"success": False, "error": str(e), "sin_conexion": self.es_error_conexion(e)}
+
+    def resaltar_documentos(self, index: str, query: Dict, ids: List[str], campos: List[str],
+                            fragment_size: int = 150, number_of_fragments: int = 2) -> Dict[str, Dict]:
+        """
+        Resaltado solo para los documentos indicados (los de una página que aún
+        no se resaltaron), sin devolver _source
+
+        Returns:
+            Dict {_id: {campo: [fragmentos]}}
+        """
+        if not ids:
+            return {}
+        try:
+            resp = self.client.search(
+                index=index,
+                query={"bool": {"must": [query], "filter": [{"ids": {"values": ids}}]}},
+                source=False,
+                highlight={
+                    "max_analyzed_offset": 1000000,
+                    "encoder": "html",
+                    "fields": {campo: {"fragment_size": fragment_size,
+                                       "number_of_fragments": number_of_fragments}
+                               for campo in campos}
+                },
+                size=len(ids)
+            )
+            return {hit["_id"]: hit.get("highlight", {}) for hit in resp["hits"]["hits"]}
+        except Exception as e:
+            print(f"Error al resaltar documentos: {e}")
+            return {}
+
+    def mejores_pasajes(self, index: str, texto: str, ids: List[str], slop: int = 1,
+                        fragment_size: int = 150, number_of_fragments: int = 2) -> Dict[str, List[str]]:
+        """
+        Resaltado de una página de resultados desde el índice de fragmentos:
+        el mejor pasaje de cada documento de 'ids', sin recorrer texto_completo
+
+        Returns:
+            Dict {_id del documento: [fragmentos resaltados]}
+        """
+        if not ids:
+            return {}
+        try:
+            resp = self.client.search(
+                index=self.indice_fragmentos(index),
+                query={"bool": {"must": [{"match_phrase": {"texto": {"query": texto, "slop": slop}}}],
+                                "filter": [{"terms": {"id_padre": ids}}]}},
+                collapse={"field": "id_padre"},
+                source=["id_padre"],
+                highlight={"encoder": "html",
+                           "fields": {"texto": {"fragment_size": fragment_size,
+                                                "number_of_fragments": number_of_fragments}}},
+                size=len(ids)
+            )
+            return {hit["_source"]["id_padre"]: hit.get("highlight", {}).get("texto", [])
+                    for hit in resp["hits"]["hits"]}
+        except Exception as e:
+            print(f"Error al obtener pasajes: {e}")
+            return {}
+
+    @staticmethod
+    def fusionar_rrf(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+        """
+        Reciprocal Rank Fusion: cada ranking aporta 1 / (k + posición) a cada _id.
+        Solo usa posiciones, así que no importa que los scores de BM25 y de la
+        similitud de vectores estén en escalas distintas.
+
+        Returns:
+            Lista (_id, puntaje) de mayor a menor puntaje
+        """
+        puntajes: Dict[str, float] = {}
+        for ranking in rankings:
+            for posicion, doc_id in enumerate(ranking, 1):
+                puntajes[doc_id] = puntajes.get(doc_id, 0.0) + 1.0 / (k + posicion)
+        return sorted(puntajes.items(), key=lambda par: par[1], reverse=True)
+
+    def buscar_hibrido(self, index: str, texto: str, vector: List[float], campos: List[str] = None,
+                       filtros: List[Dict] = None, size: int = 20, k: int = 50,
+                       num_candidates: int = 200, presupuesto_bm25_ms: int = 800,
+                       presupuesto_knn_ms: int = 800, rrf_k: int = 60,
+                       max_caracteres_pasaje: int = 300, usar_fragmentos: bool = True) -> Dict:
+        """
+        Búsqueda híbrida: BM25 (palabras de la consulta, sin exigir la frase
+        exacta) y kNN aproximado sobre CAMPO_VECTOR se ejecutan en paralelo y
+        sus rankings se fusionan con RRF (fusionar_rrf). Así se encuentra el
+        documento aunque la consulta no use sus mismas palabras.
+
+        Cada rama tiene su propio presupuesto de latencia (request_timeout); si
+        una se pasa o falla, se responde con la otra y se indica en 'ramas'.
+        Con usar_fragmentos el kNN recorre los pasajes (un vector por pasaje) y
+        cada documento toma la posición de su mejor pasaje, que se devuelve
+        como resaltado.
+
+        Args:
+            index: Índice o alias
+            texto: Consulta del usuario
+            vector: Embedding de la consulta (mismo modelo que al indexar)
+            campos: Campos del _source a devolver (None = todos menos el vector)
+            filtros: Cláusulas para bool.filter (p. ej. filtros_facetas)
+            size: Resultados fusionados a devolver
+            k: Candidatos que aporta cada rama a la fusión
+            num_candidates: Candidatos por shard del kNN (más = mejor recall, más lento)
+            presupuesto_bm25_ms / presupuesto_knn_ms: Tiempo máximo de cada rama
+            rrf_k: Constante de RRF (valores altos suavizan la ventaja del primer puesto)
+            max_caracteres_pasaje: Largo del pasaje devuelto como resaltado
+
+        Returns:
+            Dict con 'success', 'resultados' (hits con '_score' RRF, 'highlight'
+            y 'posiciones' {'bm25', 'knn'}) y 'ramas' (ms, hits y error de cada rama)
+        """
+        excluir = [{"exists": {"field": "version_de"}}]
+        fuente = campos if campos else {"excludes": [self.CAMPO_VECTOR]}
+        indice_fragmentos = self.indice_fragmentos(index)
+        por_pasajes = usar_fragmentos and self.existe_indice(indice_fragmentos)
+
+        def rama_bm25() -> List[Tuple[str, Dict, Optional[str]]]:
+            resp = self.client.options(request_timeout=presupuesto_bm25_ms / 1000).search(
+                index=index,
+                query={"bool": {
+                    "must": [{"multi_match": {"query": texto,
+                                              "fields": ["texto_completo", "nombre_archivo^2", "titulo^2"],
+                                              "minimum_should_match": "30%"}}],
+                    "must_not": excluir,
+                    "filter": filtros or []}},
+                source=fuente,
+                size=k,
+                timeout=f"{presupuesto_bm25_ms}ms",
+                track_total_hits=False
+            )
+            return [(hit["_id"], hit.get("_source", {}), None) for hit in resp["hits"]["hits"]]
+
+        def rama_knn() -> List[Tuple[str, Dict, Optional[str]]]:
+            consulta_knn = {"field": self.CAMPO_VECTOR, "query_vector": vector, "k": k,
+                            "num_candidates": max(num_candidates, k),
+                            "filter": {"bool": {"must_not": excluir, "filter": filtros or []}}}
+            if por_pasajes:
+                fuente_pasajes = (campos + ["id_padre", "texto"]) if campos else fuente
+                resp = self.client.options(request_timeout=presupuesto_knn_ms / 1000).search(
+                    index=indice_fragmentos, knn=consulta_knn, source=fuente_pasajes, size=k)
+                vistos = {}
+                for hit in resp["hits"]["hits"]:
+                    pasaje = hit.get("_source", {})
+                    doc_id = pasaje.get("id_padre", hit["_id"])
+                    if doc_id not in vistos:
+                        metadatos = {c: v for c, v in pasaje.items() if c not in ("id_padre", "numero", "texto")}
+                        vistos[doc_id] = (doc_id, metadatos, pasaje.get("texto"))
+                return list(vistos.values())
+
+            resp = self.client.options(request_timeout=presupuesto_knn_ms / 1000).search(
+                index=index, knn=consulta_knn, source=fuente, size=k)
+            return [(hit["_id"], hit.get("_source", {}), None) for hit in resp["hits"]["hits"]]
+
+        def medir(rama: Callable) -> Dict:
+            inicio = time.perf_counter()
+            try:
+                hits = rama()
+                return {"hits": hits, "ms": round((time.perf_counter() - inicio) * 1000)}
+            except Exception as e:
+                return {"hits": [], "ms": round((time.perf_counter() - inicio) * 1000), "error": str(e),
+                        "sin_conexion": self.es_error_conexion(e)}
+
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix='hibrida') as executor:
+            futuro_bm25 = executor.submit(medir, rama_bm25)
+            futuro_knn = executor.submit(medir, rama_knn)
+            ramas = {"bm25": futuro_bm25.result(), "knn": futuro_knn.result()}
+
+        if all("error" in rama for rama in ramas.values()):
+            return {"success": False, "error": ramas["bm25"]["error"],
+                    "sin_conexion": all(rama["sin_conexion"] for rama in ramas.values()),
+                    "ramas": {nombre: {c: v for c, v in rama.items() if c != "hits"}
+                              for nombre, rama in ramas.items()}}
+
+        posiciones = {nombre: {doc_id: n for n, (doc_id, _, _) in enumerate(rama["hits"], 1)}
+                      for nombre, rama in ramas.items()}
+        # El _source del índice principal tiene prioridad sobre los metadatos copiados al pasaje
+        fuentes = {doc_id: f for doc_id, f, _ in ramas["knn"]["hits"]}
+        fuentes.update({doc_id: f for doc_id, f, _ in ramas["bm25"]["hits"]})
+        pasajes = {doc_id: p for doc_id, _, p in ramas["knn"]["hits"] if p}
+
+        fusion = self.fusionar_rrf([[doc_id for doc_id, _, _ in rama["hits"]]
+                                    for rama in ramas.values()], k=rrf_k)
+        resultados = []
+        for doc_id, puntaje in fusion[:size]:
+            pasaje = pasajes.get(doc_id)
+            resultados.append({
+                "_id": doc_id,
+                "_index": index,
+                "_score": round(puntaje, 6),
+                "_source": fuentes.get(doc_id, {}),
+                # Mismo formato que el resaltado de Elastic con encoder html: texto escapado
+                "highlight": {"texto_completo": [html.escape(pasaje[:max_caracteres_pasaje])]} if pasaje else {},
+                "posiciones": {nombre: posiciones[nombre].get(doc_id) for nombre in ramas}
+            })
+
+        return {
+            "success": True,
+            "resultados": resultados,
+            "ramas": {nombre: {"ms": rama["ms"], "hits": len(rama["hits"]),
+                               **({"error": rama["error"]} if "error" in rama else {})}
+                      for nombre, rama in ramas.items()}
+        }
+
     def ejecutar_query(self, query_json: str) -> Dict:
         """Ejecuta una query JSON completa"""
         try:
@@ -293,10 +1728,25 @@ class ElasticSearch:
     # OTROS
     # ---------------------------------------------------------------------
 
-    def obtener_documento(self, index: str, doc_id: str) -> Optional[Dict]:
-        """Obtiene un documento por ID"""
+    def existe_documento(self, index: str, doc_id: str, campo: str = None) -> bool:
+        """
+        Indica si existe un documento por _id (lectura en tiempo real) o, si se
+        indica 'campo', con ese valor exacto en el campo. Lanza la excepción si
+        Elastic falla, para que quien pregunta no lo confunda con "no existe".
+        """
+        if self.client.exists(index=index, id=doc_id):
+            return True
+        if not campo:
+            return False
+        resp = self.client.count(index=index, query={"bool": {"should": [
+            {"term": {campo: doc_id}}, {"term": {f"{campo}.keyword": doc_id}}]}})
+        return resp.get("count", 0) > 0
+
+    def obtener_documento(self, index: str, doc_id: str, campos: List[str] = None) -> Optional[Dict]:
+        """Obtiene un documento por ID (solo 'campos' del _source si se indican; sin el vector)"""
         try:
-            resp = self.client.get(index=index, id=doc_id)
+            resp = self.client.get(index=index, id=doc_id, source_includes=campos,
+                                   source_excludes=None if campos else [self.CAMPO_VECTOR])
             return resp["_source"] if resp.get("found") else None
         except:
             return None
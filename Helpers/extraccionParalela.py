@@ -0,0 +1,227 @@
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Dict, Iterable, Iterator, List
+from Helpers import Funciones
+
+
+def _procesar_archivo(archivo: Dict) -> Dict:
+    """
+    Tarea ejecutada en cada proceso hijo: extrae el contenido de un archivo.
+    Debe estar a nivel de módulo para poder serializarse hacia el pool.
+    'min_caracteres_ocr' en el archivo fija el texto mínimo bajo el cual se
+    aplica OCR al PDF completo (50 por defecto).
+    """
+    inicio = time.perf_counter()
+    resultado = dict(archivo)
+    resultado['extension'] = archivo.get('extension', '').lower().lstrip('.')
+    resultado['texto'] = ''
+    resultado['pid'] = os.getpid()
+
+    min_caracteres = archivo.get('min_caracteres_ocr', 50)
+    try:
+        if archivo.get('zip') and archivo.get('miembro'):
+            # Miembro de un ZIP: se lee a memoria sin descomprimir a disco
+            extraido = Funciones.extraer_texto_miembro_zip(archivo['zip'], archivo['miembro'],
+                                                           resultado['extension'], min_caracteres)
+        else:
+            extraido = Funciones.extraer_texto_archivo(archivo['ruta'], resultado['extension'],
+                                                       min_caracteres)
+        resultado.update(extraido)
+    except Exception as e:
+        resultado['error'] = str(e)
+
+    resultado['duracion'] = round(time.perf_counter() - inicio, 3)
+    return resultado
+
+
+def _disponible(archivo: Dict) -> bool:
+    """Un archivo es procesable si existe en disco o si existe el ZIP que lo contiene"""
+    if archivo.get('zip') and archivo.get('miembro'):
+        return os.path.exists(archivo['zip'])
+    return bool(archivo.get('ruta')) and os.path.exists(archivo['ruta'])
+
+
+class ExtraccionParalela:
+    """Motor de extracción de texto de PDFs, TXT y JSON en un pool de procesos"""
+
+    def __init__(self, num_procesos: int = None, max_tareas_por_hijo: int = 20,
+                 metodo_inicio: str = None):
+        """
+        Inicializa el motor de extracción
+
+        Args:
+            num_procesos: Número de procesos del pool (por defecto, núcleos disponibles)
+            max_tareas_por_hijo: Archivos que procesa cada hijo antes de reciclarse
+                                 (libera memoria de PyPDF2 / OCR en documentos grandes)
+            metodo_inicio: 'fork', 'spawn' o 'forkserver' (por defecto, el de la plataforma)
+        """
+        self.num_procesos = max(1, num_procesos or os.cpu_count() or 1)
+        self.max_tareas_por_hijo = max_tareas_por_hijo
+        self.metodo_inicio = metodo_inicio
+
+    def procesar(self, archivos: List[Dict]) -> Iterator[Dict]:
+        """
+        Extrae el contenido de los archivos y entrega cada resultado en cuanto termina
+        (el orden de salida no corresponde al de entrada). Como máximo hay el doble
+        de tareas que de procesos pendientes de consumir.
+
+        Args:
+            archivos: Lista de dicts con 'ruta' y 'extension' (o 'zip' y 'miembro'
+                      para leer directamente desde un ZIP)
+
+        Returns:
+            Iterador de dicts con los campos originales más 'texto', 'metodo',
+            'duracion' y, si aplica, 'documento' o 'error'
+        """
+        pendientes = [a for a in archivos if _disponible(a)]
+        if not pendientes:
+            return
+
+        # Para un solo archivo o un solo proceso no compensa levantar el pool
+        if self.num_procesos == 1 or len(pendientes) == 1:
+            for archivo in pendientes:
+                yield _procesar_archivo(archivo)
+            return
+
+        procesos = min(self.num_procesos, len(pendientes))
+        # Tareas enviadas y no consumidas: si el consumidor (p. ej. el bulk a Elastic)
+        # va más lento, el pool se detiene en vez de acumular textos en memoria
+        max_en_curso = procesos * 2
+        terminados = queue.Queue()
+        restantes = iter(pendientes)
+        en_curso = 0
+
+        ctx = get_context(self.metodo_inicio)
+        with ctx.Pool(processes=procesos, maxtasksperchild=self.max_tareas_por_hijo) as pool:
+            def lanzar(archivo: Dict):
+                pool.apply_async(
+                    _procesar_archivo, (archivo,),
+                    callback=terminados.put,
+                    error_callback=lambda e: terminados.put({**archivo, 'texto': '', 'error': str(e)})
+                )
+
+            for archivo in restantes:
+                lanzar(archivo)
+                en_curso += 1
+                if en_curso >= max_en_curso:
+                    break
+
+            while en_curso:
+                resultado = terminados.get()
+                en_curso -= 1
+                siguiente = next(restantes, None)
+                if siguiente is not None:
+                    lanzar(siguiente)
+                    en_curso += 1
+                yield resultado
+
+    def procesar_flujo(self, archivos: Iterable[Dict]) -> Iterator[Dict]:
+        """
+        Igual que procesar() pero para una fuente que se va llenando (p. ej. la cola
+        de descargas de PipelineIngesta). Un hilo alimenta el pool a medida que
+        llegan archivos y los resultados se entregan en cuanto terminan, sin esperar
+        al siguiente archivo de la fuente. El doble de tareas que de procesos como
+        máximo: si el consumidor se atrasa, se deja de leer de la fuente.
+
+        Args:
+            archivos: Iterable (posiblemente bloqueante) de dicts como en procesar()
+
+        Returns:
+            Iterador de resultados en orden de finalización
+        """
+        terminados = queue.Queue()
+        cupos = threading.Semaphore(self.num_procesos * 2)
+        detener = threading.Event()
+        fin = object()
+        estado = {'enviados': 0, 'error': None}
+
+        ctx = get_context(self.metodo_inicio)
+        with ctx.Pool(processes=self.num_procesos, maxtasksperchild=self.max_tareas_por_hijo) as pool:
+            def alimentar():
+                try:
+                    for archivo in archivos:
+                        if not _disponible(archivo):
+                            continue
+                        while not cupos.acquire(timeout=0.5):
+                            if detener.is_set():
+                                return
+                        pool.apply_async(
+                            _procesar_archivo, (archivo,),
+                            callback=terminados.put,
+                            error_callback=lambda e, a=archivo: terminados.put({**a, 'texto': '', 'error': str(e)})
+                        )
+                        estado['enviados'] += 1
+                except Exception as e:
+                    estado['error'] = e
+                finally:
+                    terminados.put(fin)
+
+            hilo = threading.Thread(target=alimentar, name='extraccion-flujo', daemon=True)
+            hilo.start()
+
+            entregados = 0
+            fuente_agotada = False
+            try:
+                while not fuente_agotada or entregados < estado['enviados']:
+                    resultado = terminados.get()
+                    if resultado is fin:
+                        fuente_agotada = True
+                        continue
+                    cupos.release()
+                    entregados += 1
+                    yield resultado
+            finally:
+                detener.set()
+
+        if estado['error'] is not None:
+            raise estado['error']
+
+    def procesar_lista(self, archivos: List[Dict]) -> List[Dict]:
+        """Igual que procesar() pero devuelve todos los resultados en el orden de entrada"""
+        orden = {a.get('ruta'): i for i, a in enumerate(archivos)}
+        resultados = list(self.procesar(archivos))
+        resultados.sort(key=lambda r: orden.get(r.get('ruta'), len(orden)))
+        return resultados
+
+    def generar_documentos(self, archivos: Iterable[Dict], min_caracteres: int = 50,
+                           flujo: bool = False) -> Iterator[Dict]:
+        """
+        Convierte los archivos en documentos listos para Elastic a medida que se extraen.
+        Los JSON se entregan tal cual; PDFs y TXT con menos de min_caracteres se descartan.
+
+        Args:
+            archivos: Lista de dicts con 'ruta', 'nombre' y 'extension'
+            min_caracteres: Longitud mínima del texto para indexar un documento
+            flujo: Si True, 'archivos' es un iterable que se va llenando (procesar_flujo)
+
+        Returns:
+            Iterador de documentos
+        """
+        extraidos = self.procesar_flujo(archivos) if flujo else self.procesar(archivos)
+        for extraido in extraidos:
+            if extraido['extension'] == 'json':
+                doc = extraido.get('documento')
+                if doc:
+                    yield doc
+                continue
+
+            texto = extraido.get('texto', '')
+            if not texto or len(texto.strip()) < min_caracteres:
+                continue
+
+            documento = {
+                # Identificador estable del documento: hash del archivo (PDF) o del texto
+                'id_documento': extraido.get('hash') or Funciones.calcular_hash_texto(texto),
+                'texto_completo': texto,
+                'nombre_archivo': extraido.get('nombre', ''),
+                'ruta': extraido['ruta'],
+                'fecha': datetime.now().isoformat()
+            }
+            if extraido.get('url'):
+                # Origen web: permite el _id por URL (ElasticSearch.id_estable)
+                documento['url'] = extraido['url']
+            yield documento
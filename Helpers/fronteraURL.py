@@ -0,0 +1,188 @@
+import json
+import os
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
+
+
+class FronteraURL:
+    """
+    Frontera de crawl: cola de páginas por visitar con prioridad y profundidad,
+    conjunto de URLs vistas con búsqueda O(1) y registro ordenado de enlaces
+    descubiertos. Se puede guardar en disco y retomar tras una interrupción;
+    el checkpoint registra la página inicial y el dominio del recorrido para
+    no retomar el de otro sitio (ver corresponde_a).
+    """
+
+    # Parámetros de query que no cambian el contenido de la página
+    PARAMETROS_IGNORADOS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term',
+                            'utm_content', 'fbclid', 'gclid')
+
+    def __init__(self, max_profundidad: int = None, ignorar_query: bool = False,
+                 url_inicial: str = None, dominio_base: str = None):
+        """
+        Args:
+            max_profundidad: Profundidad máxima a encolar (None = sin límite)
+            ignorar_query: Si True, URLs que solo difieren en la query son la misma
+            url_inicial: Página donde empezó el recorrido
+            dominio_base: Dominio al que se restringe el recorrido
+        """
+        self.max_profundidad = max_profundidad
+        self.ignorar_query = ignorar_query
+        self.url_inicial = self.normalizar(url_inicial) if url_inicial else None
+        self.dominio_base = self._host(dominio_base) if dominio_base else None
+        self.colas: Dict[int, deque] = {}
+        self.vistas = set()
+        self.visitadas = set()
+        self.enlaces = OrderedDict()
+
+    # ------------------------------------------------------------------
+    # Normalización
+    # ------------------------------------------------------------------
+
+    def normalizar(self, url: str) -> str:
+        """
+        Forma canónica de una URL: esquema y host en minúsculas, sin puerto por
+        defecto, sin fragmento, sin parámetros de seguimiento y con la query ordenada
+        """
+        partes = urlparse(url.strip())
+        esquema = partes.scheme.lower()
+        host = (partes.hostname or '').lower()
+        if partes.port and not ((esquema == 'http' and partes.port == 80) or
+                                (esquema == 'https' and partes.port == 443)):
+            host = f"{host}:{partes.port}"
+
+        query = ''
+        if not self.ignorar_query and partes.query:
+            parametros = [(k, v) for k, v in parse_qsl(partes.query, keep_blank_values=True)
+                          if k.lower() not in self.PARAMETROS_IGNORADOS]
+            query = urlencode(sorted(parametros))
+
+        ruta = partes.path or '/'
+        return urlunparse((esquema, host, ruta, '', query, ''))
+
+    @staticmethod
+    def _host(url: str) -> str:
+        return (urlparse(url.strip()).netloc or '').lower()
+
+    def corresponde_a(self, url_inicial: str, dominio_base: str) -> bool:
+        """Indica si la frontera es del recorrido que empieza en url_inicial dentro de dominio_base"""
+        return (self.url_inicial == self.normalizar(url_inicial) and
+                self.dominio_base == self._host(dominio_base))
+
+    # ------------------------------------------------------------------
+    # Cola de páginas
+    # ------------------------------------------------------------------
+
+    def agregar(self, url: str, profundidad: int = 0, prioridad: int = None) -> bool:
+        """
+        Encola una página si no se ha visto antes
+
+        Args:
+            url: URL de la página
+            profundidad: Saltos desde la página inicial
+            prioridad: Menor valor = se visita antes (por defecto, la profundidad: BFS)
+
+        Returns:
+            True si se encoló
+        """
+        if self.max_profundidad is not None and profundidad > self.max_profundidad:
+            return False
+        clave = self.normalizar(url)
+        if clave in self.vistas:
+            return False
+        self.vistas.add(clave)
+        prioridad = profundidad if prioridad is None else prioridad
+        self.colas.setdefault(prioridad, deque()).append(
+            {'url': url, 'profundidad': profundidad, 'prioridad': prioridad})
+        return True
+
+    def siguiente_lote(self, cantidad: int) -> List[Dict]:
+        """Saca hasta 'cantidad' páginas, primero las de menor prioridad y en orden FIFO"""
+        lote = []
+        while len(lote) < cantidad and self.colas:
+            prioridad = min(self.colas)
+            cola = self.colas[prioridad]
+            while cola and len(lote) < cantidad:
+                lote.append(cola.popleft())
+            if not cola:
+                del self.colas[prioridad]
+        return lote
+
+    def marcar_visitada(self, url: str):
+        self.visitadas.add(self.normalizar(url))
+
+    def pendientes(self) -> int:
+        return sum(len(c) for c in self.colas.values())
+
+    # ------------------------------------------------------------------
+    # Enlaces descubiertos
+    # ------------------------------------------------------------------
+
+    def registrar_enlace(self, link: Dict) -> bool:
+        """
+        Registra un enlace descubierto ({'url', 'type'})
+
+        Returns:
+            True si es nuevo
+        """
+        clave = self.normalizar(link['url'])
+        if clave in self.enlaces:
+            return False
+        self.enlaces[clave] = link
+        return True
+
+    def lista_enlaces(self) -> List[Dict]:
+        return list(self.enlaces.values())
+
+    # ------------------------------------------------------------------
+    # Checkpoint
+    # ------------------------------------------------------------------
+
+    def guardar(self, ruta_json: str) -> bool:
+        """Guarda el estado completo de forma atómica"""
+        try:
+            carpeta = os.path.dirname(ruta_json)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            datos = {
+                'max_profundidad': self.max_profundidad,
+                'ignorar_query': self.ignorar_query,
+                'url_inicial': self.url_inicial,
+                'dominio_base': self.dominio_base,
+                'pendientes': [p for prioridad in sorted(self.colas) for p in self.colas[prioridad]],
+                'vistas': sorted(self.vistas),
+                'visitadas': sorted(self.visitadas),
+                'enlaces': self.lista_enlaces()
+            }
+            temporal = f"{ruta_json}.tmp"
+            with open(temporal, 'w', encoding='utf-8') as f:
+                json.dump(datos, f, ensure_ascii=False)
+            os.replace(temporal, ruta_json)
+            return True
+        except Exception as e:
+            print(f"Error al guardar frontera: {e}")
+            return False
+
+    @classmethod
+    def cargar(cls, ruta_json: str) -> Optional["FronteraURL"]:
+        """Restaura una frontera guardada; None si no existe o no se puede leer"""
+        if not os.path.exists(ruta_json):
+            return None
+        try:
+            with open(ruta_json, 'r', encoding='utf-8') as f:
+                datos = json.load(f)
+            frontera = cls(datos.get('max_profundidad'), datos.get('ignorar_query', False))
+            # Ya normalizados al guardar; un checkpoint anterior sin ellos no corresponde a ningún recorrido
+            frontera.url_inicial = datos.get('url_inicial')
+            frontera.dominio_base = datos.get('dominio_base')
+            frontera.vistas = set(datos.get('vistas', []))
+            frontera.visitadas = set(datos.get('visitadas', []))
+            for pagina in datos.get('pendientes', []):
+                frontera.colas.setdefault(pagina['prioridad'], deque()).append(pagina)
+            for link in datos.get('enlaces', []):
+                frontera.registrar_enlace(link)
+            return frontera
+        except Exception as e:
+            print(f"Error al cargar frontera: {e}")
+            return None
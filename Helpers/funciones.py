@@ -1,15 +1,25 @@
+import io
 import os
 import zipfile
+import hashlib
+import tempfile
+import queue
+import threading
 import requests
 import json
 import PyPDF2
 from PIL import Image
 import pytesseract
-from typing import Dict, List
+from typing import Dict, Iterable, Iterator, List
 from werkzeug.utils import secure_filename
 from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 class Funciones:
+    # Caché de extracción compartida por el proceso (se crea al primer uso)
+    _cache_extraccion = None
+
     @staticmethod
     def crear_carpeta(ruta: str) -> bool:
         """Crea una carpeta si no existe"""
@@ -119,54 +129,564 @@ class Funciones:
             return False
     
     @staticmethod
-    def extraer_texto_pdf(ruta_pdf: str) -> str:
+    def calcular_hash_archivo(ruta: str, tam_bloque: int = 1024 * 1024) -> str:
+        """
+        Calcula el SHA-256 del contenido de un archivo leyendo por bloques
+        
+        Args:
+            ruta: Ruta del archivo
+            tam_bloque: Bytes leídos en cada iteración
+            
+        Returns:
+            Hash hexadecimal del archivo
+        """
+        sha = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(tam_bloque), b''):
+                sha.update(bloque)
+        return sha.hexdigest()
+    
+    @staticmethod
+    def obtener_cache_extraccion():
+        """
+        Retorna la caché de extracción del proceso, configurada con las variables
+        de entorno CACHE_EXTRACCION_RUTA y CACHE_EXTRACCION_MAX_MB.
+        Si CACHE_EXTRACCION_RUTA está vacía la caché queda deshabilitada (retorna None).
+        """
+        if Funciones._cache_extraccion is None:
+            ruta_db = os.getenv('CACHE_EXTRACCION_RUTA', 'cache/extraccion.db')
+            if not ruta_db:
+                return None
+            try:
+                from Helpers.cacheExtraccion import CacheExtraccion
+                max_mb = float(os.getenv('CACHE_EXTRACCION_MAX_MB', 512))
+                Funciones._cache_extraccion = CacheExtraccion(ruta_db, max_mb)
+            except Exception as e:
+                print(f"Error al inicializar caché de extracción: {e}")
+                return None
+        return Funciones._cache_extraccion
+    
+    @staticmethod
+    def _pagina_tiene_imagenes(recursos, profundidad: int = 0) -> bool:
+        """Revisa los XObject de una página (y de sus formularios anidados) buscando imágenes"""
+        try:
+            if recursos is None or profundidad > 2:
+                return False
+            xobjects = recursos.get_object().get('/XObject')
+            if not xobjects:
+                return False
+            for objeto in xobjects.get_object().values():
+                objeto = objeto.get_object()
+                subtipo = objeto.get('/Subtype')
+                if subtipo == '/Image':
+                    return True
+                if subtipo == '/Form' and \
+                        Funciones._pagina_tiene_imagenes(objeto.get('/Resources'), profundidad + 1):
+                    return True
+            return False
+        except Exception:
+            return False
+    
+    @staticmethod
+    def analizar_paginas_pdf(ruta_pdf: str, min_caracteres_pagina: int = 30) -> List[Dict]:
         """
-        Extrae texto de un archivo PDF
+        Extrae la capa de texto página por página y marca las que necesitan OCR.
+        Una página necesita OCR si casi no tiene texto pero sí contiene imágenes;
+        la decisión sale de la estructura del PDF, sin renderizar nada.
+        
+        Args:
+            ruta_pdf: Ruta del archivo PDF (o un objeto tipo archivo binario)
+            min_caracteres_pagina: Caracteres mínimos para considerar válida la capa de texto
+            
+        Returns:
+            Lista de dicts con 'numero' (desde 1), 'texto' y 'necesita_ocr'
+        """
+        paginas = []
+        pdf_reader = PyPDF2.PdfReader(ruta_pdf)
+        for numero, page in enumerate(pdf_reader.pages, 1):
+            try:
+                texto = page.extract_text() or ""
+            except Exception:
+                texto = ""
+            necesita_ocr = len(texto.strip()) < min_caracteres_pagina and \
+                Funciones._pagina_tiene_imagenes(page.get('/Resources'))
+            paginas.append({'numero': numero, 'texto': texto, 'necesita_ocr': necesita_ocr})
+        return paginas
+    
+    @staticmethod
+    def extraer_texto_pdf(ruta_pdf: str, hash_archivo: str = None) -> str:
+        """
+        Extrae texto de un archivo PDF. Consulta primero la caché de extracción,
+        de modo que un archivo ya procesado solo cuesta calcular su hash.
         
         Args:
             ruta_pdf: Ruta del archivo PDF
+            hash_archivo: SHA-256 del archivo, si ya se calculó
             
         Returns:
             Texto extraído del PDF
         """
         try:
-            texto = ""
-            with open(ruta_pdf, 'rb') as file:
-                pdf_reader = PyPDF2.PdfReader(file)
-                for page in pdf_reader.pages:
-                    texto += page.extract_text() + "\n"
-            return texto.strip()
+            cache = Funciones.obtener_cache_extraccion()
+            if cache:
+                hash_archivo = hash_archivo or Funciones.calcular_hash_archivo(ruta_pdf)
+                entrada = cache.obtener(hash_archivo)
+                if entrada:
+                    return entrada['texto']
+
+            paginas = Funciones.analizar_paginas_pdf(ruta_pdf)
+            texto = "\n".join(p['texto'] for p in paginas).strip()
+
+            if cache:
+                # 'parcial' indica que hay páginas escaneadas sin reconocer
+                metodo = 'parcial' if any(p['necesita_ocr'] for p in paginas) else 'texto'
+                cache.guardar(hash_archivo, texto, len(paginas), metodo)
+            return texto
         except Exception as e:
             print(f"Error al extraer texto del PDF {ruta_pdf}: {e}")
             return ""
     
     @staticmethod
-    def extraer_texto_pdf_ocr(ruta_pdf: str) -> str:
+    def extraer_texto_pdf_selectivo(ruta_pdf: str, hash_archivo: str = None,
+                                    paginas_por_lote: int = 4, hilos: int = 2,
+                                    contenido: bytes = None) -> Dict:
         """
-        Extrae texto de un PDF usando OCR (útil para PDFs escaneados)
+        Extrae el texto de un PDF aplicando OCR solo a las páginas sin capa de texto
+        (p. ej. anexos escaneados dentro de un decreto digital) y combina el
+        resultado en orden de página.
         
         Args:
             ruta_pdf: Ruta del archivo PDF
+            hash_archivo: SHA-256 del archivo, si ya se calculó
+            paginas_por_lote: Páginas renderizadas por ventana de OCR
+            hilos: Ventanas de OCR procesadas en paralelo
+            contenido: Bytes del PDF ya en memoria (p. ej. un miembro de un ZIP);
+                       si se entrega, ruta_pdf solo se usa en mensajes y solo se
+                       escribe a disco cuando hay páginas que requieren OCR
             
         Returns:
-            Texto extraído usando OCR
+            Dict con 'texto', 'paginas', 'metodo' ('texto', 'mixto' u 'ocr')
+            y 'paginas_ocr' (números de página reconocidos por OCR)
+        """
+        try:
+            cache = Funciones.obtener_cache_extraccion()
+            if cache:
+                if not hash_archivo:
+                    hash_archivo = hashlib.sha256(contenido).hexdigest() if contenido is not None \
+                        else Funciones.calcular_hash_archivo(ruta_pdf)
+                entrada = cache.obtener(hash_archivo)
+                if entrada and entrada['metodo'] in ('texto', 'mixto', 'ocr'):
+                    return {**entrada, 'paginas_ocr': []}
+
+            fuente = io.BytesIO(contenido) if contenido is not None else ruta_pdf
+            paginas = Funciones.analizar_paginas_pdf(fuente)
+            paginas_ocr = [p['numero'] for p in paginas if p['necesita_ocr']]
+
+            if paginas_ocr:
+                with Funciones.ruta_pdf_en_disco(ruta_pdf, contenido) as ruta_ocr:
+                    textos_ocr = Funciones.ocr_paginas(ruta_ocr, paginas_ocr,
+                                                       paginas_por_lote=paginas_por_lote, hilos=hilos)
+                for pagina in paginas:
+                    if pagina['numero'] in textos_ocr:
+                        pagina['texto'] = textos_ocr[pagina['numero']]
+
+            if not paginas_ocr:
+                metodo = 'texto'
+            elif len(paginas_ocr) == len(paginas):
+                metodo = 'ocr'
+            else:
+                metodo = 'mixto'
+
+            texto = "\n".join(p['texto'] for p in paginas).strip()
+            if cache:
+                cache.guardar(hash_archivo, texto, len(paginas), metodo)
+
+            return {'texto': texto, 'paginas': len(paginas), 'metodo': metodo, 'paginas_ocr': paginas_ocr}
+        except Exception as e:
+            print(f"Error al extraer texto selectivo del PDF {ruta_pdf}: {e}")
+            return {'texto': '', 'paginas': 0, 'metodo': 'error', 'paginas_ocr': [], 'error': str(e)}
+    
+    @staticmethod
+    @contextmanager
+    def ruta_pdf_en_disco(ruta_pdf: str, contenido: bytes = None):
         """
+        Entrega una ruta en disco para herramientas que la necesitan (pdf2image).
+        Si el PDF solo está en memoria se vuelca a un archivo temporal que se
+        elimina al salir del bloque.
+        """
+        if contenido is None:
+            yield ruta_pdf
+            return
+
+        temporal = tempfile.NamedTemporaryFile(prefix="pdf_", suffix=".pdf", delete=False)
         try:
-            from pdf2image import convert_from_path
+            with temporal:
+                temporal.write(contenido)
+            yield temporal.name
+        finally:
+            os.remove(temporal.name)
+    
+    @staticmethod
+    def contar_paginas_pdf(ruta_pdf: str) -> int:
+        """
+        Retorna el número de páginas de un PDF sin renderizarlo
+        
+        Args:
+            ruta_pdf: Ruta del archivo PDF
             
-            # Convertir PDF a imágenes
-            images = convert_from_path(ruta_pdf)
+        Returns:
+            Número de páginas (0 si no se pudo leer)
+        """
+        try:
+            from pdf2image import pdfinfo_from_path
+            return int(pdfinfo_from_path(ruta_pdf)['Pages'])
+        except Exception:
+            try:
+                with open(ruta_pdf, 'rb') as file:
+                    return len(PyPDF2.PdfReader(file).pages)
+            except Exception as e:
+                print(f"Error al contar páginas del PDF {ruta_pdf}: {e}")
+                return 0
+    
+    @staticmethod
+    def _ocr_ventana(ruta_pdf: str, primera: int, ultima: int, dpi: int) -> Dict[int, str]:
+        """
+        Renderiza las páginas [primera, ultima] a una carpeta temporal y aplica OCR
+        abriendo una imagen a la vez, de modo que en memoria solo vive una página
+        """
+        from pdf2image import convert_from_path
+
+        textos = {}
+        with tempfile.TemporaryDirectory(prefix="ocr_") as carpeta:
+            rutas = convert_from_path(ruta_pdf, dpi=dpi, first_page=primera, last_page=ultima,
+                                      output_folder=carpeta, fmt='png', paths_only=True)
+            for pagina, ruta_imagen in zip(range(primera, ultima + 1), sorted(rutas)):
+                with Image.open(ruta_imagen) as imagen:
+                    textos[pagina] = pytesseract.image_to_string(imagen, lang='spa')
+                os.remove(ruta_imagen)
+        return textos
+    
+    @staticmethod
+    def ocr_paginas(ruta_pdf: str, paginas: List[int], paginas_por_lote: int = 4,
+                    hilos: int = 2, dpi: int = 200) -> Dict[int, str]:
+        """
+        Aplica OCR a un conjunto de páginas de un PDF por ventanas de pocas páginas.
+        Las ventanas se reparten en un pool de hilos (tesseract corre como proceso
+        externo) y nunca hay más de 'hilos' ventanas en curso, así que la memoria
+        pico no depende del tamaño del documento.
+        
+        Args:
+            ruta_pdf: Ruta del archivo PDF
+            paginas: Números de página (empezando en 1) a reconocer
+            paginas_por_lote: Páginas renderizadas por ventana
+            hilos: Ventanas procesadas en paralelo
+            dpi: Resolución de renderizado
             
-            texto = ""
-            for i, image in enumerate(images):
-                # Aplicar OCR a cada página
-                texto += pytesseract.image_to_string(image, lang='spa') + "\n"
+        Returns:
+            Diccionario {número de página: texto}
+        """
+        # Agrupar páginas consecutivas en ventanas de tamaño acotado
+        ventanas = []
+        for pagina in sorted(set(paginas)):
+            if ventanas and pagina == ventanas[-1][1] + 1 and \
+                    ventanas[-1][1] - ventanas[-1][0] + 1 < paginas_por_lote:
+                ventanas[-1][1] = pagina
+            else:
+                ventanas.append([pagina, pagina])
+
+        textos = {}
+        pendientes = iter(ventanas)
+        with ThreadPoolExecutor(max_workers=max(1, hilos)) as executor:
+            en_curso = set()
+            for primera, ultima in pendientes:
+                en_curso.add(executor.submit(Funciones._ocr_ventana, ruta_pdf, primera, ultima, dpi))
+                if len(en_curso) >= hilos:
+                    terminados, en_curso = wait(en_curso, return_when=FIRST_COMPLETED)
+                    for futuro in terminados:
+                        textos.update(futuro.result())
+            for futuro in en_curso:
+                textos.update(futuro.result())
+        return textos
+    
+    @staticmethod
+    def extraer_texto_pdf_ocr(ruta_pdf: str, hash_archivo: str = None,
+                              paginas_por_lote: int = 4, hilos: int = 2) -> str:
+        """
+        Extrae texto de un PDF usando OCR (útil para PDFs escaneados).
+        Renderiza y reconoce unas pocas páginas a la vez, con memoria acotada.
+        Reutiliza una extracción previa de la caché si se obtuvo por OCR. El
+        intento se guarda aparte (clave '<hash>:ocr'), aunque no reconozca
+        texto, para no repetir el OCR completo de un escaneo ilegible ni pisar
+        la extracción por capa de texto.
+        
+        Args:
+            ruta_pdf: Ruta del archivo PDF
+            hash_archivo: SHA-256 del archivo, si ya se calculó
+            paginas_por_lote: Páginas renderizadas por ventana
+            hilos: Ventanas reconocidas en paralelo
             
-            return texto.strip()
+        Returns:
+            Texto extraído usando OCR
+        """
+        try:
+            cache = Funciones.obtener_cache_extraccion()
+            if cache:
+                hash_archivo = hash_archivo or Funciones.calcular_hash_archivo(ruta_pdf)
+                entrada = cache.obtener(f"{hash_archivo}:ocr")
+                if entrada and entrada['metodo'] == 'ocr_completo':
+                    return entrada['texto']
+                entrada = cache.obtener(hash_archivo)
+                # Una entrada de capa de texto no sirve: justamente se pide OCR
+                if entrada and entrada['metodo'] in ('ocr', 'mixto'):
+                    return entrada['texto']
+
+            total_paginas = Funciones.contar_paginas_pdf(ruta_pdf)
+            textos = Funciones.ocr_paginas(ruta_pdf, list(range(1, total_paginas + 1)),
+                                           paginas_por_lote=paginas_por_lote, hilos=hilos)
+
+            texto = "\n".join(textos[p] for p in sorted(textos)).strip()
+
+            # También un resultado vacío: el siguiente intento daría lo mismo
+            if cache and total_paginas:
+                cache.guardar(f"{hash_archivo}:ocr", texto, total_paginas, 'ocr_completo')
+            return texto
         except Exception as e:
             print(f"Error al extraer texto con OCR del PDF {ruta_pdf}: {e}")
             return ""
     
+    @staticmethod
+    def extraer_texto_archivo(ruta: str, extension: str, min_caracteres: int = 50,
+                              contenido: bytes = None) -> Dict:
+        """
+        Extrae el contenido de un archivo PDF, TXT o JSON según su extensión.
+        Para PDFs aplica OCR a las páginas escaneadas y, si el texto total sigue
+        teniendo menos de min_caracteres, al documento completo.
+        
+        Args:
+            ruta: Ruta del archivo
+            extension: Extensión del archivo (con o sin punto)
+            min_caracteres: Longitud mínima para considerar válido el texto de un PDF
+            contenido: Bytes del archivo ya en memoria (p. ej. leídos de un ZIP);
+                       en ese caso no se lee 'ruta' del disco
+            
+        Returns:
+            Diccionario con 'texto', 'metodo' y, para JSON, 'documento'
+        """
+        extension = extension.lower().lstrip('.')
+        resultado = {'texto': '', 'metodo': extension}
+
+        if extension == 'json':
+            if contenido is not None:
+                try:
+                    resultado['documento'] = json.loads(contenido.decode('utf-8'))
+                except Exception as e:
+                    print(f"Error al leer JSON {ruta}: {e}")
+                    resultado['documento'] = {}
+            else:
+                resultado['documento'] = Funciones.leer_json(ruta)
+
+        elif extension == 'pdf':
+            # El hash se calcula una sola vez y sirve para ambas consultas a la caché
+            hash_archivo = hashlib.sha256(contenido).hexdigest() if contenido is not None \
+                else Funciones.calcular_hash_archivo(ruta)
+            resultado['hash'] = hash_archivo
+            # Capa de texto + OCR solo de las páginas escaneadas
+            extraido = Funciones.extraer_texto_pdf_selectivo(ruta, hash_archivo, contenido=contenido)
+            texto = extraido['texto']
+            resultado['metodo'] = extraido['metodo']
+            resultado['paginas'] = extraido['paginas']
+            # Si aun así el texto es demasiado corto, intentar OCR del documento completo
+            if not texto or len(texto.strip()) < min_caracteres:
+                with Funciones.ruta_pdf_en_disco(ruta, contenido) as ruta_ocr:
+                    texto_ocr = Funciones.extraer_texto_pdf_ocr(ruta_ocr, hash_archivo)
+                if texto_ocr:
+                    texto = texto_ocr
+                    resultado['metodo'] = 'ocr'
+            resultado['texto'] = texto
+
+        elif extension == 'txt':
+            for encoding in ('utf-8', 'latin-1'):
+                try:
+                    if contenido is not None:
+                        resultado['texto'] = contenido.decode(encoding)
+                    else:
+                        with open(ruta, 'r', encoding=encoding) as f:
+                            resultado['texto'] = f.read()
+                    break
+                except Exception:
+                    continue
+
+        return resultado
+    
+    @staticmethod
+    def listar_miembros_zip(ruta_file_zip: str, extensiones: List[str] = None) -> List[Dict]:
+        """
+        Lista los archivos de un ZIP sin descomprimirlos. Cada entrada referencia
+        el ZIP y el miembro, y sirve directamente como archivo para
+        ExtraccionParalela o /cargar-documentos-elastic.
+        
+        Args:
+            ruta_file_zip: Ruta del archivo ZIP
+            extensiones: Extensiones a incluir (por defecto txt, pdf y json)
+            
+        Returns:
+            Lista de dicts con 'carpeta', 'nombre', 'ruta', 'zip', 'miembro',
+            'extension' (sin punto) y 'tamaño' (descomprimido)
+        """
+        if extensiones is None:
+            extensiones = ['txt', 'pdf', 'json']
+        archivos = []
+        try:
+            with zipfile.ZipFile(ruta_file_zip, 'r') as zip_ref:
+                for info in zip_ref.infolist():
+                    if info.is_dir():
+                        continue
+                    nombre_archivo = os.path.basename(info.filename)
+                    extension = os.path.splitext(nombre_archivo)[1].lower().replace('.', '')
+                    if extension not in extensiones:
+                        continue
+                    carpeta = os.path.dirname(info.filename)
+                    archivos.append({
+                        'carpeta': carpeta if carpeta else 'raiz',
+                        'nombre': nombre_archivo,
+                        # Ruta lógica (no existe en disco): identifica el miembro en mensajes y documentos
+                        'ruta': f"{ruta_file_zip}/{info.filename}",
+                        'zip': ruta_file_zip,
+                        'miembro': info.filename,
+                        'extension': extension,
+                        'tamaño': info.file_size
+                    })
+            return archivos
+        except Exception as e:
+            print(f"Error al leer ZIP: {e}")
+            return []
+    
+    @staticmethod
+    def extraer_texto_miembro_zip(ruta_file_zip: str, miembro: str, extension: str,
+                                  min_caracteres: int = 50) -> Dict:
+        """
+        Extrae el contenido de un miembro de un ZIP leyéndolo con ZipFile.open a
+        memoria, sin escribirlo en disco (salvo el volcado temporal que requiera el OCR)
+        
+        Args:
+            ruta_file_zip: Ruta del archivo ZIP
+            miembro: Nombre del miembro dentro del ZIP
+            extension: Extensión del miembro
+            min_caracteres: Longitud mínima para considerar válido el texto de un PDF
+            
+        Returns:
+            Mismo formato que extraer_texto_archivo
+        """
+        with zipfile.ZipFile(ruta_file_zip, 'r') as zip_ref:
+            with zip_ref.open(miembro) as f:
+                contenido = f.read()
+        return Funciones.extraer_texto_archivo(f"{ruta_file_zip}/{miembro}", extension,
+                                               min_caracteres, contenido=contenido)
+    
+    @staticmethod
+    def calcular_hash_texto(texto: str) -> str:
+        """Calcula el SHA-256 de un texto (UTF-8)"""
+        return hashlib.sha256(texto.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def dividir_en_fragmentos(texto: str, max_caracteres: int = 1500, solapamiento: int = 200) -> List[str]:
+        """
+        Divide un texto en pasajes de tamaño acotado respetando, en lo posible,
+        los saltos de párrafo. Cada pasaje repite el final del anterior
+        (solapamiento) para no partir una frase buscada entre dos fragmentos.
+        
+        Args:
+            texto: Texto completo
+            max_caracteres: Longitud máxima de cada pasaje
+            solapamiento: Caracteres del pasaje anterior repetidos al inicio del siguiente
+            
+        Returns:
+            Lista de pasajes
+        """
+        # Unidades: párrafos; los párrafos demasiado largos se parten por palabras
+        unidades = []
+        for parrafo in texto.split("\n"):
+            parrafo = parrafo.strip()
+            if not parrafo:
+                continue
+            while len(parrafo) > max_caracteres:
+                corte = parrafo.rfind(' ', 0, max_caracteres)
+                corte = corte if corte > 0 else max_caracteres
+                unidades.append(parrafo[:corte])
+                parrafo = parrafo[corte:].strip()
+            if parrafo:
+                unidades.append(parrafo)
+
+        fragmentos = []
+        actual = ""
+        for unidad in unidades:
+            if actual and len(actual) + 1 + len(unidad) > max_caracteres:
+                fragmentos.append(actual)
+                # Arrancar el siguiente pasaje con la cola del anterior, desde un límite de palabra
+                cola = actual[-solapamiento:] if solapamiento else ""
+                espacio = cola.find(' ')
+                cola = cola[espacio + 1:] if espacio >= 0 else cola
+                actual = cola if len(cola) + 1 + len(unidad) <= max_caracteres else ""
+            actual = f"{actual}\n{unidad}" if actual else unidad
+        if actual:
+            fragmentos.append(actual)
+        return fragmentos
+    
+    @staticmethod
+    def iterar_en_segundo_plano(elementos: Iterable, max_pendientes: int = 8) -> Iterator:
+        """
+        Consume un iterable en un hilo productor y entrega sus elementos a través de
+        una cola acotada. El productor se bloquea cuando hay max_pendientes elementos
+        sin consumir, así que la memoria queda limitada aunque el iterable sea enorme,
+        y productor y consumidor trabajan al mismo tiempo.
+        
+        Args:
+            elementos: Iterable o generador a consumir
+            max_pendientes: Tamaño máximo de la cola
+            
+        Returns:
+            Iterador con los mismos elementos y en el mismo orden
+        """
+        fin = object()
+        cola = queue.Queue(maxsize=max(1, max_pendientes))
+        detener = threading.Event()
+        error = []
+
+        def producir():
+            try:
+                for elemento in elementos:
+                    # Reintentar mientras la cola esté llena, salvo que el consumidor se haya ido
+                    while not detener.is_set():
+                        try:
+                            cola.put(elemento, timeout=0.5)
+                            break
+                        except queue.Full:
+                            continue
+                    if detener.is_set():
+                        return
+            except Exception as e:
+                error.append(e)
+            finally:
+                while not detener.is_set():
+                    try:
+                        cola.put(fin, timeout=0.5)
+                        break
+                    except queue.Full:
+                        continue
+
+        hilo = threading.Thread(target=producir, daemon=True)
+        hilo.start()
+        try:
+            while True:
+                elemento = cola.get()
+                if elemento is fin:
+                    break
+                yield elemento
+            if error:
+                raise error[0]
+        finally:
+            detener.set()
+    
     @staticmethod
     def listar_archivos_json(ruta_carpeta: str) -> List[Dict]:
         """
@@ -276,47 +796,65 @@ class Funciones:
             return False
         
     @staticmethod
-    def procesar_zip_pdfs(zip_path: str, carpeta_temporal: str = "temp") -> list:
+    def procesar_zip_pdfs(zip_path: str, carpeta_temporal: str = "temp",
+                          num_procesos: int = None, trabajo=None, en_disco: bool = False) -> list:
         """
-        Procesa un ZIP con PDFs, extrae texto de cada PDF usando las funciones de la clase y devuelve lista de diccionarios.
+        Procesa un ZIP con PDFs, extrae texto de cada PDF en paralelo y devuelve lista de diccionarios.
+        Por defecto lee cada PDF directamente del ZIP; con en_disco=True lo descomprime
+        antes en carpeta_temporal.
 
         Args:
             zip_path (str): Ruta del archivo ZIP.
-            carpeta_temporal (str): Carpeta temporal donde se extraerán los archivos.
+            carpeta_temporal (str): Carpeta temporal donde se extraerán los archivos (solo en_disco).
+            num_procesos (int): Procesos para la extracción (por defecto, núcleos disponibles).
+            trabajo: Trabajo de GestorTrabajos opcional para reportar progreso y cancelar.
+            en_disco (bool): Descomprimir a disco en lugar de leer desde el ZIP.
 
         Returns:
-            List[Dict]: Lista de dicts con 'nombre', 'texto', 'ruta' y opcional 'error'.
+            List[Dict]: Lista de dicts con 'nombre', 'texto', 'ruta', 'extension', 'tamaño'
+            (y 'zip'/'miembro' al leer desde el ZIP) y opcional 'error'.
         """
-        # Crear carpeta temporal si no existe
-        Funciones.crear_carpeta(carpeta_temporal)
+        from Helpers.extraccionParalela import ExtraccionParalela
 
-        # Limpiar carpeta temporal
-        Funciones.borrar_contenido_carpeta(carpeta_temporal)
+        if en_disco:
+            # Crear carpeta temporal si no existe
+            Funciones.crear_carpeta(carpeta_temporal)
 
-        # Descomprimir ZIP y obtener info de PDFs
-        archivos_extraidos = Funciones.descomprimir_zip_local(zip_path, carpeta_temporal)
+            # Limpiar carpeta temporal
+            Funciones.borrar_contenido_carpeta(carpeta_temporal)
 
-        resultados = []
+            # Descomprimir ZIP y obtener info de PDFs
+            archivos_extraidos = Funciones.descomprimir_zip_local(zip_path, carpeta_temporal)
+            pdfs = [a for a in archivos_extraidos if a['extension'] == '.pdf']
+        else:
+            pdfs = Funciones.listar_miembros_zip(zip_path, ['pdf'])
 
-        for archivo in archivos_extraidos:
-            if archivo['extension'] == '.pdf':
-                try:
-                    texto = Funciones.extraer_texto_pdf(archivo['ruta'])
-                    # Si no se extrajo texto, intentar OCR
-                    if not texto.strip():
-                        texto = Funciones.extraer_texto_pdf_ocr(archivo['ruta'])
+        # Como siempre en esta ruta: OCR del PDF completo solo si no tiene nada de texto
+        pdfs = [{**a, 'min_caracteres_ocr': 1} for a in pdfs]
 
-                    resultados.append({
-                        "nombre": archivo['nombre'],
-                        "texto": texto,
-                        "ruta": archivo['ruta']
-                    })
-                except Exception as e:
-                    resultados.append({
-                        "nombre": archivo['nombre'],
-                        "texto": "",
-                        "ruta": archivo['ruta'],
-                        "error": str(e)
-                    })
+        resultados = []
+        motor = ExtraccionParalela(num_procesos=num_procesos)
+        if trabajo:
+            trabajo.etapa('extraccion', total=len(pdfs))
+
+        orden = {a['ruta']: i for i, a in enumerate(pdfs)}
+        for extraido in motor.procesar(pdfs):
+            if trabajo:
+                trabajo.avanzar('extraccion', errores=1 if 'error' in extraido else 0,
+                                detalle_error=extraido.get('error'))
+            resultado = {
+                "nombre": extraido['nombre'],
+                "texto": extraido.get('texto', ''),
+                "ruta": extraido['ruta'],
+                "extension": 'pdf',
+                "tamaño": extraido.get('tamaño') or (os.path.getsize(extraido['ruta']) if en_disco else 0)
+            }
+            if 'zip' in extraido:
+                resultado["zip"] = extraido['zip']
+                resultado["miembro"] = extraido['miembro']
+            if 'error' in extraido:
+                resultado["error"] = extraido['error']
+            resultados.append(resultado)
 
-        return resultados
\ No newline at end of file
+        resultados.sort(key=lambda r: orden.get(r['ruta'], len(orden)))
+        return resultados
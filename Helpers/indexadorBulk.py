@@ -0,0 +1,264 @@
+import json
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Iterable, Iterator, List, Tuple
+from elasticsearch import ApiError, ConnectionError as ErrorConexion, ConnectionTimeout
+from elasticsearch.helpers import expand_action
+
+
+class IndexadorBulk:
+    """
+    Envío de acciones _bulk con lotes acotados por documentos y por bytes,
+    varias peticiones en paralelo, reintentos con backoff exponencial ante
+    rechazos (429 / 503) y ajuste automático del tamaño del lote y de la
+    concurrencia según el 'took' que reporta el clúster: si responde rápido se
+    agranda el lote, si tarda o rechaza se achica (AIMD).
+
+    ejecutar() entrega tuplas (ok, item) como elasticsearch.helpers.streaming_bulk,
+    así que puede reemplazarlo sin cambiar el código que consume los resultados.
+    """
+
+    # Estados que indican sobrecarga transitoria del clúster
+    ESTADOS_REINTENTABLES = (429, 502, 503, 504)
+
+    def __init__(self, client, max_hilos: int = 2, max_docs_por_lote: int = 500,
+                 max_mb_por_lote: float = 10, min_mb_por_lote: float = 0.5,
+                 took_objetivo_ms: int = 1000, max_reintentos: int = 5,
+                 backoff_inicial: float = 1.0, backoff_maximo: float = 60.0,
+                 max_mb_peticion: float = 95, historial_lotes: int = 50):
+        """
+        Args:
+            client: Cliente Elasticsearch
+            max_hilos: Peticiones _bulk simultáneas como máximo
+            max_docs_por_lote: Acciones máximas por petición
+            max_mb_por_lote: Tamaño máximo de cada petición (el ajuste no lo supera)
+            min_mb_por_lote: Tamaño mínimo al que puede reducirse el lote
+            took_objetivo_ms: Tiempo de procesamiento por lote buscado en el clúster
+            max_reintentos: Reintentos por lote ante 429 / 503 / errores de conexión
+            backoff_inicial: Espera antes del primer reintento (se duplica en cada uno)
+            backoff_maximo: Espera máxima entre reintentos
+            max_mb_peticion: Documentos más grandes se rechazan sin enviarse
+                             (http.max_content_length del clúster es 100 MB)
+            historial_lotes: Lotes recientes incluidos en las estadísticas
+        """
+        self.client = client
+        self.max_hilos = max(1, max_hilos)
+        self.max_docs_por_lote = max(1, max_docs_por_lote)
+        self.max_bytes = int(max_mb_por_lote * 1048576)
+        self.min_bytes = min(int(min_mb_por_lote * 1048576), self.max_bytes)
+        self.took_objetivo_ms = took_objetivo_ms
+        self.max_reintentos = max_reintentos
+        self.backoff_inicial = backoff_inicial
+        self.backoff_maximo = backoff_maximo
+        self.max_bytes_peticion = int(max_mb_peticion * 1048576)
+
+        # Estado ajustable: se empieza a mitad de camino y con un hilo
+        self.lote_bytes = max(self.min_bytes, self.max_bytes // 2)
+        self.concurrencia = 1
+        self._lotes_buenos = 0
+        self._lock = threading.Lock()
+
+        self._historial = deque(maxlen=historial_lotes)
+        self._totales = {'lotes': 0, 'acciones': 0, 'bytes': 0, 'took_ms': 0,
+                         'reintentos': 0, 'rechazos': 0, 'segundos': 0.0}
+
+    # ------------------------------------------------------------------
+    # Armado de lotes
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _serializar(accion: Dict) -> Tuple[bytes, bytes, Dict]:
+        """Líneas NDJSON de una acción (se serializa una sola vez) y su metadato"""
+        cabecera, fuente = expand_action(accion)
+        linea_cabecera = json.dumps(cabecera, ensure_ascii=False, default=str).encode('utf-8')
+        linea_fuente = None
+        if fuente is not None:
+            linea_fuente = json.dumps(fuente, ensure_ascii=False, default=str).encode('utf-8')
+        return linea_cabecera, linea_fuente, cabecera
+
+    @staticmethod
+    def _tamaño(linea: Tuple) -> int:
+        return len(linea[0]) + 1 + (len(linea[1]) + 1 if linea[1] is not None else 0)
+
+    def _lotes(self, acciones: Iterable[Dict], rechazadas: List) -> Iterator[List]:
+        lote = []
+        tamaño_lote = 0
+        for accion in acciones:
+            linea = self._serializar(accion)
+            tamaño = self._tamaño(linea)
+            if tamaño > self.max_bytes_peticion:
+                rechazadas.append(linea)
+                continue
+            # Un documento mayor que el lote viaja solo
+            if lote and (len(lote) >= self.max_docs_por_lote or tamaño_lote + tamaño > self.lote_bytes):
+                yield lote
+                lote, tamaño_lote = [], 0
+            lote.append(linea)
+            tamaño_lote += tamaño
+        if lote:
+            yield lote
+
+    # ------------------------------------------------------------------
+    # Envío
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _item_error(linea: Tuple, estado: int, error: str) -> Tuple[bool, Dict]:
+        op, meta = next(iter(linea[2].items()))
+        return False, {op: {**meta, 'status': estado, 'error': error}}
+
+    def _esperar_backoff(self, intento: int):
+        espera = min(self.backoff_maximo, self.backoff_inicial * (2 ** intento))
+        time.sleep(espera * random.uniform(0.5, 1.0))
+
+    def _enviar(self, lote: List) -> List[Tuple[bool, Dict]]:
+        """Envía un lote reintentando las acciones rechazadas por sobrecarga"""
+        resultados = []
+        pendientes = lote
+        intento = 0
+        inicio = time.perf_counter()
+        bytes_lote = sum(self._tamaño(l) for l in lote)
+        took_total = 0
+        rechazos = 0
+
+        while pendientes:
+            cuerpo = []
+            for linea in pendientes:
+                cuerpo.append(linea[0])
+                if linea[1] is not None:
+                    cuerpo.append(linea[1])
+
+            try:
+                resp = self.client.bulk(operations=cuerpo)
+            except (ApiError, ErrorConexion, ConnectionTimeout) as e:
+                estado = getattr(e, 'status_code', None) if isinstance(e, ApiError) else None
+                transitorio = estado is None or estado in self.ESTADOS_REINTENTABLES
+                if transitorio and intento < self.max_reintentos:
+                    rechazos += 1
+                    self._ajustar(None, rechazado=True)
+                    self._esperar_backoff(intento)
+                    intento += 1
+                    continue
+                resultados.extend(self._item_error(l, estado or 503, str(e)) for l in pendientes)
+                break
+
+            took_total += resp.get('took', 0)
+            reintentar = []
+            for linea, item in zip(pendientes, resp['items']):
+                info = next(iter(item.values()))
+                estado = info.get('status', 500)
+                if estado in self.ESTADOS_REINTENTABLES and intento < self.max_reintentos:
+                    reintentar.append(linea)
+                    continue
+                resultados.append((200 <= estado < 300, item))
+
+            self._ajustar(resp.get('took', 0), rechazado=bool(reintentar))
+            if reintentar:
+                rechazos += 1
+                self._esperar_backoff(intento)
+                intento += 1
+            pendientes = reintentar
+
+        self._registrar_lote(len(lote), bytes_lote, took_total, intento, rechazos,
+                             time.perf_counter() - inicio)
+        return resultados
+
+    # ------------------------------------------------------------------
+    # Ajuste y estadísticas
+    # ------------------------------------------------------------------
+
+    def _ajustar(self, took_ms, rechazado: bool):
+        """
+        Aumento aditivo / reducción multiplicativa: tras varios lotes rápidos se
+        agranda el lote y se suma un hilo; un rechazo reduce ambos a la mitad
+        """
+        with self._lock:
+            if rechazado:
+                self.lote_bytes = max(self.min_bytes, self.lote_bytes // 2)
+                self.concurrencia = max(1, self.concurrencia // 2)
+                self._lotes_buenos = 0
+            elif took_ms > self.took_objetivo_ms * 1.5:
+                self.lote_bytes = max(self.min_bytes, int(self.lote_bytes * 0.75))
+                self._lotes_buenos = 0
+            elif took_ms < self.took_objetivo_ms * 0.5:
+                self._lotes_buenos += 1
+                self.lote_bytes = min(self.max_bytes, int(self.lote_bytes * 1.25))
+                if self._lotes_buenos >= 3 and self.concurrencia < self.max_hilos:
+                    self.concurrencia += 1
+                    self._lotes_buenos = 0
+
+    def _registrar_lote(self, acciones: int, bytes_lote: int, took_ms: int, reintentos: int,
+                        rechazos: int, segundos: float):
+        with self._lock:
+            self._historial.append({
+                'acciones': acciones,
+                'mb': round(bytes_lote / 1048576, 3),
+                'took_ms': took_ms,
+                'latencia_ms': round(segundos * 1000),
+                'mb_por_segundo': round(bytes_lote / 1048576 / segundos, 2) if segundos > 0 else None,
+                'docs_por_segundo': round(acciones / segundos, 1) if segundos > 0 else None,
+                'reintentos': reintentos,
+                'lote_mb_siguiente': round(self.lote_bytes / 1048576, 2),
+                'concurrencia': self.concurrencia
+            })
+            self._totales['lotes'] += 1
+            self._totales['acciones'] += acciones
+            self._totales['bytes'] += bytes_lote
+            self._totales['took_ms'] += took_ms
+            self._totales['reintentos'] += reintentos
+            self._totales['rechazos'] += rechazos
+            self._totales['segundos'] += segundos
+
+    def estadisticas(self) -> Dict:
+        """Totales, throughput y los últimos lotes enviados"""
+        with self._lock:
+            t = dict(self._totales)
+            lotes = list(self._historial)
+            lote_mb = round(self.lote_bytes / 1048576, 2)
+            concurrencia = self.concurrencia
+        return {
+            'lotes': t['lotes'],
+            'acciones': t['acciones'],
+            'mb': round(t['bytes'] / 1048576, 2),
+            'reintentos': t['reintentos'],
+            'rechazos': t['rechazos'],
+            'took_promedio_ms': round(t['took_ms'] / t['lotes']) if t['lotes'] else None,
+            'mb_por_segundo_lote': round(t['bytes'] / 1048576 / t['segundos'], 2) if t['segundos'] else None,
+            'lote_mb_final': lote_mb,
+            'concurrencia_final': concurrencia,
+            'ultimos_lotes': lotes
+        }
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def ejecutar(self, acciones: Iterable[Dict]) -> Iterator[Tuple[bool, Dict]]:
+        """
+        Envía las acciones y entrega (ok, item) por cada una en cuanto su lote
+        termina. Nunca hay más de 'concurrencia' lotes en vuelo.
+        """
+        rechazadas = []
+        with ThreadPoolExecutor(max_workers=self.max_hilos, thread_name_prefix='bulk') as executor:
+            en_vuelo = set()
+            for lote in self._lotes(acciones, rechazadas):
+                while len(en_vuelo) >= self.concurrencia:
+                    hechos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                    for futuro in hechos:
+                        yield from futuro.result()
+                en_vuelo.add(executor.submit(self._enviar, lote))
+
+                while rechazadas:
+                    yield self._item_error(rechazadas.pop(), 413,
+                                           'Documento mayor que el tamaño máximo de petición')
+
+            while en_vuelo:
+                hechos, en_vuelo = wait(en_vuelo, return_when=FIRST_COMPLETED)
+                for futuro in hechos:
+                    yield from futuro.result()
+
+        for linea in rechazadas:
+            yield self._item_error(linea, 413, 'Documento mayor que el tamaño máximo de petición')
@@ -0,0 +1,539 @@
+import json
+import os
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from Helpers.funciones import Funciones
+
+
+class IndiceVectorial:
+    """
+    Índice de vectores local para búsqueda semántica sin Elasticsearch. Los
+    embeddings (normalizados, similitud = producto punto) se guardan en un
+    np.memmap float16 o int8 (con una escala por fila) y el top-k se calcula
+    con productos de matrices por bloques, así que solo un bloque está en
+    memoria a la vez y el sistema operativo decide qué páginas conserva.
+
+    Para corpus grandes, entrenar_ivf() agrupa los vectores en listas
+    (k-means esférico) y cada consulta recorre solo las 'nprobe' listas más
+    cercanas. Agregar es incremental (las filas se anexan); eliminar o
+    reemplazar un id deja la fila anterior marcada como borrada hasta
+    compactar().
+
+    Archivos en 'ruta' (el sufijo _<version> cambia al compactar):
+        meta.json                 dims, tipo, filas, capacidad, versión y listas IVF
+        vectores_<v>.bin          matriz capacidad x dims (float16 o int8)
+        escalas_<v>.bin           escala float32 de cada fila (solo int8)
+        vivos_<v>.bin             1 = fila vigente, 0 = borrada (uint8)
+        ids_<v>.jsonl             [id, metadatos] de cada fila, en orden
+        listas_<v>.bin            lista IVF de cada fila (int32)
+        centroides_<v>.npy        centroides IVF
+    """
+
+    TIPOS = {'float16': np.float16, 'int8': np.int8}
+
+    def __init__(self, ruta: str, dims: int = None, tipo: str = 'float16',
+                 capacidad_inicial: int = 1024):
+        """
+        Abre el índice de 'ruta' o lo crea vacío.
+
+        Args:
+            ruta: Carpeta del índice
+            dims: Dimensión de los vectores (si es None se toma del primer agregar())
+            tipo: 'float16' (la mitad que float32, sin pérdida apreciable) o
+                  'int8' (la cuarta parte, con una escala por fila)
+            capacidad_inicial: Filas reservadas al crear (se duplica al llenarse)
+        """
+        if tipo not in self.TIPOS:
+            raise ValueError(f"Tipo de vector no soportado: {tipo}")
+
+        self.ruta = ruta
+        self._lock = threading.RLock()
+        os.makedirs(ruta, exist_ok=True)
+
+        meta = self._leer_meta()
+        if meta:
+            self.dims = meta['dims']
+            self.tipo = meta['tipo']
+            self.version = meta['version']
+            self.filas = meta['filas']
+            self.capacidad = meta['capacidad']
+            self.num_listas = meta.get('num_listas', 0)
+        else:
+            self.dims = dims
+            self.tipo = tipo
+            self.version = 1
+            self.filas = 0
+            self.capacidad = max(1, capacidad_inicial)
+            self.num_listas = 0
+
+        self._ids: List[str] = []
+        self._metadatos: List[Dict] = []
+        self._fila_de: Dict[str, int] = {}
+        self._listas_invertidas = None
+        self._abrir()
+
+    # ------------------------------------------------------------------
+    # Archivos
+    # ------------------------------------------------------------------
+
+    def _archivo(self, nombre: str, version: int = None, extension: str = 'bin') -> str:
+        return os.path.join(self.ruta, f"{nombre}_{version or self.version}.{extension}")
+
+    def _leer_meta(self) -> Optional[Dict]:
+        try:
+            with open(os.path.join(self.ruta, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _guardar_meta(self):
+        """Escritura atómica: meta.json define qué filas y qué versión son válidas"""
+        ruta = os.path.join(self.ruta, 'meta.json')
+        temporal = f"{ruta}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump({'dims': self.dims, 'tipo': self.tipo, 'version': self.version,
+                       'filas': self.filas, 'capacidad': self.capacidad,
+                       'num_listas': self.num_listas}, f)
+        os.replace(temporal, ruta)
+
+    def _mapear(self, nombre: str, dtype, columnas: int = None, version: int = None,
+                capacidad: int = None) -> np.memmap:
+        """memmap de un archivo de la versión; 'r+' lo extiende si hace falta"""
+        ruta = self._archivo(nombre, version)
+        forma = (capacidad or self.capacidad,) + ((columnas,) if columnas else ())
+        modo = 'r+' if os.path.exists(ruta) else 'w+'
+        return np.memmap(ruta, dtype=dtype, mode=modo, shape=forma)
+
+    def _abrir(self):
+        """Mapea los archivos de la versión actual y carga el mapa de ids"""
+        self._vectores = self._escalas = self._vivos = self._listas = self._centroides = None
+        self._ids, self._metadatos, self._fila_de = [], [], {}
+        self._listas_invertidas = None
+        if not self.dims:
+            return
+
+        self._vectores = self._mapear('vectores', self.TIPOS[self.tipo], self.dims)
+        self._vivos = self._mapear('vivos', np.uint8)
+        if self.tipo == 'int8':
+            self._escalas = self._mapear('escalas', np.float32)
+        if self.num_listas:
+            self._listas = self._mapear('listas', np.int32)
+            self._centroides = np.load(self._archivo('centroides', extension='npy'))
+
+        # Líneas de más (un proceso que murió antes de actualizar meta.json) se ignoran
+        ruta_ids = self._archivo('ids', extension='jsonl')
+        if os.path.exists(ruta_ids):
+            with open(ruta_ids, 'r', encoding='utf-8') as f:
+                for fila, linea in enumerate(f):
+                    if fila >= self.filas:
+                        break
+                    doc_id, metadatos = json.loads(linea)
+                    self._ids.append(doc_id)
+                    self._metadatos.append(metadatos)
+                    if self._vivos[fila]:
+                        self._fila_de[doc_id] = fila
+            if len(self._ids) < self.filas:
+                self.filas = len(self._ids)
+
+    def _crecer(self, filas_necesarias: int):
+        if filas_necesarias <= self.capacidad:
+            return
+        while self.capacidad < filas_necesarias:
+            self.capacidad *= 2
+        self._vectores = self._mapear('vectores', self.TIPOS[self.tipo], self.dims)
+        self._vivos = self._mapear('vivos', np.uint8)
+        if self._escalas is not None:
+            self._escalas = self._mapear('escalas', np.float32)
+        if self._listas is not None:
+            self._listas = self._mapear('listas', np.int32)
+
+    # ------------------------------------------------------------------
+    # Escritura
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _normalizar(vectores: np.ndarray) -> np.ndarray:
+        normas = np.linalg.norm(vectores, axis=1, keepdims=True)
+        normas[normas == 0] = 1.0
+        return vectores / normas
+
+    def _cuantizar(self, vectores: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Vectores en el tipo del índice y, para int8, la escala de cada fila"""
+        if self.tipo == 'float16':
+            return vectores.astype(np.float16), None
+        escalas = np.abs(vectores).max(axis=1) / 127.0
+        escalas[escalas == 0] = 1.0
+        cuantizados = np.clip(np.rint(vectores / escalas[:, None]), -127, 127).astype(np.int8)
+        return cuantizados, escalas.astype(np.float32)
+
+    def agregar(self, ids: List[str], vectores, metadatos: List[Dict] = None) -> int:
+        """
+        Anexa vectores al índice. Un id que ya existe se reemplaza: su fila
+        anterior queda borrada hasta la próxima compactación.
+
+        Args:
+            ids: Identificador de cada vector
+            vectores: Matriz n x dims (se normaliza)
+            metadatos: Dict opcional por vector (nombre de archivo, id del padre...)
+
+        Returns:
+            Número de vectores agregados
+        """
+        if not len(ids):
+            return 0
+        matriz = self._normalizar(np.asarray(vectores, dtype=np.float32).reshape(len(ids), -1))
+        metadatos = metadatos or [{} for _ in ids]
+
+        with self._lock:
+            if not self.dims:
+                self.dims = matriz.shape[1]
+                self._abrir()
+            if matriz.shape[1] != self.dims:
+                raise ValueError(f"Dimensión {matriz.shape[1]} distinta a la del índice ({self.dims})")
+
+            inicio = self.filas
+            fin = inicio + len(ids)
+            self._crecer(fin)
+
+            cuantizados, escalas = self._cuantizar(matriz)
+            self._vectores[inicio:fin] = cuantizados
+            if escalas is not None:
+                self._escalas[inicio:fin] = escalas
+            if self._listas is not None:
+                self._listas[inicio:fin] = self._lista_mas_cercana(matriz)
+
+            for doc_id in ids:
+                anterior = self._fila_de.get(doc_id)
+                if anterior is not None:
+                    self._vivos[anterior] = 0
+            self._vivos[inicio:fin] = 1
+
+            for array in (self._vectores, self._escalas, self._vivos, self._listas):
+                if array is not None:
+                    array.flush()
+
+            with open(self._archivo('ids', extension='jsonl'), 'a', encoding='utf-8') as f:
+                for fila, (doc_id, meta) in enumerate(zip(ids, metadatos), inicio):
+                    f.write(json.dumps([doc_id, meta], ensure_ascii=False, default=str) + '\n')
+                    self._ids.append(doc_id)
+                    self._metadatos.append(meta)
+                    self._fila_de[doc_id] = fila
+
+            self.filas = fin
+            self._listas_invertidas = None
+            self._guardar_meta()
+        return len(ids)
+
+    def eliminar(self, ids: Iterable[str]) -> int:
+        """Marca como borrados los vectores de 'ids'; devuelve cuántos existían"""
+        with self._lock:
+            eliminados = 0
+            for doc_id in ids:
+                fila = self._fila_de.pop(doc_id, None)
+                if fila is not None:
+                    self._vivos[fila] = 0
+                    eliminados += 1
+            if eliminados:
+                self._vivos.flush()
+            return eliminados
+
+    def contiene(self, doc_id: str) -> bool:
+        """Indica si 'doc_id' tiene un vector vigente"""
+        return doc_id in self._fila_de
+
+    def compactar(self, tam_bloque: int = 8192) -> Dict:
+        """
+        Reescribe solo las filas vigentes en una versión nueva de los archivos y
+        cambia meta.json de forma atómica; las búsquedas en curso siguen
+        leyendo la versión anterior hasta terminar.
+
+        Returns:
+            Dict con 'filas_antes', 'filas_despues' y 'version'
+        """
+        with self._lock:
+            filas_antes = self.filas
+            if not self.dims:
+                return {'filas_antes': 0, 'filas_despues': 0, 'version': self.version}
+
+            vigentes = np.flatnonzero(self._vivos[:self.filas])
+            nueva = self.version + 1
+            # Restos de una compactación interrumpida
+            self._borrar_version(nueva)
+            capacidad = max(1024, 1 << int(len(vigentes)).bit_length())
+
+            vectores = self._mapear('vectores', self.TIPOS[self.tipo], self.dims, nueva, capacidad)
+            vivos = self._mapear('vivos', np.uint8, version=nueva, capacidad=capacidad)
+            escalas = (self._mapear('escalas', np.float32, version=nueva, capacidad=capacidad)
+                       if self._escalas is not None else None)
+            listas = (self._mapear('listas', np.int32, version=nueva, capacidad=capacidad)
+                      if self._listas is not None else None)
+
+            for inicio in range(0, len(vigentes), tam_bloque):
+                filas = vigentes[inicio:inicio + tam_bloque]
+                fin = inicio + len(filas)
+                vectores[inicio:fin] = self._vectores[filas]
+                if escalas is not None:
+                    escalas[inicio:fin] = self._escalas[filas]
+                if listas is not None:
+                    listas[inicio:fin] = self._listas[filas]
+            vivos[:len(vigentes)] = 1
+            for array in (vectores, vivos, escalas, listas):
+                if array is not None:
+                    array.flush()
+            del vectores, vivos, escalas, listas
+
+            with open(self._archivo('ids', nueva, 'jsonl'), 'w', encoding='utf-8') as f:
+                for fila in vigentes:
+                    f.write(json.dumps([self._ids[fila], self._metadatos[fila]],
+                                       ensure_ascii=False, default=str) + '\n')
+            if self._centroides is not None:
+                np.save(self._archivo('centroides', nueva, 'npy'), self._centroides)
+
+            anterior = self.version
+            self.version, self.filas, self.capacidad = nueva, len(vigentes), capacidad
+            self._guardar_meta()
+            self._abrir()
+            self._borrar_version(anterior)
+
+            return {'filas_antes': filas_antes, 'filas_despues': self.filas, 'version': self.version}
+
+    def _borrar_version(self, version: int):
+        for nombre, extension in (('vectores', 'bin'), ('vivos', 'bin'), ('escalas', 'bin'),
+                                  ('listas', 'bin'), ('ids', 'jsonl'), ('centroides', 'npy')):
+            try:
+                os.remove(self._archivo(nombre, version, extension))
+            except FileNotFoundError:
+                pass
+
+    # ------------------------------------------------------------------
+    # IVF (cuantizador grueso)
+    # ------------------------------------------------------------------
+
+    def _lista_mas_cercana(self, matriz: np.ndarray) -> np.ndarray:
+        return np.argmax(matriz @ self._centroides.T, axis=1).astype(np.int32)
+
+    def _bloque_float32(self, filas, vectores: np.memmap = None,
+                        escalas: np.memmap = None) -> np.ndarray:
+        """Vectores de un bloque (slice o arreglo de filas) en float32 ya desescalados"""
+        if vectores is None:
+            vectores, escalas = self._vectores, self._escalas
+        bloque = vectores[filas].astype(np.float32)
+        if escalas is not None:
+            bloque *= escalas[filas][:, None]
+        return bloque
+
+    def entrenar_ivf(self, num_listas: int = None, iteraciones: int = 10, muestra: int = 20000,
+                     tam_bloque: int = 8192, semilla: int = 42) -> Dict:
+        """
+        Entrena el cuantizador grueso con k-means esférico sobre una muestra y
+        asigna cada fila a su lista. Los vectores agregados después se asignan
+        al centroide más cercano; conviene reentrenar si el corpus cambia mucho.
+
+        Args:
+            num_listas: Listas IVF (por defecto ~4 * raíz de las filas vigentes)
+            iteraciones: Iteraciones de k-means
+            muestra: Vectores usados para entrenar
+
+        Returns:
+            Dict con 'num_listas' y 'filas'
+        """
+        with self._lock:
+            vigentes = np.flatnonzero(self._vivos[:self.filas]) if self.dims else np.array([], dtype=np.int64)
+            if len(vigentes) < 2:
+                return {'num_listas': 0, 'filas': int(len(vigentes))}
+
+            num_listas = min(num_listas or int(4 * np.sqrt(len(vigentes))), len(vigentes))
+            rng = np.random.default_rng(semilla)
+            filas_muestra = np.sort(rng.choice(vigentes, size=min(muestra, len(vigentes)), replace=False))
+            datos = self._bloque_float32(filas_muestra)
+
+            centroides = datos[rng.choice(len(datos), size=num_listas, replace=False)]
+            for _ in range(iteraciones):
+                asignacion = np.argmax(datos @ centroides.T, axis=1)
+                sumas = np.zeros_like(centroides)
+                np.add.at(sumas, asignacion, datos)
+                vacias = ~np.bincount(asignacion, minlength=num_listas).astype(bool)
+                # Una lista vacía se reinicia con un punto cualquiera de la muestra
+                sumas[vacias] = datos[rng.choice(len(datos), size=int(vacias.sum()))]
+                centroides = self._normalizar(sumas)
+
+            self._centroides = centroides.astype(np.float32)
+            np.save(self._archivo('centroides', extension='npy'), self._centroides)
+            self._listas = self._mapear('listas', np.int32)
+            for inicio in range(0, self.filas, tam_bloque):
+                fin = min(inicio + tam_bloque, self.filas)
+                self._listas[inicio:fin] = self._lista_mas_cercana(self._bloque_float32(slice(inicio, fin)))
+            self._listas.flush()
+
+            self.num_listas = num_listas
+            self._listas_invertidas = None
+            self._guardar_meta()
+            return {'num_listas': num_listas, 'filas': int(len(vigentes))}
+
+    def _filas_de_listas(self, consultas: np.ndarray, nprobe: int) -> np.ndarray:
+        """Filas de las 'nprobe' listas más cercanas a alguna de las consultas"""
+        if self._listas_invertidas is None:
+            asignacion = np.asarray(self._listas[:self.filas])
+            orden = np.argsort(asignacion, kind='stable')
+            limites = np.searchsorted(asignacion[orden], np.arange(self.num_listas + 1))
+            self._listas_invertidas = (orden, limites)
+        orden, limites = self._listas_invertidas
+
+        cercanas = np.argsort(-(consultas @ self._centroides.T), axis=1)[:, :nprobe]
+        partes = [orden[limites[l]:limites[l + 1]] for l in np.unique(cercanas)]
+        return np.sort(np.concatenate(partes)) if partes else np.array([], dtype=np.int64)
+
+    # ------------------------------------------------------------------
+    # Búsqueda
+    # ------------------------------------------------------------------
+
+    def buscar(self, vector, k: int = 10, nprobe: int = 8, tam_bloque: int = 8192,
+               agrupar_por: str = None) -> List[Tuple[str, float, Dict]]:
+        """
+        Top-k por producto punto (similitud coseno) con productos por bloques.
+        Con listas IVF solo se recorren las 'nprobe' más cercanas.
+
+        Args:
+            vector: Embedding de la consulta, o matriz m x dims para varias consultas
+            k: Resultados por consulta
+            nprobe: Listas IVF recorridas (ignorado sin entrenar_ivf)
+            tam_bloque: Filas multiplicadas por bloque (acota la memoria)
+            agrupar_por: Clave de metadatos para devolver un solo resultado por
+                         valor (p. ej. 'id_padre' con un vector por pasaje)
+
+        Returns:
+            Lista (id, similitud, metadatos) de mayor a menor similitud; con una
+            matriz de consultas, una lista así por consulta
+        """
+        consultas = np.asarray(vector, dtype=np.float32)
+        una_sola = consultas.ndim == 1
+        consultas = self._normalizar(consultas.reshape(-1, consultas.shape[-1]))
+
+        with self._lock:
+            if not self.dims or not self._fila_de:
+                return [] if una_sola else [[] for _ in consultas]
+            filas_total = self.filas
+            candidatas = (self._filas_de_listas(consultas, nprobe)
+                          if self.num_listas and self._listas is not None else None)
+            # Una compactación concurrente cambia estos objetos, no los ya tomados
+            ids, metadatos = self._ids, self._metadatos
+            vectores, escalas, vivos = self._vectores, self._escalas, self._vivos
+
+        # Con agrupación se piden más candidatos: varios pueden ser del mismo padre
+        pedir = k * 5 if agrupar_por else k
+        mejores_puntajes = np.full((len(consultas), 0), -np.inf, dtype=np.float32)
+        mejores_filas = np.zeros((len(consultas), 0), dtype=np.int64)
+
+        total = len(candidatas) if candidatas is not None else filas_total
+        for inicio in range(0, total, tam_bloque):
+            fin = min(inicio + tam_bloque, total)
+            filas = candidatas[inicio:fin] if candidatas is not None else np.arange(inicio, fin)
+            seleccion = filas if candidatas is not None else slice(inicio, fin)
+
+            puntajes = consultas @ self._bloque_float32(seleccion, vectores, escalas).T
+            puntajes[:, vivos[seleccion] == 0] = -np.inf
+
+            puntajes = np.concatenate([mejores_puntajes, puntajes], axis=1)
+            todas = np.concatenate([mejores_filas, np.broadcast_to(filas, (len(consultas), len(filas)))], axis=1)
+            if puntajes.shape[1] > pedir:
+                top = np.argpartition(-puntajes, pedir - 1, axis=1)[:, :pedir]
+                puntajes = np.take_along_axis(puntajes, top, axis=1)
+                todas = np.take_along_axis(todas, top, axis=1)
+            mejores_puntajes, mejores_filas = puntajes, todas
+
+        resultados = []
+        for puntajes, filas in zip(mejores_puntajes, mejores_filas):
+            orden = np.argsort(-puntajes)
+            lista, vistos = [], set()
+            for puntaje, fila in zip(puntajes[orden], filas[orden]):
+                if not np.isfinite(puntaje):
+                    break
+                meta = metadatos[fila]
+                if agrupar_por:
+                    grupo = meta.get(agrupar_por, ids[fila])
+                    if grupo in vistos:
+                        continue
+                    vistos.add(grupo)
+                lista.append((ids[fila], float(puntaje), meta))
+                if len(lista) >= k:
+                    break
+            resultados.append(lista)
+        return resultados[0] if una_sola else resultados
+
+    # ------------------------------------------------------------------
+    # Carga desde documentos
+    # ------------------------------------------------------------------
+
+    def indexar_documentos(self, documentos: Iterable[Dict],
+                           vectorizador: Callable[[List[str]], List[List[float]]],
+                           obtener_id: Callable[[Dict], str], campos_metadatos: List[str] = None,
+                           tam_lote: int = 64, max_caracteres: int = 1500, solapamiento: int = 200,
+                           trabajo=None) -> Dict:
+        """
+        Vectoriza los pasajes de cada documento (Funciones.dividir_en_fragmentos)
+        en lotes de tam_lote y los anexa con id '<id>-<número>' y metadatos
+        'id_padre', 'numero' y campos_metadatos. Los documentos que ya tienen
+        vectores se omiten, así que volver a recorrer la carpeta solo procesa
+        lo nuevo.
+
+        Args:
+            documentos: Iterable de documentos con 'texto_completo'
+            vectorizador: Función textos -> embeddings (p. ej. PLN.generar_embeddings)
+            obtener_id: _id de cada documento (p. ej. ElasticSearch.id_estable)
+            campos_metadatos: Campos del documento copiados a cada pasaje
+            tam_lote: Pasajes por llamada al vectorizador
+            trabajo: Trabajo de GestorTrabajos opcional para reportar progreso y cancelar
+
+        Returns:
+            Dict con 'documentos', 'pasajes' y 'sin_cambios'
+        """
+        campos_metadatos = campos_metadatos or ['nombre_archivo', 'ruta', 'titulo', 'url']
+        conteo = {'documentos': 0, 'pasajes': 0, 'sin_cambios': 0}
+        lote_ids, lote_textos, lote_meta = [], [], []
+
+        def vaciar():
+            if lote_ids:
+                self.agregar(lote_ids, vectorizador(lote_textos), lote_meta)
+                conteo['pasajes'] += len(lote_ids)
+                lote_ids.clear()
+                lote_textos.clear()
+                lote_meta.clear()
+
+        for documento in documentos:
+            texto = documento.get('texto_completo')
+            if not texto:
+                continue
+            id_padre = obtener_id(documento)
+            pasajes = Funciones.dividir_en_fragmentos(texto, max_caracteres, solapamiento)
+            # Se mira el último pasaje: un documento interrumpido a medias se vuelve a procesar
+            if self.contiene(f"{id_padre}-{len(pasajes):05d}"):
+                conteo['sin_cambios'] += 1
+            else:
+                base = {c: documento[c] for c in campos_metadatos if documento.get(c)}
+                for numero, pasaje in enumerate(pasajes, 1):
+                    lote_ids.append(f"{id_padre}-{numero:05d}")
+                    lote_textos.append(pasaje)
+                    lote_meta.append({**base, 'id_padre': id_padre, 'numero': numero})
+                    if len(lote_ids) >= tam_lote:
+                        vaciar()
+                conteo['documentos'] += 1
+            if trabajo:
+                trabajo.avanzar('vectorizacion')
+        vaciar()
+        return conteo
+
+    def estadisticas(self) -> Dict:
+        """Filas, vigentes, tipo, listas IVF y tamaño en disco"""
+        with self._lock:
+            bytes_fila = (self.dims or 0) * np.dtype(self.TIPOS[self.tipo]).itemsize
+            return {
+                'vigentes': len(self._fila_de),
+                'filas': self.filas,
+                'borradas': self.filas - len(self._fila_de),
+                'dims': self.dims,
+                'tipo': self.tipo,
+                'num_listas': self.num_listas,
+                'version': self.version,
+                'mb_vectores': round(self.filas * bytes_fila / 1048576, 2)
+            }
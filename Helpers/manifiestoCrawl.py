@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+
+class ManifiestoCrawl:
+    """Registro persistente de lo descargado por URL (ETag, Last-Modified, tamaño y hash)"""
+
+    def __init__(self, ruta_json: str = "cache/manifiesto_crawl.json"):
+        self.ruta_json = ruta_json
+        self._lock = threading.Lock()
+        self.entradas: Dict[str, Dict] = self._cargar()
+
+    def _cargar(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.ruta_json):
+            return {}
+        try:
+            with open(self.ruta_json, "r", encoding="utf-8") as f:
+                return json.load(f).get("urls", {})
+        except Exception as e:
+            print(f"Error al leer manifiesto de crawl: {e}")
+            return {}
+
+    def guardar(self) -> bool:
+        """Escribe el manifiesto de forma atómica (archivo temporal + reemplazo)"""
+        try:
+            carpeta = os.path.dirname(self.ruta_json)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            with self._lock:
+                datos = {"actualizado": datetime.now().isoformat(), "urls": dict(self.entradas)}
+            temporal = f"{self.ruta_json}.tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                json.dump(datos, f, indent=2, ensure_ascii=False)
+            os.replace(temporal, self.ruta_json)
+            return True
+        except Exception as e:
+            print(f"Error al guardar manifiesto de crawl: {e}")
+            return False
+
+    def obtener(self, url: str) -> Optional[Dict]:
+        with self._lock:
+            return self.entradas.get(url)
+
+    def archivos(self) -> Dict[str, str]:
+        """Archivo local registrado para cada URL"""
+        with self._lock:
+            return {url: entrada["archivo"] for url, entrada in self.entradas.items() if entrada.get("archivo")}
+
+    def cabeceras_condicionales(self, url: str) -> Dict[str, str]:
+        """
+        Cabeceras If-None-Match / If-Modified-Since para una URL ya descargada.
+        Solo se envían si el archivo local sigue existiendo; si no, hay que
+        descargarlo de nuevo aunque el servidor no lo haya cambiado.
+        """
+        entrada = self.obtener(url)
+        if not entrada or not entrada.get("archivo") or not os.path.exists(entrada["archivo"]):
+            return {}
+        cabeceras = {}
+        if entrada.get("etag"):
+            cabeceras["If-None-Match"] = entrada["etag"]
+        if entrada.get("last_modified"):
+            cabeceras["If-Modified-Since"] = entrada["last_modified"]
+        return cabeceras
+
+    def registrar(self, url: str, archivo: str, hash_archivo: str, tamaño: int,
+                  etag: str = None, last_modified: str = None) -> bool:
+        """
+        Registra una descarga
+
+        Returns:
+            True si el contenido es nuevo o cambió respecto a lo registrado
+        """
+        with self._lock:
+            anterior = self.entradas.get(url)
+            self.entradas[url] = {
+                "archivo": archivo,
+                "hash": hash_archivo,
+                "tamaño": tamaño,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fecha": datetime.now().isoformat()
+            }
+        return not anterior or anterior.get("hash") != hash_archivo
+
+    def marcar_verificado(self, url: str):
+        """Actualiza la fecha de una URL que respondió 304 Not Modified"""
+        with self._lock:
+            if url in self.entradas:
+                self.entradas[url]["fecha"] = datetime.now().isoformat()
@@ -0,0 +1,325 @@
+import os
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List
+from Helpers.extraccionParalela import ExtraccionParalela
+from Helpers.trabajos import TrabajoCancelado
+
+
+class _PipelineDetenido(Exception):
+    """Una etapa posterior falló o terminó: las anteriores dejan de producir"""
+
+
+class PipelineIngesta:
+    """
+    Crawl -> descarga -> extracción -> indexación solapados. Cada PDF descubierto
+    pasa a descargarse mientras el crawl continúa, cada descarga nueva pasa a
+    extraerse y cada documento extraído entra al bulk. Las etapas se comunican
+    por colas acotadas: si una etapa se atrasa, la anterior se bloquea en vez de
+    acumular trabajo en memoria, y el tiempo total lo marca la etapa más lenta.
+    """
+
+    def __init__(self, scraper, elastic, index: str, carpeta_destino: str = "static/uploads",
+                 manifiesto=None, tipos_archivos: List[str] = None, tam_cola: int = 16,
+                 procesos_extraccion: int = None, max_tareas_por_hijo: int = 20,
+                 hilos_bulk: int = 1, max_mb_por_lote: float = 10, fragmentos: bool = False,
+                 min_caracteres: int = 50, deduplicador=None, op_type: str = "index",
+                 estrategia_id: str = "contenido", took_objetivo_ms: int = 1000,
+                 carga_masiva_desde: int = None, force_merge: bool = False, vectorizador=None,
+                 buscador_local=None):
+        """
+        Args:
+            scraper: WebScraping ya configurado (concurrencia del crawl y descargas_simultaneas)
+            elastic: Cliente ElasticSearch
+            index: Índice de destino
+            carpeta_destino: Carpeta de descarga
+            manifiesto: ManifiestoCrawl opcional para descargas incrementales
+            tipos_archivos: Tipos de enlace que se descargan (por defecto ['pdf'])
+            tam_cola: Capacidad de cada cola entre etapas
+            procesos_extraccion: Procesos del pool de extracción
+            max_tareas_por_hijo: Archivos por proceso hijo antes de reciclarlo
+            hilos_bulk: Peticiones bulk concurrentes como máximo
+            max_mb_por_lote: Tamaño máximo de cada petición bulk
+            took_objetivo_ms: 'took' por lote buscado por el ajuste del bulk
+            fragmentos: Indexar también los fragmentos de cada documento
+            min_caracteres: Longitud mínima del texto para indexar un documento
+            deduplicador: DetectorDuplicados opcional aplicado entre extracción e indexación
+            op_type: Operación bulk ('index', 'create' o 'update')
+            estrategia_id: _id estable por 'contenido' o por 'url' (ElasticSearch.id_estable)
+            carga_masiva_desde: Documentos a partir de los cuales el índice pasa a
+                                modo carga masiva (ElasticSearch.modo_carga_masiva)
+            force_merge: Fusionar segmentos al terminar la carga masiva
+            vectorizador: Función textos -> embeddings para guardar el vector de cada
+                          documento y pasaje (ElasticSearch.indexar_streaming)
+            buscador_local: BuscadorLocal opcional que indexa también lo que va a Elastic
+        """
+        self.scraper = scraper
+        self.elastic = elastic
+        self.index = index
+        self.carpeta_destino = carpeta_destino
+        self.manifiesto = manifiesto
+        self.tipos_archivos = [t.lower() for t in (tipos_archivos or ['pdf'])]
+        self.tam_cola = tam_cola
+        self.motor = ExtraccionParalela(num_procesos=procesos_extraccion,
+                                        max_tareas_por_hijo=max_tareas_por_hijo)
+        self.hilos_bulk = hilos_bulk
+        self.max_mb_por_lote = max_mb_por_lote
+        self.took_objetivo_ms = took_objetivo_ms
+        self.carga_masiva_desde = carga_masiva_desde
+        self.force_merge = force_merge
+        self.vectorizador = vectorizador
+        self.fragmentos = fragmentos
+        self.min_caracteres = min_caracteres
+        self.deduplicador = deduplicador
+        self.buscador_local = buscador_local
+        self.op_type = op_type
+        self.estrategia_id = estrategia_id
+
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._errores_etapa: List[BaseException] = []
+        self.stats = {}
+
+    # ------------------------------------------------------------------
+    # Utilidades de las colas
+    # ------------------------------------------------------------------
+
+    def _poner(self, cola: queue.Queue, elemento):
+        """put() bloqueante que se interrumpe si el pipeline se detiene"""
+        while True:
+            try:
+                cola.put(elemento, timeout=0.5)
+                return
+            except queue.Full:
+                if self._detener.is_set():
+                    raise _PipelineDetenido()
+
+    def _sumar(self, clave: str, cantidad: int = 1):
+        with self._lock:
+            self.stats[clave] = self.stats.get(clave, 0) + cantidad
+
+    def _fallo(self, error: BaseException):
+        """Registra el error de una etapa y detiene el resto del pipeline"""
+        if not isinstance(error, _PipelineDetenido):
+            with self._lock:
+                self._errores_etapa.append(error)
+        self._detener.set()
+
+    # ------------------------------------------------------------------
+    # Etapas
+    # ------------------------------------------------------------------
+
+    def _etapa_crawl(self, url_inicial: str, json_file_path: str, listado_extensiones: List[str],
+                     max_iteraciones: int, reanudar: bool, cola_descargas: queue.Queue,
+                     hilos_descarga: int, trabajo):
+        try:
+            def al_descubrir(link: Dict):
+                if self._detener.is_set():
+                    raise _PipelineDetenido()
+                if link.get('type', '').lower() in self.tipos_archivos:
+                    self._sumar('enlaces_archivo')
+                    self._poner(cola_descargas, link)
+
+            resultado = self.scraper.extraer_todos_los_links(
+                url_inicial=url_inicial,
+                json_file_path=json_file_path,
+                listado_extensiones=listado_extensiones,
+                max_iteraciones=max_iteraciones,
+                reanudar=reanudar,
+                trabajo=trabajo,
+                al_descubrir=al_descubrir
+            )
+            with self._lock:
+                self.stats['total_enlaces'] = resultado.get('total_links', 0)
+                self.stats['paginas'] = resultado.get('iteraciones', 0)
+        except BaseException as e:
+            self._fallo(e)
+        finally:
+            if trabajo:
+                trabajo.terminar_etapa('crawl')
+            # Un fin por cada hilo de descarga (sin bloquear si el pipeline ya se detuvo)
+            for _ in range(hilos_descarga):
+                try:
+                    self._poner(cola_descargas, None)
+                except _PipelineDetenido:
+                    break
+
+    def _etapa_descarga(self, cola_descargas: queue.Queue, cola_extraccion: queue.Queue,
+                        activos: List[int], trabajo):
+        try:
+            while not self._detener.is_set():
+                try:
+                    link = cola_descargas.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if link is None:
+                    break
+
+                # Los enlaces llegan mientras se rastrea, así que no se sabe qué
+                # nombres se repetirán: las URLs nuevas siempre llevan el sufijo
+                # de su sha1 y las conocidas conservan el archivo del manifiesto
+                nombre = (self.scraper._nombre_registrado(link['url'], self.manifiesto)
+                          or self.scraper._nombre_archivo(link['url'], unico=True))
+                ruta = os.path.join(self.carpeta_destino, nombre)
+
+                try:
+                    descarga = self.scraper.descargar_enlace(link, ruta, self.manifiesto, trabajo)
+                except TrabajoCancelado:
+                    raise
+                except Exception as e:
+                    self._sumar('errores_descarga')
+                    if trabajo:
+                        trabajo.avanzar('descarga', errores=1, detalle_error=f"{link['url']}: {e}")
+                    continue
+
+                self._sumar('bytes', descarga['bytes'])
+                self._sumar('descargados', int(descarga['descargado']))
+                if trabajo:
+                    trabajo.avanzar('descarga', bytes_procesados=descarga['bytes'])
+
+                if descarga['archivo']:
+                    self._sumar('nuevos')
+                    self._poner(cola_extraccion, descarga['archivo'])
+                else:
+                    self._sumar('sin_cambios')
+        except BaseException as e:
+            self._fallo(e)
+        finally:
+            # El último hilo de descarga en terminar cierra la cola de extracción
+            with self._lock:
+                activos[0] -= 1
+                ultimo = activos[0] == 0
+            if ultimo:
+                if trabajo:
+                    trabajo.terminar_etapa('descarga')
+                try:
+                    self._poner(cola_extraccion, None)
+                except _PipelineDetenido:
+                    pass
+
+    def _archivos_descargados(self, cola_extraccion: queue.Queue) -> Iterator[Dict]:
+        """Fuente de la extracción: archivos nuevos a medida que terminan de descargarse"""
+        while not self._detener.is_set():
+            try:
+                archivo = cola_extraccion.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            if archivo is None:
+                return
+            yield archivo
+
+    def _documentos(self, cola_extraccion: queue.Queue, trabajo) -> Iterator[Dict]:
+        def extraidos():
+            for documento in self.motor.generar_documentos(self._archivos_descargados(cola_extraccion),
+                                                           min_caracteres=self.min_caracteres,
+                                                           flujo=True):
+                if trabajo:
+                    trabajo.avanzar('extraccion')
+                yield documento
+            if trabajo:
+                trabajo.terminar_etapa('extraccion')
+
+        documentos = extraidos()
+        if self.deduplicador is not None:
+            documentos = self.deduplicador.filtrar(self.index, documentos, self.stats)
+        if self.buscador_local is not None:
+            documentos = self.buscador_local.reflejar(self.index, documentos, self.stats)
+        return documentos
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def ejecutar(self, url_inicial: str, json_file_path: str, listado_extensiones: List[str],
+                 max_iteraciones: int = 50, trabajo=None, reanudar: bool = True) -> Dict:
+        """
+        Ejecuta el pipeline completo y espera a que termine
+
+        Args:
+            url_inicial: Página donde empieza el crawl
+            json_file_path: JSON de enlaces (y checkpoint de la frontera junto a él)
+            listado_extensiones: Extensiones a navegar y a descargar
+            max_iteraciones: Páginas máximas a visitar
+            trabajo: Trabajo de GestorTrabajos opcional (progreso por etapa y cancelación)
+            reanudar: Continuar el crawl anterior de la misma url_inicial si quedó incompleto
+
+        Returns:
+            Dict con 'success', estadísticas de cada etapa y duración total
+        """
+        inicio = time.perf_counter()
+        os.makedirs(self.carpeta_destino, exist_ok=True)
+        hilos_descarga = self.scraper.descargas_simultaneas
+
+        cola_descargas = queue.Queue(maxsize=self.tam_cola)
+        cola_extraccion = queue.Queue(maxsize=self.tam_cola)
+
+        if trabajo:
+            for etapa in ('crawl', 'descarga', 'extraccion', 'indexacion'):
+                trabajo.etapa(etapa)
+
+        hilos = [threading.Thread(
+            target=self._etapa_crawl, name='pipeline-crawl', daemon=True,
+            args=(url_inicial, json_file_path, listado_extensiones, max_iteraciones, reanudar,
+                  cola_descargas, hilos_descarga, trabajo))]
+        activos = [hilos_descarga]
+        for i in range(hilos_descarga):
+            hilos.append(threading.Thread(
+                target=self._etapa_descarga, name=f'pipeline-descarga-{i}', daemon=True,
+                args=(cola_descargas, cola_extraccion, activos, trabajo)))
+        for hilo in hilos:
+            hilo.start()
+
+        # Extracción e indexación corren en este hilo: el bulk consume los
+        # documentos a medida que el pool de procesos los entrega
+        resultado = {}
+        try:
+            resultado = self.elastic.indexar_streaming(
+                self.index, self._documentos(cola_extraccion, trabajo),
+                hilos=self.hilos_bulk, max_mb_por_lote=self.max_mb_por_lote,
+                took_objetivo_ms=self.took_objetivo_ms,
+                trabajo=trabajo, fragmentos=self.fragmentos,
+                op_type=self.op_type, estrategia_id=self.estrategia_id,
+                carga_masiva_desde=self.carga_masiva_desde, force_merge=self.force_merge,
+                vectorizador=self.vectorizador)
+        except BaseException as e:
+            self._fallo(e)
+        finally:
+            self._detener.set()
+            for hilo in hilos:
+                hilo.join()
+            if self.manifiesto is not None:
+                self.manifiesto.guardar()
+
+        # Una cancelación se propaga para que el trabajo quede como 'cancelado'
+        for error in self._errores_etapa:
+            if isinstance(error, TrabajoCancelado):
+                raise error
+
+        duracion = time.perf_counter() - inicio
+        errores = [str(e) for e in self._errores_etapa]
+        if not resultado.get('success', False) and resultado.get('error'):
+            errores.append(resultado['error'])
+
+        return {
+            'success': not errores,
+            'error': '; '.join(errores) if errores else None,
+            'total_enlaces': self.stats.get('total_enlaces', 0),
+            'paginas': self.stats.get('paginas', 0),
+            'enlaces_archivo': self.stats.get('enlaces_archivo', 0),
+            'descargados': self.stats.get('descargados', 0),
+            'sin_cambios': self.stats.get('sin_cambios', 0),
+            'errores_descarga': self.stats.get('errores_descarga', 0),
+            'nuevos': self.stats.get('nuevos', 0),
+            'duplicados': self.stats.get('duplicados', 0),
+            'indexados': resultado.get('indexados', 0),
+            'creados': resultado.get('creados', 0),
+            'actualizados': resultado.get('actualizados', 0),
+            'sin_cambios_indice': resultado.get('sin_cambios', 0),
+            'fragmentos': resultado.get('fragmentos', 0),
+            'errores': resultado.get('errores', 0),
+            'mb_descargados': round(self.stats.get('bytes', 0) / 1048576, 2),
+            'bulk': resultado.get('bulk'),
+            'carga_masiva': resultado.get('carga_masiva', False),
+            'duracion': round(duracion, 2)
+        }
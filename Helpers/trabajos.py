@@ -0,0 +1,390 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional
+
+
+TERMINADOS = ('completado', 'error', 'cancelado')
+
+
+class TrabajoCancelado(Exception):
+    """Se lanza dentro de un trabajo cuando se solicitó su cancelación"""
+
+
+class Trabajo:
+    """Estado y progreso de un trabajo de ingesta ejecutado en segundo plano"""
+
+    def __init__(self, tipo: str, parametros: Dict = None):
+        self.id = uuid.uuid4().hex
+        self.tipo = tipo
+        self.parametros = parametros or {}
+        self.estado = 'pendiente'
+        self.etapas = OrderedDict()
+        self.resultado = None
+        self.error = None
+        self.creado = time.time()
+        self.inicio = None
+        self.fin = None
+        self._cancelar = threading.Event()
+        self._lock = threading.Lock()
+        self._futuro = None
+
+    # ------------------------------------------------------------------
+    # API usada por el código del trabajo
+    # ------------------------------------------------------------------
+
+    def etapa(self, nombre: str, total: int = None):
+        """Registra (o reinicia el total de) una etapa: crawl, descarga, extraccion, indexacion..."""
+        with self._lock:
+            if nombre not in self.etapas:
+                self.etapas[nombre] = {
+                    'total': total,
+                    'procesados': 0,
+                    'errores': 0,
+                    'bytes': 0,
+                    'inicio': time.time(),
+                    'fin': None,
+                    'ultimos_errores': []
+                }
+            elif total is not None:
+                self.etapas[nombre]['total'] = total
+
+    def avanzar(self, nombre: str, cantidad: int = 1, errores: int = 0,
+                bytes_procesados: int = 0, detalle_error: str = None):
+        """Suma progreso a una etapa y verifica si el trabajo fue cancelado"""
+        self.etapa(nombre)
+        with self._lock:
+            etapa = self.etapas[nombre]
+            etapa['procesados'] += cantidad
+            etapa['errores'] += errores
+            etapa['bytes'] += bytes_procesados
+            if detalle_error:
+                etapa['ultimos_errores'] = (etapa['ultimos_errores'] + [detalle_error])[-10:]
+        self.verificar_cancelacion()
+
+    def terminar_etapa(self, nombre: str):
+        """Marca una etapa como finalizada"""
+        self.etapa(nombre)
+        with self._lock:
+            self.etapas[nombre]['fin'] = time.time()
+
+    def cancelado(self) -> bool:
+        return self._cancelar.is_set()
+
+    def verificar_cancelacion(self):
+        """Lanza TrabajoCancelado si se pidió cancelar el trabajo"""
+        if self._cancelar.is_set():
+            raise TrabajoCancelado(f"Trabajo {self.id} cancelado")
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    def to_dict(self) -> Dict:
+        """Representación serializable con progreso y throughput por etapa"""
+        ahora = time.time()
+        with self._lock:
+            etapas = {}
+            for nombre, e in self.etapas.items():
+                duracion = (e['fin'] or ahora) - e['inicio']
+                etapas[nombre] = {
+                    'total': e['total'],
+                    'procesados': e['procesados'],
+                    'errores': e['errores'],
+                    'porcentaje': round(100 * e['procesados'] / e['total'], 1) if e['total'] else None,
+                    'por_segundo': round(e['procesados'] / duracion, 2) if duracion > 0 else None,
+                    'mb_por_segundo': round(e['bytes'] / 1048576 / duracion, 2) if duracion > 0 and e['bytes'] else None,
+                    'duracion': round(duracion, 2),
+                    'terminada': e['fin'] is not None,
+                    'ultimos_errores': list(e['ultimos_errores'])
+                }
+
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'estado': self.estado,
+            'parametros': self.parametros,
+            'etapas': etapas,
+            'resultado': self.resultado,
+            'error': self.error,
+            'creado': self.creado,
+            'duracion': round((self.fin or ahora) - self.inicio, 2) if self.inicio else 0
+        }
+
+
+class GestorTrabajos:
+    """
+    Pool local de hilos que ejecuta trabajos de ingesta fuera del ciclo de la petición HTTP.
+
+    Cada trabajo corre en el proceso que lo recibió, pero su estado se publica en
+    un SQLite compartido: con varios workers (gunicorn) cualquiera de ellos puede
+    consultarlo o pedir su cancelación. El proceso dueño publica el progreso y
+    recoge las cancelaciones pendientes cada 'intervalo' segundos.
+    """
+
+    def __init__(self, max_trabajadores: int = 2, max_historial: int = 100,
+                 ruta_db: str = "cache/trabajos.db", intervalo: float = 1.0):
+        """
+        Args:
+            max_trabajadores: Trabajos ejecutándose a la vez; el resto espera en cola
+            max_historial: Trabajos terminados que se conservan para consulta
+            ruta_db: Archivo SQLite compartido por todos los procesos de la aplicación
+            intervalo: Segundos entre publicaciones del progreso de los trabajos en curso
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_trabajadores,
+                                           thread_name_prefix='trabajo')
+        self.max_historial = max_historial
+        self.trabajos = OrderedDict()
+        self._lock = threading.Lock()
+        self.ruta_db = ruta_db
+        self.intervalo = intervalo
+        # Un trabajo sin publicar durante este tiempo pertenecía a un proceso que ya no existe
+        self.max_silencio = max(30.0, 10 * intervalo)
+
+        carpeta = os.path.dirname(ruta_db)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+
+        with self._conexion() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS trabajos (
+                    id TEXT PRIMARY KEY,
+                    estado TEXT NOT NULL,
+                    datos TEXT NOT NULL,
+                    cancelar INTEGER NOT NULL DEFAULT 0,
+                    creado REAL NOT NULL,
+                    actualizado REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_trabajos_creado ON trabajos(creado)")
+
+        self._detener = threading.Event()
+        self._publicador = threading.Thread(target=self._publicar_periodicamente,
+                                            name='trabajos-publicador', daemon=True)
+        self._publicador.start()
+
+    @contextmanager
+    def _conexion(self):
+        """Abre una conexión propia (cada worker usa la suya), confirma y la cierra"""
+        conn = sqlite3.connect(self.ruta_db, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Estado compartido entre procesos
+    # ------------------------------------------------------------------
+
+    def _publicar(self, trabajos: List[Trabajo]):
+        """Guarda el estado actual de los trabajos; un estado final nunca se sobrescribe"""
+        if not trabajos:
+            return
+        ahora = time.time()
+        filas = [(t.id, t.estado, json.dumps(t.to_dict(), ensure_ascii=False, default=str), t.creado, ahora)
+                 for t in trabajos]
+        try:
+            with self._conexion() as conn:
+                conn.executemany("""
+                    INSERT INTO trabajos (id, estado, datos, creado, actualizado)
+                    VALUES (?, ?, ?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        estado = excluded.estado,
+                        datos = excluded.datos,
+                        actualizado = excluded.actualizado
+                    WHERE trabajos.estado NOT IN ('completado', 'error', 'cancelado')
+                """, filas)
+        except Exception as e:
+            print(f"Error al publicar el estado de los trabajos: {e}")
+
+    def _sincronizar(self):
+        """Publica el progreso de los trabajos locales activos y aplica las cancelaciones pedidas desde otro proceso"""
+        with self._lock:
+            activos = [t for t in self.trabajos.values() if t.estado not in TERMINADOS]
+        if not activos:
+            return
+        try:
+            with self._conexion() as conn:
+                marcas = ', '.join('?' * len(activos))
+                cancelados = {fila[0] for fila in conn.execute(
+                    f"SELECT id FROM trabajos WHERE cancelar = 1 AND id IN ({marcas})",
+                    [t.id for t in activos])}
+        except Exception as e:
+            print(f"Error al leer cancelaciones de trabajos: {e}")
+            cancelados = set()
+        for trabajo in activos:
+            if trabajo.id in cancelados:
+                self._solicitar_cancelacion(trabajo)
+        self._publicar(activos)
+
+    def _publicar_periodicamente(self):
+        while not self._detener.wait(self.intervalo):
+            self._sincronizar()
+
+    def _vigente(self, datos: Dict, actualizado: float) -> Dict:
+        """Marca como error un trabajo activo cuyo proceso dejó de publicar (reinicio o caída del worker)"""
+        if datos.get('estado') not in TERMINADOS and time.time() - actualizado > self.max_silencio:
+            datos['estado'] = 'error'
+            datos['error'] = 'El proceso que ejecutaba el trabajo se detuvo antes de terminarlo'
+        return datos
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def enviar(self, tipo: str, funcion: Callable, *args, parametros: Dict = None, **kwargs) -> Trabajo:
+        """
+        Encola un trabajo y retorna de inmediato
+
+        Args:
+            tipo: Nombre del tipo de trabajo (p. ej. 'webscraping')
+            funcion: Función a ejecutar; recibe el Trabajo como argumento 'trabajo'
+            parametros: Datos descriptivos mostrados en el estado del trabajo
+
+        Returns:
+            Trabajo creado (su id sirve para consultar el estado)
+        """
+        trabajo = Trabajo(tipo, parametros)
+        with self._lock:
+            self.trabajos[trabajo.id] = trabajo
+            self._purgar()
+        # Visible para los demás workers antes de que la respuesta con su id llegue al cliente
+        self._publicar([trabajo])
+        trabajo._futuro = self.executor.submit(self._ejecutar, trabajo, funcion, args, kwargs)
+        return trabajo
+
+    def _ejecutar(self, trabajo: Trabajo, funcion: Callable, args, kwargs):
+        if trabajo.cancelado():
+            trabajo.estado = 'cancelado'
+            self._publicar([trabajo])
+            return
+        trabajo.estado = 'en_curso'
+        trabajo.inicio = time.time()
+        try:
+            trabajo.resultado = funcion(*args, trabajo=trabajo, **kwargs)
+            trabajo.estado = 'completado'
+        except TrabajoCancelado:
+            trabajo.estado = 'cancelado'
+        except Exception as e:
+            trabajo.estado = 'error'
+            trabajo.error = str(e)
+            print(f"Error en trabajo {trabajo.id} ({trabajo.tipo}): {e}")
+            traceback.print_exc()
+        finally:
+            trabajo.fin = time.time()
+            for nombre in list(trabajo.etapas):
+                if trabajo.etapas[nombre]['fin'] is None:
+                    trabajo.terminar_etapa(nombre)
+            self._publicar([trabajo])
+
+    def _purgar(self):
+        """Descarta los trabajos terminados más antiguos por encima de max_historial"""
+        terminados = [t for t in self.trabajos.values() if t.estado in TERMINADOS]
+        for trabajo in terminados[:max(0, len(terminados) - self.max_historial)]:
+            del self.trabajos[trabajo.id]
+        try:
+            with self._conexion() as conn:
+                conn.execute("""
+                    DELETE FROM trabajos WHERE id IN (
+                        SELECT id FROM trabajos WHERE estado IN ('completado', 'error', 'cancelado')
+                        ORDER BY creado DESC LIMIT -1 OFFSET ?
+                    )
+                """, (self.max_historial,))
+        except Exception as e:
+            print(f"Error al purgar el historial de trabajos: {e}")
+
+    # ------------------------------------------------------------------
+    # Consulta y cancelación (desde cualquier proceso)
+    # ------------------------------------------------------------------
+
+    def obtener(self, trabajo_id: str) -> Optional[Trabajo]:
+        """Trabajo ejecutado por este proceso, o None"""
+        return self.trabajos.get(trabajo_id)
+
+    def estado(self, trabajo_id: str) -> Optional[Dict]:
+        """
+        Estado de un trabajo, lo ejecute este proceso u otro worker
+
+        Returns:
+            Dict como Trabajo.to_dict(), o None si el trabajo no existe
+        """
+        trabajo = self.obtener(trabajo_id)
+        if trabajo:
+            return trabajo.to_dict()
+        try:
+            with self._conexion() as conn:
+                fila = conn.execute("SELECT datos, actualizado FROM trabajos WHERE id = ?",
+                                    (trabajo_id,)).fetchone()
+        except Exception as e:
+            print(f"Error al leer el estado del trabajo {trabajo_id}: {e}")
+            return None
+        if not fila:
+            return None
+        return self._vigente(json.loads(fila[0]), fila[1])
+
+    def listar(self) -> List[Dict]:
+        """Lista los trabajos de todos los workers, del más reciente al más antiguo"""
+        with self._lock:
+            locales = {t.id: t.to_dict() for t in self.trabajos.values()}
+        try:
+            with self._conexion() as conn:
+                filas = conn.execute("SELECT id, datos, actualizado FROM trabajos").fetchall()
+        except Exception as e:
+            print(f"Error al listar trabajos: {e}")
+            filas = []
+        todos = dict(locales)
+        for trabajo_id, datos, actualizado in filas:
+            if trabajo_id not in todos:
+                todos[trabajo_id] = self._vigente(json.loads(datos), actualizado)
+        return sorted(todos.values(), key=lambda t: t['creado'], reverse=True)
+
+    def _solicitar_cancelacion(self, trabajo: Trabajo):
+        trabajo._cancelar.set()
+        if trabajo._futuro and trabajo._futuro.cancel():
+            trabajo.estado = 'cancelado'
+            trabajo.fin = time.time()
+            self._publicar([trabajo])
+
+    def cancelar(self, trabajo_id: str) -> bool:
+        """
+        Solicita la cancelación de un trabajo. Si aún está en cola no llega a
+        ejecutarse; si está en curso se detiene en su siguiente punto de control.
+        Un trabajo de otro worker se cancela en su siguiente sincronización.
+        """
+        trabajo = self.obtener(trabajo_id)
+        if trabajo:
+            if trabajo.estado in TERMINADOS:
+                return False
+            self._solicitar_cancelacion(trabajo)
+            return True
+        try:
+            with self._conexion() as conn:
+                cursor = conn.execute(
+                    "UPDATE trabajos SET cancelar = 1 WHERE id = ? AND estado NOT IN ('completado', 'error', 'cancelado')",
+                    (trabajo_id,))
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"Error al cancelar el trabajo {trabajo_id}: {e}")
+            return False
+
+    def close(self):
+        """Cancela los trabajos en cola y espera a que terminen los que están en curso"""
+        self._detener.set()
+        for trabajo in list(self.trabajos.values()):
+            trabajo._cancelar.set()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+        # Los que seguían en cola ya no se ejecutarán en ningún proceso
+        pendientes = [t for t in self.trabajos.values() if t.estado == 'pendiente']
+        for trabajo in pendientes:
+            trabajo.estado = 'cancelado'
+            trabajo.fin = time.time()
+        self._publicar(pendientes)
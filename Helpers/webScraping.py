@@ -1,17 +1,89 @@
 import requests
-from bs4 import BeautifulSoup
-from urllib.parse import urljoin, urlparse
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import lxml.html
+from urllib.parse import urljoin, urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import json
 import os
-from typing import List, Dict
+import hashlib
+import re
+import threading
+import time
+from typing import Callable, List, Dict, Optional
 from Helpers import Funciones
+from Helpers.fronteraURL import FronteraURL
+from Helpers.trabajos import TrabajoCancelado
+
+
+class LimitadorTasa:
+    """Token bucket por host: como máximo 'tasa' peticiones por segundo con ráfagas de 'rafaga'"""
+
+    def __init__(self, tasa: float = 4.0, rafaga: int = 4):
+        self.tasa = tasa
+        self.rafaga = max(1, rafaga)
+        self._cubetas: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def esperar(self, url: str):
+        """Bloquea hasta que haya un token disponible para el host de la URL"""
+        if not self.tasa or self.tasa <= 0:
+            return
+        host = urlparse(url).netloc
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                tokens, ultimo = self._cubetas.get(host, (self.rafaga, ahora))
+                tokens = min(self.rafaga, tokens + (ahora - ultimo) * self.tasa)
+                if tokens >= 1:
+                    self._cubetas[host] = (tokens - 1, ahora)
+                    return
+                self._cubetas[host] = (tokens, ahora)
+                espera = (1 - tokens) / self.tasa
+            time.sleep(espera)
 
 
 class WebScraping:
     """Clase para realizar web scraping y extracción de enlaces"""
 
-    def __init__(self, dominio_base: str = "https://www.minsalud.gov.co"):
+    # Contenedor del contenido principal en las páginas de minsalud.gov.co
+    XPATH_CONTENEDOR = "//div[contains(concat(' ', normalize-space(@class), ' '), ' containerblanco ')]"
+
+    # Cadenas entre comillas dentro de onclick / <script>: candidatos a URL
+    PATRON_CADENA = re.compile(r"""["']([^"'\s<>]{5,}?)["']""")
+    PATRON_ID_DRIVE = re.compile(r"/d/([\w-]{10,})")
+
+    def __init__(self, dominio_base: str = "https://www.minsalud.gov.co",
+                 concurrencia: int = 4, peticiones_por_segundo: float = 4.0,
+                 reintentos: int = 3, descargas_simultaneas: int = 4,
+                 xpath_contenedor: str = XPATH_CONTENEDOR,
+                 permitir_archivos_externos: bool = True,
+                 usar_navegador: bool = False):
+        """
+        Args:
+            dominio_base: Dominio al que se restringe el crawl
+            xpath_contenedor: Región de la página donde se buscan enlaces (None = toda la página)
+            permitir_archivos_externos: Aceptar PDFs alojados fuera del dominio
+                                        (Google Drive, CDNs); las páginas siempre
+                                        se limitan al dominio base
+            usar_navegador: Renderizar con Chrome headless (Selenium) las páginas
+                            que solo muestran contenido con JavaScript
+            concurrencia: Páginas HTML descargadas en paralelo durante el crawl
+            descargas_simultaneas: Archivos (PDF) transferidos en paralelo
+            peticiones_por_segundo: Límite por host (token bucket); 0 desactiva el límite
+            reintentos: Reintentos con backoff exponencial ante errores de conexión,
+                        429 y 5xx (respeta Retry-After)
+        """
         self.dominio_base = dominio_base
+        self.xpath_contenedor = xpath_contenedor
+        self.permitir_archivos_externos = permitir_archivos_externos
+        self.usar_navegador = usar_navegador
+        self._navegador = None
+        self._lock_navegador = threading.Lock()
+        self.paginas_renderizadas = 0
+        self.concurrencia = max(1, concurrencia)
+        self.descargas_simultaneas = max(1, descargas_simultaneas)
+        self.limitador = LimitadorTasa(peticiones_por_segundo, rafaga=self.concurrencia)
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': (
@@ -21,53 +93,50 @@ class WebScraping:
             )
         })
 
+        # Un pool de conexiones compartido por todos los hilos, con una conexión por
+        # hilo: si fuera menor, urllib3 descartaría conexiones y abriría otras nuevas.
+        # Crawl y descargas pueden correr a la vez (PipelineIngesta)
+        tam_pool = self.concurrencia + self.descargas_simultaneas
+        reintento = Retry(total=reintentos, backoff_factor=0.5,
+                          status_forcelist=[429, 500, 502, 503, 504],
+                          allowed_methods=["GET", "HEAD"],
+                          respect_retry_after_header=True,
+                          raise_on_status=False)
+        adaptador = HTTPAdapter(pool_connections=tam_pool,
+                                pool_maxsize=tam_pool, max_retries=reintento)
+        self.session.mount('http://', adaptador)
+        self.session.mount('https://', adaptador)
+
+    def _get(self, url: str, **kwargs) -> requests.Response:
+        """GET a través de la sesión compartida respetando el límite de tasa por host"""
+        self.limitador.esperar(url)
+        return self.session.get(url, **kwargs)
+
     # ============================================================
     #               EXTRAER LINKS (LIMPIO Y FUNCIONAL)
     # ============================================================
     def extract_links(self, url: str, listado_extensiones: List[str] = None) -> List[Dict]:
-        """Extrae links validos del dominio base"""
+        """
+        Extrae links validos del dominio base: href de <a>, src de <iframe>/<embed>,
+        data de <object> y URLs de PDF o Google Drive dentro de onclick y <script>.
+        Solo si la página parece depender de JavaScript (y usar_navegador está
+        activo) se renderiza con un navegador real.
+        """
         if listado_extensiones is None:
             listado_extensiones = ['pdf', 'aspx']
 
         try:
-            response = self.session.get(url, timeout=30)
+            response = self._get(url, timeout=30)
             response.raise_for_status()
 
-            soup = BeautifulSoup(response.content, 'lxml')
-            container_div = soup.find('div', class_='containerblanco')
-
-            links = []
-            if not container_div:
-                return links  # Si no hay contenido, no hay pelea
-
-            dominio_objetivo = urlparse(self.dominio_base).netloc
-
-            for a in container_div.find_all('a'):
-                href = a.get('href')
-                if not href:
-                    continue
-
-                full_url = urljoin(url, href)
-                parsed = urlparse(full_url)
-
-                # Solo permitir mismo dominio
-                if parsed.netloc != dominio_objetivo:
-                    continue
+            documento = lxml.html.fromstring(response.content)
+            links = self._extraer_links_documento(documento, url, listado_extensiones)
 
-                url_sin_params = full_url.split('?')[0].lower()
-
-                for ext in listado_extensiones:
-                    ext = ext.lower()
-
-                    # Detectar PDFs robustamente
-                    if ext == "pdf":
-                        if url_sin_params.endswith(".pdf"):
-                            links.append({"url": full_url, "type": "pdf"})
-                            break
-                    else:
-                        if url_sin_params.endswith(f".{ext}"):
-                            links.append({"url": full_url, "type": ext})
-                            break
+            if not links and self.usar_navegador and self._necesita_javascript(documento):
+                html = self._renderizar_con_navegador(url)
+                if html:
+                    documento = lxml.html.fromstring(html)
+                    links = self._extraer_links_documento(documento, url, listado_extensiones)
 
             return links
 
@@ -75,54 +144,252 @@ class WebScraping:
             print(f"Error procesando {url}: {e}")
             return []
 
+    def _extraer_links_documento(self, documento, url: str, listado_extensiones: List[str]) -> List[Dict]:
+        """Recorre el contenedor de un documento lxml y clasifica las URLs candidatas"""
+        if self.xpath_contenedor:
+            contenedores = documento.xpath(self.xpath_contenedor)
+            if not contenedores:
+                return []  # Si no hay contenido, no hay pelea
+            contenedor = contenedores[0]
+        else:
+            contenedor = documento
+
+        candidatos = contenedor.xpath('.//a/@href | .//iframe/@src | .//embed/@src | .//object/@data')
+
+        # Enlaces armados en JavaScript (window.open('...pdf'), visores, etc.)
+        for codigo in contenedor.xpath('.//@onclick | .//script/text()'):
+            for cadena in self.PATRON_CADENA.findall(codigo):
+                minuscula = cadena.lower()
+                if '.pdf' in minuscula or 'drive.google.com' in minuscula or 'docs.google.com' in minuscula:
+                    candidatos.append(cadena)
+
+        links = []
+        vistos = set()
+        for href in candidatos:
+            href = href.strip()
+            if not href or href.startswith(('#', 'mailto:', 'javascript:', 'tel:')):
+                continue
+            link = self._clasificar_enlace(urljoin(url, href), listado_extensiones)
+            if link and link['url'] not in vistos:
+                vistos.add(link['url'])
+                links.append(link)
+        return links
+
+    def _clasificar_enlace(self, full_url: str, listado_extensiones: List[str]):
+        """
+        Retorna {'url', 'type'} si la URL es de interés o None. Los enlaces de
+        Google Drive / Docs y los visores de Google se convierten a descarga directa.
+        """
+        directa = self.url_descarga_directa(full_url)
+        if directa:
+            if 'pdf' in listado_extensiones and self.permitir_archivos_externos:
+                return {"url": directa, "type": "pdf"}
+            return None
+
+        parsed = urlparse(full_url)
+        if parsed.scheme not in ('http', 'https'):
+            return None
+        mismo_dominio = parsed.netloc == urlparse(self.dominio_base).netloc
+        url_sin_params = full_url.split('?')[0].split('#')[0].lower()
+
+        for ext in listado_extensiones:
+            ext = ext.lower()
+            if not url_sin_params.endswith(f".{ext}"):
+                continue
+            # Solo permitir mismo dominio (los PDFs externos, si se habilitan)
+            if mismo_dominio or (ext == "pdf" and self.permitir_archivos_externos):
+                return {"url": full_url, "type": ext}
+            return None
+        return None
+
+    @classmethod
+    def url_descarga_directa(cls, url: str):
+        """
+        Convierte enlaces de Google Drive / Docs y del visor de Google a una URL que
+        descarga el archivo. Retorna None si la URL no es de esos servicios.
+        """
+        parsed = urlparse(url)
+        host = parsed.netloc.lower()
+        query = parse_qs(parsed.query)
+
+        if host == 'docs.google.com' and parsed.path.startswith(('/viewer', '/gview')) and query.get('url'):
+            return query['url'][0]
+
+        if host == 'drive.google.com':
+            coincidencia = cls.PATRON_ID_DRIVE.search(parsed.path)
+            id_archivo = coincidencia.group(1) if coincidencia else (query.get('id') or [None])[0]
+            if id_archivo:
+                return f"https://drive.google.com/uc?export=download&id={id_archivo}"
+            return None
+
+        if host == 'docs.google.com':
+            coincidencia = cls.PATRON_ID_DRIVE.search(parsed.path)
+            if coincidencia and parsed.path.startswith('/document/'):
+                return f"https://docs.google.com/document/d/{coincidencia.group(1)}/export?format=pdf"
+        return None
+
+    @staticmethod
+    def _necesita_javascript(documento) -> bool:
+        """
+        Heurística para páginas que arman su contenido en el navegador: punto de
+        montaje vacío de un framework, aviso en <noscript> o casi nada de texto
+        visible a pesar de tener scripts.
+        """
+        if documento.xpath("//*[@id='root' or @id='app' or @id='__next' or @id='__nuxt'][not(*)]"):
+            return True
+        for aviso in documento.xpath('//noscript//text()'):
+            if 'javascript' in aviso.lower():
+                return True
+        visible = documento.xpath('//body//text()[not(ancestor::script) and not(ancestor::style)'
+                                  ' and not(ancestor::noscript)]')
+        longitud = len(' '.join(' '.join(visible).split()))
+        return longitud < 200 and bool(documento.xpath('//script'))
+
+    def _renderizar_con_navegador(self, url: str, max_scrolls: int = 10):
+        """
+        Renderiza una página con Chrome headless y retorna el HTML resultante.
+        Se usa un único navegador compartido (Selenium no es seguro entre hilos)
+        que se crea la primera vez que se necesita.
+        """
+        with self._lock_navegador:
+            if self._navegador is None:
+                try:
+                    from selenium import webdriver
+                    from selenium.webdriver.chrome.options import Options
+                except ImportError:
+                    print("Selenium no está instalado: no se renderizan páginas con JavaScript")
+                    self.usar_navegador = False
+                    return None
+
+                opciones = Options()
+                for argumento in ("--headless=new", "--no-sandbox", "--disable-dev-shm-usage",
+                                  "--disable-gpu", "--window-size=1920,1080"):
+                    opciones.add_argument(argumento)
+                opciones.add_argument(f"user-agent={self.session.headers['User-Agent']}")
+                try:
+                    self._navegador = webdriver.Chrome(options=opciones)
+                    self._navegador.set_page_load_timeout(40)
+                except Exception as e:
+                    print(f"No se pudo iniciar el navegador: {e}")
+                    self.usar_navegador = False
+                    return None
+
+            try:
+                self.limitador.esperar(url)
+                # get() espera el evento load; luego se hace scroll hasta que la
+                # altura deja de crecer (contenido cargado de forma diferida)
+                self._navegador.get(url)
+                altura = self._navegador.execute_script("return document.body.scrollHeight")
+                for _ in range(max_scrolls):
+                    self._navegador.execute_script("window.scrollTo(0, document.body.scrollHeight)")
+                    time.sleep(0.5)
+                    nueva = self._navegador.execute_script("return document.body.scrollHeight")
+                    if nueva == altura:
+                        break
+                    altura = nueva
+                self.paginas_renderizadas += 1
+                return self._navegador.page_source
+            except Exception as e:
+                print(f"Error renderizando {url}: {e}")
+                return None
+
     # ============================================================
     #               EXTRACCIÓN RECURSIVA
     # ============================================================
     def extraer_todos_los_links(self, url_inicial: str, json_file_path: str,
                                 listado_extensiones: List[str] = None,
-                                max_iteraciones: int = 100) -> Dict:
-
+                                max_iteraciones: int = 100, trabajo=None,
+                                max_profundidad: int = None, checkpoint_cada: int = 20,
+                                reanudar: bool = True, al_descubrir: Callable = None) -> Dict:
+        """
+        Recorre recursivamente las páginas del dominio y guarda los enlaces en JSON.
+        El estado del recorrido (FronteraURL) se guarda cada checkpoint_cada páginas
+        junto al JSON; si el recorrido se interrumpe o agota max_iteraciones, la
+        siguiente llamada con la misma url_inicial y el mismo dominio continúa donde
+        quedó. Un checkpoint o un JSON de enlaces de otro sitio se descartan.
+
+        Args:
+            trabajo: Trabajo de GestorTrabajos opcional para reportar progreso y cancelar
+            max_profundidad: Saltos máximos desde url_inicial (None = sin límite)
+            checkpoint_cada: Páginas visitadas entre guardados del estado
+            reanudar: Si False, ignora un estado guardado y empieza en url_inicial
+            al_descubrir: Función llamada con cada enlace conocido (primero los ya
+                          registrados y luego cada nuevo en cuanto se encuentra), para
+                          procesar archivos sin esperar a que termine el recorrido
+        """
         if listado_extensiones is None:
             listado_extensiones = ['pdf', 'aspx']
 
-        # Cargar links previos
-        all_links = self._cargar_links_desde_json(json_file_path)
-
-        # Primera extracción si no existían
-        if not all_links:
-            all_links = self.extract_links(url_inicial, listado_extensiones)
-
-        # Obtener ASPX para visitar
-        aspx_links = [
-            l['url'] for l in all_links if l['type'] == 'aspx'
-        ]
+        ruta_frontera = os.path.splitext(json_file_path)[0] + '_frontera.json'
+        frontera = FronteraURL.cargar(ruta_frontera) if reanudar else None
+        # El checkpoint es de un solo recorrido: el de otra página inicial u otro sitio no se retoma
+        if frontera is not None and not frontera.corresponde_a(url_inicial, self.dominio_base):
+            frontera = None
+        reanudado = frontera is not None and frontera.pendientes() > 0
+
+        if not reanudado:
+            frontera = FronteraURL(max_profundidad=max_profundidad, url_inicial=url_inicial,
+                                   dominio_base=self.dominio_base)
+            # La página inicial se visita siempre: en un re-crawl puede traer enlaces nuevos
+            frontera.agregar(url_inicial, profundidad=0)
+            # Enlaces de un recorrido anterior del mismo sitio: se conservan y sus páginas se revisitan
+            for link in self._links_previos(json_file_path):
+                frontera.registrar_enlace(link)
+                if link['type'] == 'aspx':
+                    frontera.agregar(link['url'], profundidad=1)
+
+        if al_descubrir:
+            for link in frontera.lista_enlaces():
+                al_descubrir(link)
 
-        visitados = set()
         iteraciones = 0
-
-        while aspx_links and iteraciones < max_iteraciones:
-            iteraciones += 1
-            actual = aspx_links.pop(0)
-
-            if actual in visitados:
-                continue
-
-            visitados.add(actual)
-
-            nuevos = self.extract_links(actual, listado_extensiones)
-
-            for link in nuevos:
-                if not any(l['url'] == link['url'] for l in all_links):
-                    all_links.append(link)
-                    if link['type'] == 'aspx':
-                        aspx_links.append(link['url'])
-
-        self._guardar_links_en_json(json_file_path, {"links": all_links})
+        desde_checkpoint = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrencia) as executor:
+            while frontera.pendientes() and iteraciones < max_iteraciones:
+                # Lote de páginas por visitar, por prioridad y en orden de descubrimiento
+                lote = frontera.siguiente_lote(min(self.concurrencia, max_iteraciones - iteraciones))
+                iteraciones += len(lote)
+
+                # map() conserva el orden del lote: el resultado es determinista
+                # aunque las páginas terminen de descargarse en otro orden
+                resultados = executor.map(
+                    lambda pagina: self.extract_links(pagina['url'], listado_extensiones), lote)
+                for pagina, nuevos in zip(lote, resultados):
+                    frontera.marcar_visitada(pagina['url'])
+
+                    for link in nuevos:
+                        if not frontera.registrar_enlace(link):
+                            continue
+                        if link['type'] == 'aspx':
+                            frontera.agregar(link['url'], profundidad=pagina['profundidad'] + 1)
+                        if al_descubrir:
+                            al_descubrir(link)
+
+                desde_checkpoint += len(lote)
+                if desde_checkpoint >= checkpoint_cada:
+                    frontera.guardar(ruta_frontera)
+                    self._guardar_links_en_json(json_file_path, self._datos_links(frontera))
+                    desde_checkpoint = 0
+
+                if trabajo:
+                    trabajo.avanzar('crawl', cantidad=len(lote))
+
+        all_links = frontera.lista_enlaces()
+        self._guardar_links_en_json(json_file_path, self._datos_links(frontera))
+
+        # Con la frontera agotada el recorrido terminó; si no, queda listo para reanudar
+        if frontera.pendientes():
+            frontera.guardar(ruta_frontera)
+        elif os.path.exists(ruta_frontera):
+            os.remove(ruta_frontera)
 
         return {
             "success": True,
             "total_links": len(all_links),
             "iteraciones": iteraciones,
+            "pendientes": frontera.pendientes(),
+            "reanudado": reanudado,
             "links": all_links
         }
 
@@ -138,6 +405,28 @@ class WebScraping:
         except:
             return []
 
+    def _links_previos(self, json_file_path: str) -> List[Dict]:
+        """
+        Enlaces de un recorrido anterior del mismo dominio. De un JSON sin
+        dominio (formato anterior) solo se conservan los enlaces del dominio
+        """
+        if not os.path.exists(json_file_path):
+            return []
+        try:
+            with open(json_file_path, "r", encoding="utf-8") as f:
+                datos = json.load(f)
+        except:
+            return []
+        host = urlparse(self.dominio_base).netloc.lower()
+        if 'dominio_base' in datos:
+            return datos.get("links", []) if datos['dominio_base'] == host else []
+        return [link for link in datos.get("links", []) if urlparse(link['url']).netloc.lower() == host]
+
+    @staticmethod
+    def _datos_links(frontera: FronteraURL) -> Dict:
+        return {"url_inicial": frontera.url_inicial, "dominio_base": frontera.dominio_base,
+                "links": frontera.lista_enlaces()}
+
     def _guardar_links_en_json(self, json_file_path: str, data: Dict):
         try:
             carpeta = os.path.dirname(json_file_path)
@@ -152,55 +441,333 @@ class WebScraping:
     # ============================================================
     #               DESCARGA DE PDFs (FUNCIONAL)
     # ============================================================
-    def descargar_pdfs(self, json_file_path: str, carpeta_destino: str = "static/uploads") -> Dict:
+    @staticmethod
+    def _nombre_archivo(url: str, unico: bool = False) -> str:
+        """
+        Nombre de archivo local derivado solo de la URL. Con unico=True se agrega
+        un sufijo del sha1 de la URL (.../a/informe.pdf -> informe_<sha1>.pdf),
+        para URLs distintas que comparten el nombre base.
+        """
+        from werkzeug.utils import secure_filename
+
+        parsed = urlparse(url)
+        id_drive = parse_qs(parsed.query).get('id') or WebScraping.PATRON_ID_DRIVE.findall(parsed.path)
+        if parsed.netloc.lower() in ('drive.google.com', 'docs.google.com') and id_drive:
+            # Las descargas directas de Drive no tienen nombre en la URL; el id ya es único
+            return f"drive_{id_drive[0]}.pdf"
+
+        filename = os.path.basename(url.split("?")[0])
+        if not filename.lower().endswith(".pdf"):
+            filename += ".pdf"
+        filename = secure_filename(filename) or "documento.pdf"
+        if unico:
+            base, extension = os.path.splitext(filename)
+            sufijo = hashlib.sha1(url.encode('utf-8')).hexdigest()[:8]
+            filename = f"{base}_{sufijo}{extension}"
+        return filename
+
+    @staticmethod
+    def _nombre_registrado(url: str, manifiesto=None) -> Optional[str]:
+        """Nombre del archivo que el manifiesto ya tiene para la URL (sus validadores son de ese archivo)"""
+        entrada = manifiesto.obtener(url) if manifiesto is not None else None
+        if entrada and entrada.get('archivo'):
+            return os.path.basename(entrada['archivo'])
+        return None
+
+    @staticmethod
+    def _asignar_nombres(links: List[Dict], manifiesto=None) -> List[str]:
+        """
+        Nombres de archivo locales, sin colisiones y sin depender del orden de
+        los enlaces: una URL registrada en el manifiesto conserva su archivo; las
+        demás usan el nombre de la URL, o nombre_<sha1> si ese nombre lo
+        comparten varias URLs de la lista o ya es el archivo de otra URL.
+        """
+        registrados = manifiesto.archivos() if manifiesto is not None else {}
+        urls_por_nombre: Dict[str, set] = {}
+        for url, archivo in registrados.items():
+            urls_por_nombre.setdefault(os.path.basename(archivo).lower(), set()).add(url)
+        for link in links:
+            urls_por_nombre.setdefault(WebScraping._nombre_archivo(link['url']).lower(), set()).add(link['url'])
+
+        nombres = []
+        for link in links:
+            url = link['url']
+            nombre = WebScraping._nombre_registrado(url, manifiesto) or WebScraping._nombre_archivo(url)
+            if url not in registrados and len(urls_por_nombre[nombre.lower()]) > 1:
+                nombre = WebScraping._nombre_archivo(url, unico=True)
+            nombres.append(nombre)
+        return nombres
+
+    @staticmethod
+    def _leer_validadores(ruta_json: str) -> Dict:
+        try:
+            with open(ruta_json, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    @staticmethod
+    def _descartar_parcial(temporal: str):
+        for ruta in (temporal, f"{temporal}.json"):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def _descargar_archivo(self, url: str, ruta: str, cabeceras: Dict = None, trabajo=None,
+                           tam_bloque: int = 64 * 1024, reintentos: int = 3) -> Dict:
+        """
+        Descarga una URL a 'ruta' escribiendo en '<ruta>.part' y renombrando al final.
+        Si existe un parcial de un intento anterior se pide solo el resto (Range con
+        If-Range, para no mezclar dos versiones del archivo); un corte a mitad de la
+        transferencia se reintenta desde el último byte escrito.
+
+        Args:
+            cabeceras: Cabeceras condicionales (If-None-Match / If-Modified-Since)
+            trabajo: Trabajo opcional; la descarga se detiene si se cancela
+            tam_bloque: Bytes leídos del socket en cada iteración
+            reintentos: Reanudaciones ante cortes de conexión durante la transferencia
+
+        Returns:
+            Dict con 'estado' ('descargado' o 'sin_cambios'), 'hash', 'tamaño',
+            'bytes' (transferidos en esta llamada), 'reanudado', 'etag' y 'last_modified'
+        """
+        temporal = f"{ruta}.part"
+        ruta_validadores = f"{temporal}.json"
+        transferidos = 0
+        reanudado = False
+
+        for intento in range(reintentos + 1):
+            if trabajo:
+                trabajo.verificar_cancelacion()
+
+            offset = os.path.getsize(temporal) if os.path.exists(temporal) else 0
+            validadores = self._leer_validadores(ruta_validadores) if offset else {}
+            validador = validadores.get('etag') or validadores.get('last_modified')
+            if offset and validador:
+                pedido = {'Range': f'bytes={offset}-', 'If-Range': validador}
+            else:
+                # Sin validadores no hay forma de saber si el parcial sigue vigente
+                pedido = dict(cabeceras or {})
+
+            r = None
+            try:
+                r = self._get(url, stream=True, timeout=40, headers=pedido)
+
+                if r.status_code == 304:
+                    return {'estado': 'sin_cambios', 'bytes': 0, 'reanudado': False}
+
+                if r.status_code == 416:
+                    # El parcial no corresponde al recurso actual: se empieza de cero
+                    self._descartar_parcial(temporal)
+                    continue
+
+                r.raise_for_status()
+
+                etag = r.headers.get('ETag')
+                last_modified = r.headers.get('Last-Modified')
+                if r.status_code == 206:
+                    modo = "ab"
+                    reanudado = True
+                    etag = etag or validadores.get('etag')
+                    last_modified = last_modified or validadores.get('last_modified')
+                else:
+                    # 200: el servidor ignoró Range o el archivo cambió (If-Range falló)
+                    modo = "wb"
+                    with open(ruta_validadores, "w", encoding="utf-8") as f:
+                        json.dump({'etag': etag, 'last_modified': last_modified}, f)
+
+                with open(temporal, modo) as f:
+                    for chunk in r.iter_content(tam_bloque):
+                        if chunk:
+                            f.write(chunk)
+                            transferidos += len(chunk)
+                        if trabajo:
+                            trabajo.verificar_cancelacion()
+
+            except (requests.exceptions.ChunkedEncodingError,
+                    requests.exceptions.ConnectionError,
+                    requests.exceptions.Timeout):
+                # El parcial queda en disco y el siguiente intento lo continúa
+                if intento == reintentos:
+                    raise
+                continue
+            finally:
+                if r is not None:
+                    r.close()
+
+            hash_archivo = Funciones.calcular_hash_archivo(temporal)
+            os.replace(temporal, ruta)
+            self._descartar_parcial(temporal)
+            return {
+                'estado': 'descargado',
+                'hash': hash_archivo,
+                'tamaño': os.path.getsize(ruta),
+                'bytes': transferidos,
+                'reanudado': reanudado,
+                'etag': etag,
+                'last_modified': last_modified
+            }
+
+        raise IOError(f"No se pudo completar la descarga de {url}")
+
+    def descargar_enlace(self, link: Dict, ruta: str, manifiesto=None, trabajo=None,
+                         tam_bloque: int = 64 * 1024) -> Dict:
+        """
+        Descarga un archivo (GET condicional si hay manifiesto) y lo registra
+
+        Args:
+            link: Enlace {'url', 'type'}
+            ruta: Ruta local de destino
+            manifiesto: ManifiestoCrawl opcional (seguro entre hilos)
+            trabajo: Trabajo opcional; la descarga se detiene si se cancela
+
+        Returns:
+            Dict con 'estado' ('nuevo' o 'sin_cambios'), 'descargado' (si hubo
+            transferencia), 'archivo' (entrada para extracción si es nuevo o cambió),
+            'bytes', 'reanudado', 'duracion' y 'mb_por_segundo'
+        """
+        url = link['url']
+        cabeceras = manifiesto.cabeceras_condicionales(url) if manifiesto is not None else {}
+        inicio = time.perf_counter()
+        descarga = self._descargar_archivo(url, ruta, cabeceras, trabajo, tam_bloque)
+        duracion = time.perf_counter() - inicio
+
+        resultado = {
+            "url": url,
+            "nombre": os.path.basename(ruta),
+            "estado": "sin_cambios",
+            "descargado": descarga['estado'] == 'descargado',
+            "archivo": None,
+            "bytes": descarga['bytes'],
+            "reanudado": descarga['reanudado'],
+            "duracion": round(duracion, 3),
+            "mb_por_segundo": round(descarga['bytes'] / 1048576 / duracion, 2) if duracion > 0 else None
+        }
+
+        if not resultado['descargado']:
+            # El servidor confirma que no cambió: no se descarga ni se reprocesa
+            if manifiesto is not None:
+                manifiesto.marcar_verificado(url)
+            return resultado
+
+        cambio = True
+        if manifiesto is not None:
+            # Sin validadores HTTP, el hash detecta que el contenido es el mismo
+            cambio = manifiesto.registrar(url, ruta, descarga['hash'], descarga['tamaño'],
+                                          etag=descarga['etag'],
+                                          last_modified=descarga['last_modified'])
+        if cambio:
+            resultado['estado'] = 'nuevo'
+            resultado['archivo'] = {
+                'nombre': resultado['nombre'],
+                'ruta': ruta,
+                'extension': 'pdf',
+                'tamaño': descarga['tamaño'],
+                'url': url
+            }
+        return resultado
+
+    def descargar_pdfs(self, json_file_path: str, carpeta_destino: str = "static/uploads",
+                       trabajo=None, manifiesto=None, tam_bloque: int = 64 * 1024) -> Dict:
+        """
+        Descarga los PDFs listados en el JSON de enlaces, descargas_simultaneas a la vez
+
+        Args:
+            trabajo: Trabajo de GestorTrabajos opcional para reportar progreso y cancelar
+            manifiesto: ManifiestoCrawl opcional. Si se entrega, la descarga es
+                        incremental: no se borra carpeta_destino, se envían GET
+                        condicionales (If-None-Match / If-Modified-Since), las
+                        respuestas 304 se omiten y solo se reportan en 'nuevos'
+                        los archivos nuevos o con contenido distinto. Los parciales
+                        (.part) de una ejecución interrumpida se reanudan.
+            tam_bloque: Bytes leídos del socket en cada iteración
+
+        Returns:
+            Dict con totales, 'nuevos' (en el orden del JSON), 'archivos' con
+            bytes, duración y MB/s de cada descarga, y el throughput agregado
+        """
 
         links = self._cargar_links_desde_json(json_file_path)
         pdfs = [l for l in links if l.get("type") == "pdf"]
 
         if not pdfs:
-            return {"success": True, "descargados": 0, "errores": 0}
+            return {"success": True, "descargados": 0, "errores": 0, "sin_cambios": 0, "nuevos": []}
 
         Funciones.crear_carpeta(carpeta_destino)
-        Funciones.borrar_contenido_carpeta(carpeta_destino)
+        if manifiesto is None:
+            Funciones.borrar_contenido_carpeta(carpeta_destino)
 
         descargados = 0
+        sin_cambios = 0
         errores = 0
         errores_lista = []
+        nuevos = []
+        archivos = []
+        bytes_totales = 0
 
-        from werkzeug.utils import secure_filename
-
-        for i, link in enumerate(pdfs, 1):
-            url_pdf = link['url']
+        if trabajo:
+            trabajo.etapa('descarga', total=len(pdfs))
 
-            try:
-                filename = os.path.basename(url_pdf.split("?")[0])
-                if not filename.endswith(".pdf"):
-                    filename += ".pdf"
-                filename = secure_filename(filename)
+        nombres = self._asignar_nombres(pdfs, manifiesto)
+        inicio_total = time.perf_counter()
 
+        with ThreadPoolExecutor(max_workers=self.descargas_simultaneas) as executor:
+            futuros = {}
+            for i, (link, filename) in enumerate(zip(pdfs, nombres)):
                 ruta = os.path.join(carpeta_destino, filename)
+                futuro = executor.submit(self.descargar_enlace, link, ruta, manifiesto, trabajo, tam_bloque)
+                futuros[futuro] = (i, link, filename)
+
+            for futuro in as_completed(futuros):
+                i, link, filename = futuros[futuro]
+                url_pdf = link['url']
+
+                try:
+                    descarga = futuro.result()
+                except TrabajoCancelado:
+                    raise
+                except Exception as e:
+                    errores += 1
+                    errores_lista.append({"url": url_pdf, "error": str(e)})
+                    archivos.append({"url": url_pdf, "nombre": filename, "estado": "error"})
+                    if trabajo:
+                        trabajo.avanzar('descarga', errores=1, detalle_error=f"{url_pdf}: {e}")
+                    continue
 
-                r = self.session.get(url_pdf, stream=True, timeout=40)
-                r.raise_for_status()
+                bytes_totales += descarga['bytes']
+                archivos.append({k: v for k, v in descarga.items() if k != 'archivo'})
+                descargados += descarga['descargado']
+                if descarga['archivo']:
+                    nuevos.append((i, descarga['archivo']))
+                else:
+                    sin_cambios += 1
+                if trabajo:
+                    trabajo.avanzar('descarga', bytes_procesados=descarga['bytes'])
 
-                with open(ruta, "wb") as f:
-                    for chunk in r.iter_content(8192):
-                        if chunk:
-                            f.write(chunk)
-
-                descargados += 1
+        if manifiesto is not None:
+            manifiesto.guardar()
 
-            except Exception as e:
-                errores += 1
-                errores_lista.append({"url": url_pdf, "error": str(e)})
+        duracion_total = time.perf_counter() - inicio_total
+        mb_por_segundo = round(bytes_totales / 1048576 / duracion_total, 2) if duracion_total > 0 else None
+        print(f"Descarga: {descargados} archivos, {bytes_totales / 1048576:.1f} MB "
+              f"en {duracion_total:.1f}s ({mb_por_segundo} MB/s)")
 
         return {
             "success": True,
             "total": len(pdfs),
             "descargados": descargados,
+            "sin_cambios": sin_cambios,
             "errores": errores,
-            "errores_detalle": errores_lista
+            "errores_detalle": errores_lista,
+            "nuevos": [n for _, n in sorted(nuevos, key=lambda x: x[0])],
+            "archivos": archivos,
+            "bytes": bytes_totales,
+            "duracion": round(duracion_total, 2),
+            "mb_por_segundo": mb_por_segundo
         }
 
     def close(self):
         self.session.close()
+        with self._lock_navegador:
+            if self._navegador is not None:
+                self._navegador.quit()
+                self._navegador = None
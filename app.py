@@ -1,10 +1,15 @@
 from flask import Flask, render_template, request, redirect, url_for, jsonify, session, flash
 from dotenv import load_dotenv
-from datetime import datetime
 from werkzeug.utils import secure_filename
+from functools import lru_cache
+from typing import Callable
 import os
+import json
+import threading
+import time
 import zipfile
-from Helpers import MongoDB, ElasticSearch, Funciones, WebScraping
+from elasticsearch import ConnectionError as ErrorConexionElastic, ConnectionTimeout
+from Helpers import MongoDB, ElasticSearch, Funciones, WebScraping, ExtraccionParalela, GestorTrabajos, ManifiestoCrawl, PipelineIngesta, DetectorDuplicados, CacheConsultas, IndiceVectorial, BuscadorLocal
 
 # Cargar variables de entorno
 load_dotenv()
@@ -20,8 +25,75 @@ MONGO_COLECCION = os.getenv('MONGO_COLECCION', 'usuario_roles')
 # Configuración ElasticSearch Cloud
 ELASTIC_CLOUD_ID       = os.getenv('ELASTIC_CLOUD_ID')
 ELASTIC_API_KEY         = os.getenv('ELASTIC_API_KEY')
+# Nombre público del índice: tras la primera reindexación es un alias sobre index_proyecto_v<n>
 ELASTIC_INDEX_DEFAULT   = os.getenv('ELASTIC_INDEX_DEFAULT', 'index_proyecto')
 
+# Configuración de extracción paralela de documentos
+EXTRACCION_PROCESOS          = int(os.getenv('EXTRACCION_PROCESOS', os.cpu_count() or 1))
+EXTRACCION_TAREAS_POR_HIJO   = int(os.getenv('EXTRACCION_TAREAS_POR_HIJO', 20))
+EXTRACCION_COLA              = int(os.getenv('EXTRACCION_COLA', 16))
+BULK_HILOS                   = int(os.getenv('BULK_HILOS', 2))
+BULK_MAX_MB                  = float(os.getenv('BULK_MAX_MB', 10))
+# 'took' por lote buscado: el tamaño del lote y los hilos se ajustan hacia él
+BULK_TOOK_OBJETIVO_MS        = int(os.getenv('BULK_TOOK_OBJETIVO_MS', 1000))
+# Desde este número de documentos la carga desactiva refresh y réplicas del índice (0 = nunca)
+CARGA_MASIVA_MIN_DOCUMENTOS  = int(os.getenv('CARGA_MASIVA_MIN_DOCUMENTOS', 100))
+CARGA_MASIVA_FORCE_MERGE     = os.getenv('CARGA_MASIVA_FORCE_MERGE', 'false').lower() == 'true'
+FRAGMENTOS_HABILITADOS       = os.getenv('FRAGMENTOS_HABILITADOS', 'true').lower() == 'true'
+# _id estable por 'contenido' (hash) o por 'url' de origen; op 'index', 'create' o 'update'
+BULK_ESTRATEGIA_ID           = os.getenv('BULK_ESTRATEGIA_ID', 'contenido')
+BULK_OP_TYPE                 = os.getenv('BULK_OP_TYPE', 'index')
+
+# Embeddings para la búsqueda híbrida (BM25 + kNN). El modelo se carga al primer uso
+EMBEDDINGS_HABILITADOS       = os.getenv('EMBEDDINGS_HABILITADOS', 'false').lower() == 'true'
+EMBEDDINGS_MODELO            = os.getenv('EMBEDDINGS_MODELO', 'paraphrase-multilingual-MiniLM-L12-v2')
+EMBEDDINGS_LOTE              = int(os.getenv('EMBEDDINGS_LOTE', 32))
+# Presupuesto de latencia de cada rama de la búsqueda híbrida
+HIBRIDA_PRESUPUESTO_BM25_MS  = int(os.getenv('HIBRIDA_PRESUPUESTO_BM25_MS', 800))
+HIBRIDA_PRESUPUESTO_KNN_MS   = int(os.getenv('HIBRIDA_PRESUPUESTO_KNN_MS', 800))
+HIBRIDA_NUM_CANDIDATOS       = int(os.getenv('HIBRIDA_NUM_CANDIDATOS', 200))
+
+# Índice de vectores local (memmap) para búsqueda semántica sin Elasticsearch
+INDICE_VECTORIAL_RUTA        = os.getenv('INDICE_VECTORIAL_RUTA', 'cache/indice_vectorial')
+# 'float16' o 'int8' (la mitad de disco y memoria, con una escala por vector)
+INDICE_VECTORIAL_TIPO        = os.getenv('INDICE_VECTORIAL_TIPO', 'float16')
+# Vectores a partir de los cuales se entrena el cuantizador IVF tras construir
+INDICE_VECTORIAL_IVF_DESDE   = int(os.getenv('INDICE_VECTORIAL_IVF_DESDE', 50000))
+INDICE_VECTORIAL_NPROBE      = int(os.getenv('INDICE_VECTORIAL_NPROBE', 8))
+
+# Motor full-text local (SQLite + BM25) para búsquedas sin Elasticsearch:
+# 'elastic' (solo Elastic), 'local' (solo el motor local) o 'auto' (el local
+# responde si Elastic no está disponible). Con 'local' o 'auto' las cargas
+# indexan también en el motor local
+BUSCADOR_BACKEND             = os.getenv('BUSCADOR_BACKEND', 'elastic').strip().lower()
+BUSCADOR_LOCAL_RUTA          = os.getenv('BUSCADOR_LOCAL_RUTA', 'cache/buscador_local')
+
+# Cache de resultados de /buscar-elastic (por proceso; se invalida al escribir en Elastic)
+CACHE_BUSQUEDA_MAX_ENTRADAS  = int(os.getenv('CACHE_BUSQUEDA_MAX_ENTRADAS', 256))
+CACHE_BUSQUEDA_TTL           = float(os.getenv('CACHE_BUSQUEDA_TTL', 300))
+# Fragmentos resaltados por (texto, documento): un drill-down no vuelve a resaltar
+CACHE_PASAJES_MAX_ENTRADAS   = int(os.getenv('CACHE_PASAJES_MAX_ENTRADAS', 5000))
+
+# Configuración de trabajos de ingesta en segundo plano
+TRABAJOS_MAX_SIMULTANEOS     = int(os.getenv('TRABAJOS_MAX_SIMULTANEOS', 2))
+# Estado compartido por todos los workers: cualquiera puede consultar o cancelar un trabajo
+TRABAJOS_RUTA                = os.getenv('TRABAJOS_RUTA', 'cache/trabajos.db')
+
+# Manifiesto de descargas para re-crawls incrementales
+MANIFIESTO_CRAWL             = os.getenv('MANIFIESTO_CRAWL', 'cache/manifiesto_crawl.json')
+CRAWL_CONCURRENCIA           = int(os.getenv('CRAWL_CONCURRENCIA', 4))
+CRAWL_PETICIONES_POR_SEGUNDO = float(os.getenv('CRAWL_PETICIONES_POR_SEGUNDO', 4))
+DESCARGAS_SIMULTANEAS        = int(os.getenv('DESCARGAS_SIMULTANEAS', 4))
+# Chrome headless (requiere selenium) solo para páginas que dependen de JavaScript
+CRAWL_USAR_NAVEGADOR         = os.getenv('CRAWL_USAR_NAVEGADOR', 'false').lower() == 'true'
+
+# Detección de casi-duplicados (MinHash/LSH) antes de indexar:
+# '' (desactivada, por defecto), 'unico' (solo se indexa el original),
+# 'version' (se indexan y enlazan) u 'omitir'
+DEDUPLICACION_MODO           = os.getenv('DEDUPLICACION_MODO', '').strip().lower()
+DEDUPLICACION_UMBRAL         = float(os.getenv('DEDUPLICACION_UMBRAL', 0.85))
+DEDUPLICACION_RUTA           = os.getenv('DEDUPLICACION_RUTA', 'cache/duplicados.db')
+
 # Versión de la aplicación
 VERSION_APP = "1.2.0"
 CREATOR_APP = "OscarDanTR"
@@ -29,6 +101,67 @@ CREATOR_APP = "OscarDanTR"
 # Inicializar conexiones
 mongo = MongoDB(MONGO_URI, MONGO_DB)
 elastic = ElasticSearch(ELASTIC_CLOUD_ID, ELASTIC_API_KEY)
+# Índices que quedaron en modo carga masiva si el proceso murió durante una carga
+elastic.restaurar_cargas_pendientes()
+cache_busqueda = CacheConsultas(CACHE_BUSQUEDA_MAX_ENTRADAS, CACHE_BUSQUEDA_TTL)
+cache_pasajes = CacheConsultas(CACHE_PASAJES_MAX_ENTRADAS, CACHE_BUSQUEDA_TTL)
+# Cualquier escritura (cargas, scraping, DML, reindexación) invalida los resultados guardados
+elastic.al_escribir.append(cache_busqueda.invalidar)
+elastic.al_escribir.append(cache_pasajes.invalidar)
+# Existencia del índice de pasajes: se crea o elimina siempre con una escritura notificada
+cache_indices = CacheConsultas(16, CACHE_BUSQUEDA_TTL)
+elastic.al_escribir.append(cache_indices.invalidar)
+trabajos = GestorTrabajos(max_trabajadores=TRABAJOS_MAX_SIMULTANEOS, ruta_db=TRABAJOS_RUTA)
+# Una copia solo se descarta si su original sigue en el índice (el _id o su id_documento)
+deduplicador = DetectorDuplicados(DEDUPLICACION_RUTA, modo=DEDUPLICACION_MODO, umbral=DEDUPLICACION_UMBRAL,
+                                  existe_original=lambda index, id_documento: elastic.existe_documento(
+                                      index, id_documento, campo='id_documento')
+                                  ) if DEDUPLICACION_MODO else None
+if deduplicador:
+    # Borrar (o borrar y recrear) un índice descarta sus firmas
+    elastic.al_eliminar_indice.append(deduplicador.limpiar)
+# Mismo _id que Elastic: recargar un documento lo reemplaza también en el motor local
+buscador_local = BuscadorLocal(BUSCADOR_LOCAL_RUTA,
+                               obtener_id=lambda documento: ElasticSearch.id_estable(documento, BULK_ESTRATEGIA_ID)
+                               ) if BUSCADOR_BACKEND in ('local', 'auto') else None
+_pln_embeddings = None
+_lock_pln = threading.Lock()
+
+def vectorizar_textos(textos: list) -> list:
+    """
+    Embeddings de una lista de textos con PLN.model_embeddings. PLN se importa
+    y el modelo se carga al primer uso (sin spaCy), una sola vez por proceso
+    """
+    global _pln_embeddings
+    if _pln_embeddings is None:
+        with _lock_pln:
+            if _pln_embeddings is None:
+                from Helpers.PLN import PLN
+                pln = PLN(modelo_embeddings=EMBEDDINGS_MODELO, cargar_modelos=False)
+                pln.cargar_modelo_embeddings()
+                _pln_embeddings = pln
+    return _pln_embeddings.generar_embeddings(textos, tam_lote=EMBEDDINGS_LOTE)
+
+@lru_cache(maxsize=512)
+def _vector_consulta(texto_normalizado: str) -> tuple:
+    return tuple(vectorizar_textos([texto_normalizado])[0])
+
+def vector_consulta(texto_buscar: str) -> list:
+    """Embedding de una consulta; las repetidas no vuelven a pasar por el modelo"""
+    return list(_vector_consulta(CacheConsultas.normalizar_texto(texto_buscar)))
+
+_indice_vectorial = None
+_lock_indice_vectorial = threading.Lock()
+
+def obtener_indice_vectorial() -> IndiceVectorial:
+    """Abre el índice de vectores local la primera vez que se usa"""
+    global _indice_vectorial
+    if _indice_vectorial is None:
+        with _lock_indice_vectorial:
+            if _indice_vectorial is None:
+                _indice_vectorial = IndiceVectorial(INDICE_VECTORIAL_RUTA, tipo=INDICE_VECTORIAL_TIPO)
+    return _indice_vectorial
+
 UPLOAD_FOLDER = os.path.join(os.getcwd(), "uploads")  # Carpeta "uploads" en tu proyecto
 # ==================== RUTAS ====================
 ####RUTA DE LANDINGN####
@@ -52,6 +185,163 @@ def buscador():
     return render_template('buscador.html', version=VERSION_APP, creador=CREATOR_APP)
 
 ### RUTA DE BUSCARDOR ELASTIC ###
+# Facetas de la búsqueda: se piden como agregaciones y se filtran por su nombre
+AGGS_BUSQUEDA = {
+    "por_extension": {
+        "terms": {"field": "tipo_documento.keyword", "size": 20}
+    },
+    "por_archivo": {
+        "terms": {"field": "titulo.keyword", "size": 20}
+    },
+    "por_año": {
+        "date_histogram": {
+            "field": "fecha_extraccion",
+            "calendar_interval": "year"
+        }
+    }
+}
+
+def construir_consulta_frase(texto_buscar: str, filtros: dict = None) -> dict:
+    """
+    match_phrase sobre texto_completo sin las versiones casi duplicadas. Las
+    facetas seleccionadas ({nombre en AGGS_BUSQUEDA: [valores]}) van en
+    bool.filter; sin texto se cuenta todo el corpus
+    """
+    consulta = {
+        "bool": {
+            "must": [
+                {
+                    "match_phrase": {
+                        "texto_completo": {
+                            "query": texto_buscar,
+                            "slop": 1
+                        }
+                    }
+                } if texto_buscar else {"match_all": {}}
+            ],
+            # Las versiones de un documento casi duplicado solo muestran el original
+            "must_not": [{"exists": {"field": "version_de"}}]
+        }
+    }
+    clausulas = ElasticSearch.filtros_facetas(AGGS_BUSQUEDA, filtros)
+    if clausulas:
+        consulta["bool"]["filter"] = clausulas
+    return consulta
+
+def normalizar_filtros(filtros: dict) -> dict:
+    """Facetas seleccionadas en forma canónica para la clave de cache"""
+    return {nombre: sorted(map(str, valores if isinstance(valores, list) else [valores]))
+            for nombre, valores in (filtros or {}).items() if valores}
+
+def ejecutar_busqueda_frase_local(texto_buscar: str, filtros: dict = None) -> dict:
+    """La búsqueda por frase en el motor local (sin resaltado); lanza la excepción si falla"""
+    resultado = buscador_local.buscar(ELASTIC_INDEX_DEFAULT, {"query": construir_consulta_frase(texto_buscar, filtros)},
+                                      aggs=AGGS_BUSQUEDA, size=50)
+    if not resultado['success']:
+        raise RuntimeError(resultado['error'])
+    return {
+        "success": True,
+        "total": resultado['total'],
+        "hits": resultado['resultados'],
+        "aggs": resultado['aggs'],
+        "backend": "local"
+    }
+
+def segun_backend(en_elastic: Callable[[], dict], en_local: Callable[[], dict]) -> dict:
+    """
+    Ejecuta una búsqueda en Elastic o en el buscador local según BUSCADOR_BACKEND.
+    Con 'auto' responde el local si Elastic no está disponible, tanto si
+    en_elastic lanza el error de conexión como si lo devuelve ('sin_conexion')
+    """
+    if BUSCADOR_BACKEND == 'local':
+        return en_local()
+    try:
+        resultado = en_elastic()
+    except (ErrorConexionElastic, ConnectionTimeout) as e:
+        if BUSCADOR_BACKEND != 'auto':
+            raise
+        print(f"Elastic no disponible, responde el buscador local: {e}")
+        return en_local()
+    if BUSCADOR_BACKEND == 'auto' and not resultado.get('success') and resultado.get('sin_conexion'):
+        print(f"Elastic no disponible, responde el buscador local: {resultado.get('error')}")
+        return en_local()
+    return resultado
+
+def guardar_en_cache(resultado: dict) -> bool:
+    """
+    Una respuesta de respaldo (modo 'auto' con Elastic caído) no se guarda en
+    cache_busqueda: en cuanto Elastic vuelva se responde con él
+    """
+    return resultado.get("backend") != "local" or BUSCADOR_BACKEND == "local"
+
+def ejecutar_busqueda_frase(texto_buscar: str, filtros: dict = None) -> dict:
+    """
+    Búsqueda por frase con agregaciones según BUSCADOR_BACKEND; lanza la
+    excepción si falla (con 'auto', solo si fallan Elastic y el motor local)
+    """
+    return segun_backend(lambda: ejecutar_busqueda_frase_elastic(texto_buscar, filtros),
+                         lambda: ejecutar_busqueda_frase_local(texto_buscar, filtros))
+
+def hay_indice_fragmentos() -> bool:
+    """Si existe el índice de pasajes (cacheado hasta la próxima escritura); lanza la excepción si Elastic falla"""
+    indice = elastic.indice_fragmentos(ELASTIC_INDEX_DEFAULT)
+    return cache_indices.obtener(CacheConsultas.clave(indice, tipo='existe_indice'),
+                                 lambda: bool(elastic.client.indices.exists(index=indice)))[0]
+
+def ejecutar_busqueda_frase_elastic(texto_buscar: str, filtros: dict = None) -> dict:
+    """Búsqueda por frase con agregaciones en Elastic; lanza la excepción si Elastic falla"""
+    cliente = elastic.client
+    aggs_busqueda = AGGS_BUSQUEDA
+    consulta_frase = construir_consulta_frase(texto_buscar, filtros)
+
+    # Si existe el índice de pasajes se busca allí: un hit por documento con su
+    # mejor pasaje, y el resaltado solo recorre campos pequeños
+    if hay_indice_fragmentos():
+        resultado = elastic.buscar_fragmentos(ELASTIC_INDEX_DEFAULT, texto_buscar, size=50,
+                                              filtros=ElasticSearch.filtros_facetas(AGGS_BUSQUEDA, filtros))
+        if not resultado['success']:
+            raise RuntimeError(resultado['error'])
+
+        # Las agregaciones se calculan sobre los documentos completos, sin hits ni resaltado
+        respuesta_aggs = cliente.search(index=ELASTIC_INDEX_DEFAULT, query=consulta_frase,
+                                        aggs=aggs_busqueda, size=0)
+
+        return {
+            "success": True,
+            "total": resultado['total'],
+            "hits": resultado['resultados'],
+            "aggs": respuesta_aggs.get("aggregations", {})
+        }
+
+    query = {
+        "query": consulta_frase,
+        "size": 50,
+        "_source": {"excludes": [ElasticSearch.CAMPO_VECTOR]},
+        "highlight": {
+            "encoder": "html",
+            "fields": {
+                "texto_completo": {},
+                "titulo": {}
+            }
+        },
+        "aggs": aggs_busqueda
+    }
+
+
+    respuesta = cliente.search(index=ELASTIC_INDEX_DEFAULT, body=query)
+
+    # EXTRAER AGREGACIONES
+    hits = respuesta.get("hits", {}).get("hits", [])
+    total = respuesta.get("hits", {}).get("total", {}).get("value", 0)
+    aggs = respuesta.get("aggregations", {})
+
+    return {
+        "success": True,
+        "total": total,
+        "hits": hits,
+        "aggs": aggs   # <--- ESTO ES LO QUE FALTABA
+    }
+
 @app.route('/buscar-elastic', methods=['POST'])
 def buscar_elastic():
     try:
@@ -61,61 +351,232 @@ def buscar_elastic():
         if not texto_buscar:
             return jsonify({"success": False, "error": "No se envió texto a buscar"})
 
-        cliente = elastic.client
-
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "match_phrase": {
-                                "texto_completo": {
-                                    "query": texto_buscar,
-                                    "slop": 1
-                                }
-                            }
-                        }
-                    ],
-                }
-            },
-            "size": 50,
-            "highlight": {
-                "fields": {
-                    "texto_completo": {},
-                    "titulo": {}
-                }
-            },
-            "aggs": {
-                "por_extension": {
-                    "terms": {"field": "tipo_documento.keyword", "size": 20}
-                },
-                "por_archivo": {
-                    "terms": {"field": "titulo.keyword", "size": 20}
-                },
-                "por_año": {
-                    "date_histogram": {
-                        "field": "fecha_extraccion",
-                        "calendar_interval": "year"
-                    }
-                }
-            }
-        }
+        # Búsquedas repetidas salen de la cache; las idénticas y simultáneas
+        # comparten una sola consulta a Elastic
+        filtros = data.get("filtros") or {}
+        clave = CacheConsultas.clave(texto_buscar, index=ELASTIC_INDEX_DEFAULT, tipo='frase',
+                                     filtros=normalizar_filtros(filtros))
+        resultado, origen = cache_busqueda.obtener(
+            clave, lambda: ejecutar_busqueda_frase(texto_buscar, filtros), guardar=guardar_en_cache)
 
+        return jsonify({**resultado, "cache": origen})
 
-        respuesta = cliente.search(index="index_proyecto", body=query)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
 
-        # EXTRAER AGREGACIONES
-        hits = respuesta.get("hits", {}).get("hits", [])
-        total = respuesta.get("hits", {}).get("total", {}).get("value", 0)
-        aggs = respuesta.get("aggregations", {})
+@app.route('/cache-busqueda')
+def estado_cache_busqueda():
+    """API con los contadores de la cache de búsqueda (aciertos, fallos, coalescidas...)"""
+    if not session.get('logged_in'):
+        return jsonify({'success': False, 'error': 'No autorizado'}), 401
+    if not session.get('permisos', {}).get('admin_elastic'):
+        return jsonify({'success': False, 'error': 'No tiene permisos para gestionar ElasticSearch'}), 403
+    return jsonify({'success': True, 'cache': cache_busqueda.estadisticas()})
 
-        return jsonify({
-            "success": True,
-            "total": total,
-            "hits": hits,
-            "aggs": aggs   # <--- ESTO ES LO QUE FALTABA
-        })
+### RUTAS DE BUSCADOR V2 (respuestas livianas y paginadas) ###
+# Campos que devuelve /v2/buscar-elastic si no se piden otros; texto_completo
+# nunca viaja en la lista de resultados, se pide por /v2/documento-elastic
+CAMPOS_RESULTADO_V2 = ['nombre_archivo', 'titulo', 'tipo_documento', 'fecha', 'url', 'ruta']
+
+def resaltados_pagina(texto_buscar: str, ids: list, fragment_size: int,
+                      number_of_fragments: int) -> dict:
+    """
+    Fragmentos resaltados de una página. Dependen solo del texto y del documento,
+    no de las facetas, así que un drill-down reutiliza los ya calculados y solo
+    se resaltan los documentos nuevos
+    """
+    if not number_of_fragments or not ids:
+        return {}
+    claves = {doc_id: CacheConsultas.clave(texto_buscar, id=doc_id, fragment_size=fragment_size,
+                                           number_of_fragments=number_of_fragments)
+              for doc_id in ids}
+    guardados = cache_pasajes.consultar(list(claves.values()))
+    resaltados = {doc_id: guardados[clave] for doc_id, clave in claves.items() if clave in guardados}
+
+    faltantes = [doc_id for doc_id in ids if doc_id not in resaltados]
+    if faltantes:
+        generacion = cache_pasajes.generacion
+        # Con índice de pasajes el resaltado sale de ahí y no recorre texto_completo
+        if hay_indice_fragmentos():
+            pasajes = elastic.mejores_pasajes(ELASTIC_INDEX_DEFAULT, texto_buscar, faltantes,
+                                              fragment_size=fragment_size,
+                                              number_of_fragments=number_of_fragments)
+            nuevos = {doc_id: {'texto_completo': fragmentos} for doc_id, fragmentos in pasajes.items()}
+        else:
+            nuevos = elastic.resaltar_documentos(ELASTIC_INDEX_DEFAULT, construir_consulta_frase(texto_buscar),
+                                                 faltantes, ['texto_completo'], fragment_size=fragment_size,
+                                                 number_of_fragments=number_of_fragments)
+        for doc_id in faltantes:
+            nuevos.setdefault(doc_id, {})
+        cache_pasajes.guardar({claves[doc_id]: valor for doc_id, valor in nuevos.items()}, generacion)
+        resaltados.update(nuevos)
+    return resaltados
+
+def buscar_hibrido_v2(texto_buscar: str, filtros: dict, campos: list, size: int,
+                      fragment_size: int, number_of_fragments: int) -> dict:
+    """
+    BM25 + kNN fusionados con RRF. Los documentos que coinciden con la frase
+    llevan su resaltado habitual; los encontrados solo por significado, el
+    pasaje más cercano a la consulta
+    """
+    resultado = elastic.buscar_hibrido(
+        ELASTIC_INDEX_DEFAULT, texto_buscar, vector_consulta(texto_buscar), campos=campos,
+        filtros=ElasticSearch.filtros_facetas(AGGS_BUSQUEDA, filtros), size=size,
+        num_candidates=HIBRIDA_NUM_CANDIDATOS, presupuesto_bm25_ms=HIBRIDA_PRESUPUESTO_BM25_MS,
+        presupuesto_knn_ms=HIBRIDA_PRESUPUESTO_KNN_MS,
+        max_caracteres_pasaje=fragment_size * max(1, number_of_fragments))
+    if not resultado['success']:
+        return resultado
+
+    hits = resultado['resultados']
+    resaltados = resaltados_pagina(texto_buscar, [hit['_id'] for hit in hits],
+                                   fragment_size, number_of_fragments)
+    for hit in hits:
+        if resaltados.get(hit['_id']):
+            hit['highlight'] = resaltados[hit['_id']]
+        elif not number_of_fragments:
+            hit['highlight'] = {}
+    return {"success": True, "modo": "hibrido", "hits": hits, "cursor": None,
+            "total": len(hits), "ramas": resultado['ramas']}
+
+def buscar_v2_local(texto_buscar: str, filtros: dict, campos: list, size: int, agregaciones: bool) -> dict:
+    """
+    /v2/buscar-elastic en el buscador local: una sola página (cursor None), sin
+    resaltado; también responde al modo 'hibrido' (solo la frase)
+    """
+    resultado = buscador_local.buscar(ELASTIC_INDEX_DEFAULT, {"query": construir_consulta_frase(texto_buscar, filtros)},
+                                      aggs=AGGS_BUSQUEDA if agregaciones else None, size=size)
+    if not resultado['success']:
+        return resultado
+    hits = [{"_id": hit['_id'], "_score": hit['_score'],
+             "_source": {c: hit['_source'][c] for c in campos if c in hit['_source']}, "highlight": {}}
+            for hit in resultado['resultados']]
+    respuesta = {"success": True, "hits": hits, "cursor": None, "took": resultado['took'],
+                 "total": resultado['total'], "total_relacion": "eq", "backend": "local"}
+    if agregaciones:
+        respuesta['aggs'] = resultado['aggs']
+    return respuesta
 
+@app.route('/v2/buscar-elastic', methods=['POST'])
+def buscar_elastic_v2():
+    """
+    Búsqueda por frase paginada con search_after / point-in-time. Recibe 'texto',
+    y opcionalmente 'filtros' ({faceta: [valores]}), 'campos', 'size' (máx. 100),
+    'cursor' (de la página anterior), 'fragment_size' (máx. 500),
+    'number_of_fragments' (máx. 5) y 'agregaciones'.
+
+    Con 'modo': 'hibrido' se fusionan (RRF) BM25 y kNN sobre los embeddings,
+    así que se encuentran documentos aunque no contengan la frase exacta; esa
+    respuesta es una sola página (sin cursor) e incluye la latencia de cada rama.
+
+    Responde el buscador local según BUSCADOR_BACKEND (ver segun_backend)
+    """
+    try:
+        inicio = time.perf_counter()
+        data = request.get_json() or {}
+        texto_buscar = data.get("texto", "").strip()
+        if not texto_buscar:
+            return jsonify({"success": False, "error": "No se envió texto a buscar"}), 400
+
+        campos = [c for c in (data.get("campos") or CAMPOS_RESULTADO_V2) if c != "texto_completo"]
+        size = max(1, min(int(data.get("size", 20)), 100))
+        fragment_size = max(20, min(int(data.get("fragment_size", 150)), 500))
+        number_of_fragments = max(0, min(int(data.get("number_of_fragments", 2)), 5))
+        cursor = data.get("cursor")
+        filtros = data.get("filtros")
+
+        def en_elastic() -> dict:
+            if data.get("modo") == "hibrido":
+                return buscar_hibrido_v2(texto_buscar, filtros, campos, size,
+                                         fragment_size, number_of_fragments)
+            resultado = elastic.buscar_paginado(
+                ELASTIC_INDEX_DEFAULT, construir_consulta_frase(texto_buscar, filtros),
+                campos=campos, size=size, cursor=cursor,
+                aggs=AGGS_BUSQUEDA if data.get("agregaciones") else None)
+            if not resultado['success']:
+                return resultado
+
+            resaltados = resaltados_pagina(texto_buscar, [hit['_id'] for hit in resultado['hits']],
+                                           fragment_size, number_of_fragments)
+            for hit in resultado['hits']:
+                hit['highlight'] = resaltados.get(hit['_id'], {})
+            return resultado
+
+        resultado = segun_backend(
+            en_elastic, lambda: buscar_v2_local(texto_buscar, filtros, campos, size, bool(data.get("agregaciones"))))
+        if not resultado['success']:
+            return jsonify(resultado), 410 if resultado.get('cursor_expirado') else 500
+
+        resultado['servidor_ms'] = round((time.perf_counter() - inicio) * 1000, 1)
+        return jsonify(resultado)
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/v2/cerrar-cursor', methods=['POST'])
+def cerrar_cursor_v2():
+    """Libera el point-in-time de un cursor de /v2/buscar-elastic que el cliente ya no va a usar"""
+    try:
+        cursor = (request.get_json(silent=True) or {}).get("cursor")
+        if not cursor:
+            return jsonify({"success": False, "error": "No se envió cursor"}), 400
+        return jsonify({"success": elastic.cerrar_cursor(cursor)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/v2/facetas-elastic', methods=['POST'])
+def facetas_elastic_v2():
+    """
+    Solo conteos de facetas (size 0, request_cache) para 'texto' y 'filtros';
+    sin texto ni filtros son los del corpus completo. Se guardan en la cache de
+    búsqueda hasta la próxima ingesta. Responde el buscador local según
+    BUSCADOR_BACKEND (ver segun_backend)
+    """
+    try:
+        data = request.get_json() or {}
+        texto_buscar = data.get("texto", "").strip()
+        filtros = data.get("filtros") or {}
+
+        consulta = construir_consulta_frase(texto_buscar, filtros)
+
+        def en_local():
+            resultado = buscador_local.buscar(ELASTIC_INDEX_DEFAULT, {"query": consulta},
+                                              aggs=AGGS_BUSQUEDA, size=0)
+            if resultado['success']:
+                resultado = {"success": True, "total": resultado['total'], "aggs": resultado['aggs'],
+                             "took": resultado['took'], "backend": "local"}
+            return resultado
+
+        def calcular():
+            resultado = segun_backend(
+                lambda: elastic.contar_facetas(ELASTIC_INDEX_DEFAULT, consulta, AGGS_BUSQUEDA), en_local)
+            if not resultado['success']:
+                raise RuntimeError(resultado['error'])
+            return resultado
+
+        clave = CacheConsultas.clave(texto_buscar, index=ELASTIC_INDEX_DEFAULT, tipo='facetas',
+                                     filtros=normalizar_filtros(filtros))
+        resultado, origen = cache_busqueda.obtener(clave, calcular, guardar=guardar_en_cache)
+        return jsonify({**resultado, "cache": origen})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@app.route('/v2/documento-elastic/<doc_id>')
+def documento_elastic_v2(doc_id):
+    """Documento completo (o solo ?campos=a,b) bajo demanda, p. ej. al abrir 'Ver completo'"""
+    try:
+        campos = [c for c in request.args.get('campos', '').split(',') if c] or None
+        documento = None
+        if BUSCADOR_BACKEND != 'local':
+            documento = elastic.obtener_documento(ELASTIC_INDEX_DEFAULT, doc_id, campos=campos)
+        if documento is None and buscador_local:
+            # Los resultados del buscador local se abren desde su propia copia
+            resultado = buscador_local.buscar(ELASTIC_INDEX_DEFAULT, {"query": {"ids": {"values": [doc_id]}}},
+                                              size=1, campos=campos)
+            if resultado['success'] and resultado['resultados']:
+                documento = resultado['resultados'][0]['_source']
+        if documento is None:
+            return jsonify({"success": False, "error": "Documento no encontrado"}), 404
+        return jsonify({"success": True, "_id": doc_id, "_source": documento})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -352,6 +813,175 @@ def ejecutar_query_elastic():
         return jsonify({'success': False, 'error': str(e)}), 500
 
 
+#### RUTA REINDEXAR ELASTIC (alias blue/green) ###
+def ejecutar_reindexacion(index: str, mappings: dict = None, settings: dict = None,
+                          eliminar_anteriores: bool = False, trabajo=None) -> dict:
+    """Copia el índice a una versión nueva y cambia el alias; se ejecuta como trabajo"""
+    return elastic.reindexar_con_alias(index, mappings=mappings, settings=settings,
+                                       eliminar_anteriores=eliminar_anteriores, trabajo=trabajo)
+
+@app.route('/reindexar-elastic', methods=['POST'])
+def reindexar_elastic():
+    """API para reindexar sin corte: las búsquedas siguen por el alias mientras se copia"""
+    try:
+        if not session.get('logged_in'):
+            return jsonify({'success': False, 'error': 'No autorizado'}), 401
+
+        permisos = session.get('permisos', {})
+        if not permisos.get('admin_elastic'):
+            return jsonify({'success': False, 'error': 'No tiene permisos para gestionar ElasticSearch'}), 403
+
+        data = request.get_json() or {}
+        index = data.get('index', ELASTIC_INDEX_DEFAULT)
+        mappings = data.get('mappings')
+        settings = data.get('settings')
+        if isinstance(mappings, str):
+            mappings = json.loads(mappings)
+        if isinstance(settings, str):
+            settings = json.loads(settings)
+
+        trabajo = trabajos.enviar('reindexar', ejecutar_reindexacion, index, mappings, settings,
+                                  bool(data.get('eliminar_anteriores')),
+                                  parametros={'index': index})
+        return jsonify({'success': True, 'trabajo_id': trabajo.id}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/cambiar-alias-elastic', methods=['POST'])
+def cambiar_alias_elastic():
+    """API para apuntar el alias a otra versión (p. ej. volver a la anterior)"""
+    try:
+        if not session.get('logged_in'):
+            return jsonify({'success': False, 'error': 'No autorizado'}), 401
+
+        permisos = session.get('permisos', {})
+        if not permisos.get('admin_elastic'):
+            return jsonify({'success': False, 'error': 'No tiene permisos para gestionar ElasticSearch'}), 403
+
+        data = request.get_json() or {}
+        index = data.get('index', ELASTIC_INDEX_DEFAULT)
+        version = data.get('version')
+        if version is None:
+            return jsonify({'success': True, 'indices': elastic.indices_de_alias(index),
+                            'versiones': elastic.versiones_indice(index)})
+
+        indice = elastic.nombre_version(index, int(version))
+        if not elastic.existe_indice(indice):
+            return jsonify({'success': False, 'error': f'No existe la versión {indice}'}), 404
+        return jsonify(elastic.cambiar_alias(index, indice))
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+#### RUTAS DEL ÍNDICE DE VECTORES LOCAL (búsqueda semántica sin Elastic) ###
+def ejecutar_indice_vectorial(carpeta: str, tipos_archivos: list, trabajo=None) -> dict:
+    """Vectoriza los pasajes de los documentos de 'carpeta' que aún no están en el índice local"""
+    archivos = Funciones.listar_archivos_carpeta(carpeta, tipos_archivos)
+    if not archivos:
+        return {'success': False, 'error': f'No hay archivos {tipos_archivos} en {carpeta}'}
+
+    indice = obtener_indice_vectorial()
+    motor = ExtraccionParalela(num_procesos=EXTRACCION_PROCESOS,
+                               max_tareas_por_hijo=EXTRACCION_TAREAS_POR_HIJO)
+    if trabajo:
+        trabajo.etapa('vectorizacion', total=len(archivos))
+
+    conteo = indice.indexar_documentos(
+        motor.generar_documentos(archivos), vectorizar_textos,
+        lambda documento: ElasticSearch.id_estable(documento, BULK_ESTRATEGIA_ID),
+        tam_lote=EMBEDDINGS_LOTE, trabajo=trabajo)
+
+    estadisticas = indice.estadisticas()
+    if not estadisticas['num_listas'] and estadisticas['vigentes'] >= INDICE_VECTORIAL_IVF_DESDE:
+        indice.entrenar_ivf()
+        estadisticas = indice.estadisticas()
+    return {'success': True, **conteo, 'indice': estadisticas}
+
+@app.route('/indice-vectorial/construir', methods=['POST'])
+def construir_indice_vectorial():
+    """API para agregar al índice local los documentos nuevos de una carpeta (trabajo en segundo plano)"""
+    try:
+        if not session.get('logged_in'):
+            return jsonify({'success': False, 'error': 'No autorizado'}), 401
+        if not session.get('permisos', {}).get('admin_elastic'):
+            return jsonify({'success': False, 'error': 'No tiene permisos para gestionar ElasticSearch'}), 403
+
+        data = request.get_json() or {}
+        carpeta = data.get('carpeta', 'static/uploads')
+        tipos_archivos = [t.strip() for t in data.get('tipos_archivos', 'pdf,txt').split(',')]
+
+        trabajo = trabajos.enviar('indice_vectorial', ejecutar_indice_vectorial, carpeta, tipos_archivos,
+                                  parametros={'carpeta': carpeta})
+        return jsonify({'success': True, 'trabajo_id': trabajo.id}), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/indice-vectorial/compactar', methods=['POST'])
+def compactar_indice_vectorial():
+    """API para reescribir el índice local sin los vectores borrados o reemplazados"""
+    try:
+        if not session.get('logged_in'):
+            return jsonify({'success': False, 'error': 'No autorizado'}), 401
+        if not session.get('permisos', {}).get('admin_elastic'):
+            return jsonify({'success': False, 'error': 'No tiene permisos para gestionar ElasticSearch'}), 403
+
+        data = request.get_json() or {}
+        indice = obtener_indice_vectorial()
+        resultado = indice.compactar()
+        if data.get('entrenar_ivf'):
+            resultado['ivf'] = indice.entrenar_ivf(num_listas=data.get('num_listas'))
+        return jsonify({'success': True, **resultado, 'indice': indice.estadisticas()})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/buscador-local/optimizar', methods=['POST'])
+def optimizar_buscador_local():
+    """API para unir los segmentos del motor full-text local y purgar los documentos borrados"""
+    try:
+        if not session.get('logged_in'):
+            return jsonify({'success': False, 'error': 'No autorizado'}), 401
+        if not session.get('permisos', {}).get('admin_elastic'):
+            return jsonify({'success': False, 'error': 'No tiene permisos para gestionar ElasticSearch'}), 403
+        if not buscador_local:
+            return jsonify({'success': False, 'error': 'El buscador local no está habilitado (BUSCADOR_BACKEND)'}), 400
+
+        data = request.get_json() or {}
+        index = data.get('index', ELASTIC_INDEX_DEFAULT)
+        resultado = buscador_local.optimizar(index)
+        return jsonify({'success': True, **resultado, 'indice': buscador_local.estadisticas(index)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/v2/buscar-vectorial-local', methods=['POST'])
+def buscar_vectorial_local():
+    """
+    Búsqueda semántica en el índice local: recibe 'texto' y opcionalmente 'size'
+    (máx. 100). Devuelve un resultado por documento con su pasaje más cercano
+    """
+    try:
+        inicio = time.perf_counter()
+        data = request.get_json() or {}
+        texto_buscar = data.get("texto", "").strip()
+        if not texto_buscar:
+            return jsonify({"success": False, "error": "No se envió texto a buscar"}), 400
+        size = max(1, min(int(data.get("size", 20)), 100))
+
+        vector = vector_consulta(texto_buscar)
+        inicio_busqueda = time.perf_counter()
+        encontrados = obtener_indice_vectorial().buscar(vector, k=size, nprobe=INDICE_VECTORIAL_NPROBE,
+                                                        agrupar_por='id_padre')
+        busqueda_ms = round((time.perf_counter() - inicio_busqueda) * 1000, 2)
+
+        hits = [{"_id": metadatos.get('id_padre', pasaje_id), "_score": round(similitud, 4),
+                 "_source": {c: v for c, v in metadatos.items() if c not in ('id_padre', 'numero')},
+                 "pasaje": metadatos.get('numero')}
+                for pasaje_id, similitud, metadatos in encontrados]
+        return jsonify({"success": True, "hits": hits, "total": len(hits), "busqueda_ms": busqueda_ms,
+                        "servidor_ms": round((time.perf_counter() - inicio) * 1000, 1)})
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 #### RUTA CARGAR DOCUMENTOS A ELASTIC ###
 @app.route('/cargar_doc_elastic')
 def cargar_doc_elastic():
@@ -368,9 +998,131 @@ def cargar_doc_elastic():
     return render_template('documentos_elastic.html', usuario=session.get('usuario'), permisos=permisos, version=VERSION_APP, creador=CREATOR_APP)
 
 ### RUTA PROCESAR WEBSCRAPING A ELASTIC ###
+def ejecutar_webscraping(url: str, lista_ext_navegar: list, lista_tipos_archivos: list,
+                         incremental: bool = True, trabajo=None, reanudar: bool = True) -> dict:
+    """
+    Crawl + descarga de archivos; se ejecuta en la petición o como trabajo en segundo plano.
+    En modo incremental se conservan los archivos y enlaces previos, se usan GET
+    condicionales y solo se devuelven los archivos nuevos o modificados. Con
+    reanudar, un crawl anterior de la misma URL que agotó las iteraciones continúa
+    donde quedó.
+    """
+    # Combinar ambas listas para extraer todos los enlaces
+    todas_extensiones = lista_ext_navegar + lista_tipos_archivos
+    
+    # Inicializar WebScraping
+    scraper = WebScraping(dominio_base=url.rsplit('/', 1)[0] + '/',
+                          concurrencia=CRAWL_CONCURRENCIA,
+                          peticiones_por_segundo=CRAWL_PETICIONES_POR_SEGUNDO,
+                          descargas_simultaneas=DESCARGAS_SIMULTANEAS,
+                          usar_navegador=CRAWL_USAR_NAVEGADOR)
+    
+    carpeta_upload = 'static/uploads'
+    Funciones.crear_carpeta(carpeta_upload)
+    manifiesto = None
+    if incremental:
+        manifiesto = ManifiestoCrawl(MANIFIESTO_CRAWL)
+    else:
+        # Limpiar carpeta de uploads
+        Funciones.borrar_contenido_carpeta(carpeta_upload)
+    
+    try:
+        # Extraer todos los enlaces
+        json_path = os.path.join(carpeta_upload, 'links.json')
+        resultado = scraper.extraer_todos_los_links(
+            url_inicial=url,
+            json_file_path=json_path,
+            listado_extensiones=todas_extensiones,
+            max_iteraciones=50,
+            reanudar=reanudar,
+            trabajo=trabajo
+        )
+        
+        if not resultado['success']:
+            return {'success': False, 'error': 'Error al extraer enlaces'}
+        
+        # Descargar archivos PDF (o los tipos especificados)
+        resultado_descarga = scraper.descargar_pdfs(json_path, carpeta_upload, trabajo=trabajo,
+                                                    manifiesto=manifiesto)
+    finally:
+        scraper.close()
+    
+    if incremental:
+        # Solo lo nuevo o modificado sigue hacia extracción e indexación
+        archivos = resultado_descarga.get('nuevos', [])
+        mensaje = (f"{len(archivos)} archivos nuevos o modificados, "
+                   f"{resultado_descarga.get('sin_cambios', 0)} sin cambios")
+    else:
+        # Listar archivos descargados
+        archivos = Funciones.listar_archivos_carpeta(carpeta_upload, lista_tipos_archivos)
+        mensaje = f'Se descargaron {len(archivos)} archivos'
+    
+    return {
+        'success': True,
+        'archivos': archivos,
+        'mensaje': mensaje,
+        'stats': {
+            'total_enlaces': resultado['total_links'],
+            'descargados': resultado_descarga.get('descargados', 0),
+            'sin_cambios': resultado_descarga.get('sin_cambios', 0),
+            'errores': resultado_descarga.get('errores', 0)
+        }
+    }
+
+def ejecutar_pipeline_webscraping(url: str, lista_ext_navegar: list, lista_tipos_archivos: list,
+                                  index: str, incremental: bool = True, trabajo=None,
+                                  reanudar: bool = True) -> dict:
+    """
+    Crawl, descarga, extracción e indexación solapados (PipelineIngesta): cada PDF
+    descubierto se descarga, extrae e indexa sin esperar a que termine el crawl
+    """
+    scraper = WebScraping(dominio_base=url.rsplit('/', 1)[0] + '/',
+                          concurrencia=CRAWL_CONCURRENCIA,
+                          peticiones_por_segundo=CRAWL_PETICIONES_POR_SEGUNDO,
+                          descargas_simultaneas=DESCARGAS_SIMULTANEAS,
+                          usar_navegador=CRAWL_USAR_NAVEGADOR)
+
+    carpeta_upload = 'static/uploads'
+    Funciones.crear_carpeta(carpeta_upload)
+    manifiesto = None
+    if incremental:
+        manifiesto = ManifiestoCrawl(MANIFIESTO_CRAWL)
+    else:
+        Funciones.borrar_contenido_carpeta(carpeta_upload)
+
+    pipeline = PipelineIngesta(scraper, elastic, index,
+                               carpeta_destino=carpeta_upload,
+                               manifiesto=manifiesto,
+                               tipos_archivos=lista_tipos_archivos,
+                               tam_cola=EXTRACCION_COLA,
+                               procesos_extraccion=EXTRACCION_PROCESOS,
+                               max_tareas_por_hijo=EXTRACCION_TAREAS_POR_HIJO,
+                               hilos_bulk=BULK_HILOS,
+                               max_mb_por_lote=BULK_MAX_MB,
+                               took_objetivo_ms=BULK_TOOK_OBJETIVO_MS,
+                               carga_masiva_desde=CARGA_MASIVA_MIN_DOCUMENTOS or None,
+                               force_merge=CARGA_MASIVA_FORCE_MERGE,
+                               fragmentos=FRAGMENTOS_HABILITADOS,
+                               deduplicador=deduplicador,
+                               op_type=BULK_OP_TYPE,
+                               estrategia_id=BULK_ESTRATEGIA_ID,
+                               vectorizador=vectorizar_textos if EMBEDDINGS_HABILITADOS else None,
+                               buscador_local=buscador_local)
+    try:
+        resultado = pipeline.ejecutar(url, os.path.join(carpeta_upload, 'links.json'),
+                                      lista_ext_navegar + lista_tipos_archivos,
+                                      max_iteraciones=50, trabajo=trabajo, reanudar=reanudar)
+    finally:
+        scraper.close()
+
+    resultado['mensaje'] = (f"{resultado['indexados']} documentos indexados de "
+                            f"{resultado['nuevos']} archivos nuevos o modificados "
+                            f"({resultado['sin_cambios']} sin cambios)")
+    return resultado
+
 @app.route('/procesar-webscraping-elastic', methods=['POST'])
 def procesar_webscraping_elastic():
-    """API para procesar Web Scraping"""
+    """API para procesar Web Scraping (con 'asincrono': true se ejecuta como trabajo)"""
     try:
         if not session.get('logged_in'):
             return jsonify({'success': False, 'error': 'No autorizado'}), 401
@@ -384,6 +1136,8 @@ def procesar_webscraping_elastic():
         extensiones_navegar = data.get('extensiones_navegar', 'aspx')
         tipos_archivos = data.get('tipos_archivos', 'pdf')
         index = data.get('index')
+        incremental = data.get('incremental', True)
+        reanudar = data.get('reanudar', True)
         
         if not url or not index:
             return jsonify({'success': False, 'error': 'URL e índice son requeridos'}), 400
@@ -392,47 +1146,31 @@ def procesar_webscraping_elastic():
         lista_ext_navegar = [ext.strip() for ext in extensiones_navegar.split(',')]
         lista_tipos_archivos = [ext.strip() for ext in tipos_archivos.split(',')]
         
-        # Combinar ambas listas para extraer todos los enlaces
-        todas_extensiones = lista_ext_navegar + lista_tipos_archivos
-        
-        # Inicializar WebScraping
-        scraper = WebScraping(dominio_base=url.rsplit('/', 1)[0] + '/')
-        
-        # Limpiar carpeta de uploads
-        carpeta_upload = 'static/uploads'
-        Funciones.crear_carpeta(carpeta_upload)
-        Funciones.borrar_contenido_carpeta(carpeta_upload)
-        
-        # Extraer todos los enlaces
-        json_path = os.path.join(carpeta_upload, 'links.json')
-        resultado = scraper.extraer_todos_los_links(
-            url_inicial=url,
-            json_file_path=json_path,
-            listado_extensiones=todas_extensiones,
-            max_iteraciones=50
-        )
-        
-        if not resultado['success']:
-            return jsonify({'success': False, 'error': 'Error al extraer enlaces'}), 500
-        
-        # Descargar archivos PDF (o los tipos especificados)
-        resultado_descarga = scraper.descargar_pdfs(json_path, carpeta_upload)
-        
-        scraper.close()
+        if data.get('indexar'):
+            # Todo en una sola pasada: no hay selección manual de archivos
+            if data.get('asincrono'):
+                trabajo = trabajos.enviar('webscraping_pipeline', ejecutar_pipeline_webscraping, url,
+                                          lista_ext_navegar, lista_tipos_archivos, index, incremental,
+                                          reanudar=reanudar,
+                                          parametros={'url': url, 'index': index,
+                                                      'incremental': incremental, 'reanudar': reanudar})
+                return jsonify({'success': True, 'trabajo_id': trabajo.id}), 202
+
+            resultado = ejecutar_pipeline_webscraping(url, lista_ext_navegar, lista_tipos_archivos,
+                                                      index, incremental, reanudar=reanudar)
+            return jsonify(resultado), (200 if resultado['success'] else 500)
         
-        # Listar archivos descargados
-        archivos = Funciones.listar_archivos_carpeta(carpeta_upload, lista_tipos_archivos)
+        if data.get('asincrono'):
+            trabajo = trabajos.enviar('webscraping', ejecutar_webscraping, url,
+                                      lista_ext_navegar, lista_tipos_archivos, incremental,
+                                      reanudar=reanudar,
+                                      parametros={'url': url, 'index': index,
+                                                  'incremental': incremental, 'reanudar': reanudar})
+            return jsonify({'success': True, 'trabajo_id': trabajo.id}), 202
         
-        return jsonify({
-            'success': True,
-            'archivos': archivos,
-            'mensaje': f'Se descargaron {len(archivos)} archivos',
-            'stats': {
-                'total_enlaces': resultado['total_links'],
-                'descargados': resultado_descarga.get('descargados', 0),
-                'errores': resultado_descarga.get('errores', 0)
-            }
-        })
+        resultado = ejecutar_webscraping(url, lista_ext_navegar, lista_tipos_archivos, incremental,
+                                         reanudar=reanudar)
+        return jsonify(resultado), (200 if resultado['success'] else 500)
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -472,14 +1210,9 @@ def procesar_zip_elastic():
         file.save(zip_path)
         print(f"Archivo ZIP guardado en: {zip_path}")
         
-        # Descomprimir ZIP
-        archivos = Funciones.descomprimir_zip_local(zip_path, carpeta_upload)
-        
-        # Eliminar archivo ZIP
-        os.remove(zip_path)
-        
-        # Listar archivos JSON
-        archivos_json = Funciones.listar_archivos_json(carpeta_upload)
+        # Listar archivos JSON sin descomprimir: la carga los lee directamente del ZIP,
+        # que se conserva en la carpeta de uploads hasta la siguiente subida
+        archivos_json = Funciones.listar_miembros_zip(zip_path, ['json'])
         
         return jsonify({
             'success': True,
@@ -492,6 +1225,12 @@ def procesar_zip_elastic():
 
 
 ###RUTA DE SUBIR PDF A ELASTIC###
+def ejecutar_pdf_zip(filepath: str, trabajo=None) -> dict:
+    """Extrae el texto de los PDFs de un ZIP; se ejecuta en la petición o como trabajo"""
+    # Solo procesar los PDFs del ZIP, sin indexarlos todavía
+    archivos_procesados = Funciones.procesar_zip_pdfs(filepath, num_procesos=EXTRACCION_PROCESOS, trabajo=trabajo)  # devuelve lista con {"nombre", "texto", "extension", "tamaño"}
+    return {"success": True, "archivos": archivos_procesados, "mensaje": f"Se procesaron {len(archivos_procesados)} PDFs."}
+
 @app.route('/procesar-pdf-zip-elastic', methods=['POST'])
 def procesar_pdf_zip_elastic():
     if 'file' not in request.files:
@@ -507,15 +1246,77 @@ def procesar_pdf_zip_elastic():
         file.save(filepath)
 
         try:
-            # Solo procesar los PDFs del ZIP, sin indexarlos todavía
-            archivos_procesados = Funciones.procesar_zip_pdfs(filepath)  # devuelve lista con {"nombre", "texto", "extension", "tamaño"}
-            return jsonify({"success": True, "archivos": archivos_procesados, "mensaje": f"Se procesaron {len(archivos_procesados)} PDFs."})
+            if request.form.get('asincrono', '').lower() in ('1', 'true'):
+                trabajo = trabajos.enviar('pdf_zip', ejecutar_pdf_zip, filepath,
+                                          parametros={'archivo': filename})
+                return jsonify({"success": True, "trabajo_id": trabajo.id}), 202
+
+            return jsonify(ejecutar_pdf_zip(filepath))
         except Exception as e:
             return jsonify({"success": False, "error": str(e)}), 500
 
     return jsonify({"success": False, "error": "Archivo no permitido, solo ZIP"}), 400
 
 #### RUTA CARGAR DOCUMENTOS A ELASTIC ### 
+def ejecutar_carga_documentos(archivos: list, index: str, trabajo=None) -> dict:
+    """Extrae e indexa documentos en streaming; se ejecuta en la petición o como trabajo"""
+    motor = ExtraccionParalela(num_procesos=EXTRACCION_PROCESOS,
+                               max_tareas_por_hijo=EXTRACCION_TAREAS_POR_HIJO)
+
+    def extraidos():
+        for documento in motor.generar_documentos(archivos):
+            if trabajo:
+                trabajo.avanzar('extraccion')
+            yield documento
+
+    if trabajo:
+        trabajo.etapa('extraccion', total=len(archivos))
+
+    # Los casi-duplicados se resuelven en el mismo hilo productor, antes de la cola
+    duplicados = {}
+    extraidos_filtrados = extraidos()
+    if deduplicador:
+        extraidos_filtrados = deduplicador.filtrar(index, extraidos_filtrados, duplicados)
+    if buscador_local:
+        extraidos_filtrados = buscador_local.reflejar(index, extraidos_filtrados, duplicados)
+
+    # Extracción -> cola acotada -> bulk en streaming: cada documento se indexa
+    # en cuanto se extrae y solo hay EXTRACCION_COLA documentos en memoria
+    documentos = Funciones.iterar_en_segundo_plano(extraidos_filtrados, max_pendientes=EXTRACCION_COLA)
+    resultado = elastic.indexar_streaming(index, documentos, hilos=BULK_HILOS,
+                                          max_mb_por_lote=BULK_MAX_MB,
+                                          took_objetivo_ms=BULK_TOOK_OBJETIVO_MS, trabajo=trabajo,
+                                          carga_masiva_desde=CARGA_MASIVA_MIN_DOCUMENTOS or None,
+                                          force_merge=CARGA_MASIVA_FORCE_MERGE,
+                                          fragmentos=FRAGMENTOS_HABILITADOS,
+                                          op_type=BULK_OP_TYPE, estrategia_id=BULK_ESTRATEGIA_ID,
+                                          vectorizador=vectorizar_textos if EMBEDDINGS_HABILITADOS else None)
+
+    if not resultado['success']:
+        return {'success': False, 'error': resultado.get('error')}
+
+    procesados = (resultado['indexados'] + resultado['sin_cambios'] + resultado['existentes'] +
+                  resultado['errores'] + duplicados.get('duplicados', 0))
+    if procesados == 0:
+        return {'success': False, 'error': 'No se pudieron procesar documentos'}
+
+    return {
+        'success': resultado['success'],
+        'indexados': resultado['indexados'],
+        'creados': resultado['creados'],
+        'actualizados': resultado['actualizados'],
+        'sin_cambios': resultado['sin_cambios'],
+        'existentes': resultado['existentes'],
+        'fragmentos': resultado['fragmentos'],
+        'errores': resultado['errores'],
+        'errores_detalle': resultado['errores_detalle'],
+        'documentos': resultado['documentos'],
+        'duplicados': duplicados.get('duplicados', 0),
+        'buscador_local': duplicados.get('buscador_local', 0),
+        'bulk': resultado['bulk'],
+        'carga_masiva': resultado['carga_masiva']
+    }
+
 @app.route('/cargar-documentos-elastic', methods=['POST'])
 def cargar_documentos_elastic():
     """API para cargar documentos a ElasticSearch (JSON, PDFs de web scraping o ZIP)"""
@@ -535,71 +1336,59 @@ def cargar_documentos_elastic():
         if not archivos or not index:
             return jsonify({'success': False, 'error': 'Archivos e índice son requeridos'}), 400
 
-        documentos = []
-
-        for archivo in archivos:
-            ruta = archivo.get('ruta')
-            nombre = archivo.get('nombre', '')
-            extension = archivo.get('extension', '').lower()
-
-            if not ruta or not os.path.exists(ruta):
-                continue
-
-            texto = ""
-            if extension == 'json':
-                doc = Funciones.leer_json(ruta)
-                if doc:
-                    documentos.append(doc)
-                continue  # saltar al siguiente archivo
-
-            elif extension == 'pdf':
-                # Intentar extracción normal
-                texto = Funciones.extraer_texto_pdf(ruta)
-                # Si el texto es demasiado corto, intentar OCR
-                if not texto or len(texto.strip()) < 50:
-                    try:
-                        texto = Funciones.extraer_texto_pdf_ocr(ruta)
-                    except:
-                        pass
-
-            elif extension == 'txt':
-                try:
-                    with open(ruta, 'r', encoding='utf-8') as f:
-                        texto = f.read()
-                except:
-                    try:
-                        with open(ruta, 'r', encoding='latin-1') as f:
-                            texto = f.read()
-                    except:
-                        pass
-
-            if not texto or len(texto.strip()) < 50:
-                continue
-
-            # Crear documento estándar para Elastic
-            documento = {
-                'texto_completo': texto,
-                'nombre_archivo': nombre,
-                'ruta': ruta,
-                'fecha': datetime.now().isoformat()
-            }
-            documentos.append(documento)
-
-        if not documentos:
-            return jsonify({'success': False, 'error': 'No se pudieron procesar documentos'}), 400
+        if data.get('asincrono'):
+            trabajo = trabajos.enviar('carga_documentos', ejecutar_carga_documentos, archivos, index,
+                                      parametros={'index': index, 'metodo': metodo,
+                                                  'archivos': len(archivos)})
+            return jsonify({'success': True, 'trabajo_id': trabajo.id}), 202
 
-        # Indexar documentos en Elastic
-        resultado = elastic.indexar_bulk(index, documentos)
-
-        return jsonify({
-            'success': resultado['success'],
-            'indexados': resultado['indexados'],
-            'errores': resultado['fallidos']
-        })
+        resultado = ejecutar_carga_documentos(archivos, index)
+        if not resultado['success']:
+            codigo = 400 if resultado.get('error') == 'No se pudieron procesar documentos' else 500
+            return jsonify(resultado), codigo
+        return jsonify(resultado)
 
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
+#### RUTAS DE TRABAJOS DE INGESTA ####
+def _validar_permiso_trabajos():
+    """Retorna una respuesta de error si la sesión no puede consultar trabajos, o None"""
+    if not session.get('logged_in'):
+        return jsonify({'success': False, 'error': 'No autorizado'}), 401
+    if not session.get('permisos', {}).get('admin_data_elastic'):
+        return jsonify({'success': False, 'error': 'No tiene permisos para cargar datos'}), 403
+    return None
+
+@app.route('/trabajos')
+def listar_trabajos():
+    """API para listar los trabajos de ingesta de todos los workers"""
+    error = _validar_permiso_trabajos()
+    if error:
+        return error
+    return jsonify({'success': True, 'trabajos': trabajos.listar()})
+
+@app.route('/trabajos/<trabajo_id>')
+def estado_trabajo(trabajo_id):
+    """API para consultar el progreso de un trabajo por etapa"""
+    error = _validar_permiso_trabajos()
+    if error:
+        return error
+    trabajo = trabajos.estado(trabajo_id)
+    if not trabajo:
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado'}), 404
+    return jsonify({'success': True, 'trabajo': trabajo})
+
+@app.route('/trabajos/<trabajo_id>/cancelar', methods=['POST'])
+def cancelar_trabajo(trabajo_id):
+    """API para cancelar un trabajo en cola o en curso"""
+    error = _validar_permiso_trabajos()
+    if error:
+        return error
+    if not trabajos.cancelar(trabajo_id):
+        return jsonify({'success': False, 'error': 'Trabajo no encontrado o ya finalizado'}), 404
+    return jsonify({'success': True})
+
 ########################## RUTAS DE ELASTIC FIN ##########################
 
 #### RUTA DE ADMIN ####
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Las pruebas importan Helpers desde la raíz del repositorio
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -0,0 +1,131 @@
+import pytest
+
+from Helpers.buscadorLocal import BuscadorLocal
+
+DOCUMENTOS = [
+    {'id_documento': "d1", 'titulo': "Decreto 1072",
+     'texto_completo': "Por medio del cual se expide el Decreto Único Reglamentario del Sector Trabajo",
+     'tipo_documento': "pdf", 'fecha_extraccion': "2021-05-01T10:00:00"},
+    {'id_documento': "d2", 'titulo': "Circular",
+     'texto_completo': "El decreto reglamentario único fue modificado por la circular",
+     'tipo_documento': "pdf", 'fecha_extraccion': "2022-03-01T10:00:00"},
+    {'id_documento': "d3", 'titulo': "Resolución",
+     'texto_completo': "Se expide el decreto sobre el sector salud, único y reglamentario",
+     'tipo_documento': "docx", 'fecha_extraccion': "2021-08-01T10:00:00"},
+]
+
+
+@pytest.fixture
+def buscador(tmp_path):
+    buscador = BuscadorLocal(str(tmp_path))
+    assert buscador.indexar("idx", DOCUMENTOS)['indexados'] == 3
+    return buscador
+
+
+def ids(resultado):
+    assert resultado['success'], resultado.get('error')
+    return sorted(hit['_id'] for hit in resultado['resultados'])
+
+
+def frase(texto, slop=0):
+    return {"query": {"match_phrase": {"texto_completo": {"query": texto, "slop": slop}}}}
+
+
+def test_raiz_light_spanish():
+    assert BuscadorLocal.raiz("decretos") == "decret"
+    assert BuscadorLocal.raiz("resoluciones") == "resolucion"
+    assert BuscadorLocal.raiz("luces") == "luz"
+    assert BuscadorLocal.raiz("meses") == "mes"
+    assert BuscadorLocal.raiz("sol") == "sol"
+
+
+def test_analizar_conserva_posiciones_de_palabras_vacias():
+    assert BuscadorLocal.analizar("El Decreto de la Nación") == [("decret", 1), ("nacion", 4)]
+
+
+def test_frase_exacta(buscador):
+    assert ids(buscador.buscar("idx", frase("decreto único reglamentario"))) == ["d1"]
+    # Una sola palabra no necesita posiciones
+    assert ids(buscador.buscar("idx", frase("decretos"))) == ["d1", "d2", "d3"]
+
+
+def test_frase_con_slop(buscador):
+    # En d3 'único' está 4 posiciones más lejos y 'reglamentario' 1 más: holgura 5
+    assert ids(buscador.buscar("idx", frase("decreto único reglamentario", slop=4))) == ["d1"]
+    assert ids(buscador.buscar("idx", frase("decreto único reglamentario", slop=5))) == ["d1", "d3"]
+    # El slop no invierte el orden (d2 dice 'reglamentario único')
+    assert ids(buscador.buscar("idx", frase("decreto único reglamentario", slop=10))) == ["d1", "d3"]
+
+
+def test_frase_cuenta_las_palabras_vacias(buscador):
+    assert ids(buscador.buscar("idx", frase("expide el decreto"))) == ["d1", "d3"]
+    assert ids(buscador.buscar("idx", frase("expide decreto"))) == []
+    assert ids(buscador.buscar("idx", frase("expide decreto", slop=1))) == ["d1", "d3"]
+
+
+def test_bm25_prefiere_el_termino_mas_frecuente(tmp_path):
+    buscador = BuscadorLocal(str(tmp_path))
+    buscador.indexar("idx", [{'id_documento': "una", 'texto_completo': "tutela salud pensión"},
+                             {'id_documento': "varias", 'texto_completo': "tutela tutela tutela salud"}])
+    resultado = buscador.buscar("idx", {"query": {"match": {"texto_completo": "tutela"}}})
+    assert [hit['_id'] for hit in resultado['resultados']] == ["varias", "una"]
+
+
+def test_filtros_y_agregaciones(buscador):
+    consulta = {"query": {"bool": {
+        "must": [{"match": {"texto_completo": "decreto"}}],
+        "filter": [{"terms": {"tipo_documento.keyword": ["pdf"]}},
+                   {"range": {"fecha_extraccion": {"gte": "2021-01-01", "lt": "2021-01-01||+1y"}}}]}}}
+    aggs = {"por_tipo": {"terms": {"field": "tipo_documento.keyword"}}}
+    resultado = buscador.buscar("idx", consulta)
+    assert ids(resultado) == ["d1"]
+
+    resultado = buscador.buscar("idx", {"query": {"match": {"texto_completo": "decreto"}}}, aggs=aggs)
+    assert {b['key']: b['doc_count'] for b in resultado['aggs']['por_tipo']['buckets']} == {'pdf': 2, 'docx': 1}
+
+
+def test_consulta_no_soportada(buscador):
+    resultado = buscador.buscar("idx", {"query": {"geo_shape": {}}})
+    assert not resultado['success'] and 'geo_shape' in resultado['error']
+
+
+def test_reemplazo_y_documentos_sin_cambios(tmp_path, buscador):
+    # Volver a indexar lo mismo (aunque cambie la fecha de carga) no deja filas muertas
+    assert buscador.indexar("idx", [{**d, 'fecha': "2025-01-01"} for d in DOCUMENTOS])['indexados'] == 0
+    assert buscador.estadisticas("idx")['borrados'] == 0
+
+    modificado = {**DOCUMENTOS[1], 'texto_completo': "Texto nuevo sin la palabra buscada"}
+    assert buscador.indexar("idx", [modificado])['indexados'] == 1
+    assert ids(buscador.buscar("idx", frase("decreto"))) == ["d1", "d3"]
+    assert buscador.estadisticas("idx")['documentos'] == 3
+
+    # Persistido en SQLite: otra instancia ve lo mismo
+    otro = BuscadorLocal(str(tmp_path))
+    assert ids(otro.buscar("idx", frase("texto nuevo"))) == ["d2"]
+    assert otro.indexar("idx", [modificado])['indexados'] == 0
+
+
+def test_optimizar_automatico(tmp_path):
+    buscador = BuscadorLocal(str(tmp_path), max_proporcion_borrados=0.3)
+    buscador.indexar("idx", DOCUMENTOS)
+    buscador.indexar("idx", [{**DOCUMENTOS[0], 'titulo': "Otro título"}])
+    # 1 borrado de 4 filas (25 %) todavía no optimiza
+    assert buscador.estadisticas("idx")['borrados'] == 1
+
+    buscador.eliminar("idx", ["d2"])
+    buscador.indexar("idx", [{**DOCUMENTOS[2], 'titulo': "Otra resolución"}])
+    estadisticas = buscador.estadisticas("idx")
+    assert estadisticas['borrados'] == 0 and estadisticas['documentos'] == 2 and estadisticas['segmentos'] == 1
+    assert ids(buscador.buscar("idx", frase("decreto único reglamentario"))) == ["d1"]
+
+
+def test_reflejar_deja_pasar_el_flujo(tmp_path):
+    buscador = BuscadorLocal(str(tmp_path))
+    estadisticas = {}
+    salida = list(buscador.reflejar("idx", iter(DOCUMENTOS), estadisticas, tam_segmento=2))
+    assert salida == DOCUMENTOS
+    assert estadisticas == {'buscador_local': 3}
+
+    estadisticas = {}
+    list(buscador.reflejar("idx", iter(DOCUMENTOS), estadisticas))
+    assert estadisticas == {'buscador_local': 0}
@@ -0,0 +1,115 @@
+import threading
+import time
+
+import pytest
+
+from Helpers import cacheConsultas
+from Helpers.cacheConsultas import CacheConsultas
+
+
+class Reloj:
+    def __init__(self):
+        self.ahora = 1000.0
+
+    def __call__(self):
+        return self.ahora
+
+
+@pytest.fixture
+def reloj(monkeypatch):
+    reloj = Reloj()
+    monkeypatch.setattr(cacheConsultas.time, 'monotonic', reloj)
+    return reloj
+
+
+def test_clave_normaliza_el_texto():
+    assert CacheConsultas.clave("  Decreto\tÚnico ", size=10) == CacheConsultas.clave("decreto único", size=10)
+    assert CacheConsultas.clave("decreto", size=10) != CacheConsultas.clave("decreto", size=20)
+    assert CacheConsultas.clave("canción") != CacheConsultas.clave("cancion")
+
+
+def test_acierto_y_vencimiento(reloj):
+    cache = CacheConsultas(ttl=60)
+    assert cache.obtener("a", lambda: 1) == (1, 'fallo')
+    assert cache.obtener("a", lambda: 2) == (1, 'acierto')
+
+    reloj.ahora += 61
+    assert cache.obtener("a", lambda: 3) == (3, 'fallo')
+    assert cache.estadisticas()['expiradas'] == 1
+
+
+def test_descarta_el_menos_usado():
+    cache = CacheConsultas(max_entradas=2)
+    cache.obtener("a", lambda: 1)
+    cache.obtener("b", lambda: 2)
+    cache.obtener("a", lambda: 1)
+    cache.obtener("c", lambda: 3)
+    assert cache.consultar(["a", "b", "c"]) == {"a": 1, "c": 3}
+
+
+def test_invalidar_descarta_todo():
+    cache = CacheConsultas()
+    cache.obtener("a", lambda: 1)
+    generacion = cache.generacion
+    cache.invalidar("indice")
+    assert cache.generacion != generacion
+    assert cache.obtener("a", lambda: 2) == (2, 'fallo')
+
+
+def test_resultado_calculado_durante_una_invalidacion_no_se_guarda():
+    cache = CacheConsultas()
+
+    def calcular():
+        cache.invalidar()
+        return "viejo"
+
+    assert cache.obtener("a", calcular) == ("viejo", 'fallo')
+    assert cache.consultar(["a"]) == {}
+
+    generacion = cache.generacion
+    cache.invalidar()
+    cache.guardar({"b": 1}, generacion)
+    assert cache.consultar(["b"]) == {}
+
+
+def test_errores_y_resultados_rechazados_no_se_guardan():
+    cache = CacheConsultas()
+
+    def falla():
+        raise RuntimeError("sin conexión")
+
+    with pytest.raises(RuntimeError):
+        cache.obtener("a", falla)
+    assert cache.obtener("a", lambda: 1) == (1, 'fallo')
+
+    local = {'backend': 'local'}
+    assert cache.obtener("b", lambda: local, guardar=lambda r: r['backend'] != 'local') == (local, 'fallo')
+    assert cache.consultar(["b"]) == {}
+
+
+def test_peticiones_simultaneas_calculan_una_vez():
+    cache = CacheConsultas()
+    empezo, seguir = threading.Event(), threading.Event()
+    llamadas = []
+
+    def lento():
+        llamadas.append(1)
+        empezo.set()
+        seguir.wait(5)
+        return "resultado"
+
+    origenes = []
+    primera = threading.Thread(target=lambda: origenes.append(cache.obtener("a", lento)[1]))
+    primera.start()
+    empezo.wait(5)
+    otras = [threading.Thread(target=lambda: origenes.append(cache.obtener("a", lento)[1])) for _ in range(3)]
+    for hilo in otras:
+        hilo.start()
+    while cache.estadisticas()['coalescidas'] < 3:
+        time.sleep(0.01)
+    seguir.set()
+    for hilo in [primera] + otras:
+        hilo.join(5)
+
+    assert len(llamadas) == 1
+    assert sorted(origenes) == ['coalescida'] * 3 + ['fallo']
@@ -0,0 +1,89 @@
+import random
+
+import pytest
+
+from Helpers.deduplicacion import DetectorDuplicados
+
+
+def texto(semilla: int, palabras: int = 400) -> str:
+    rng = random.Random(semilla)
+    return " ".join(f"palabra{rng.randrange(5000)}" for _ in range(palabras))
+
+
+@pytest.fixture
+def original():
+    return texto(1)
+
+
+@pytest.fixture
+def copia(original):
+    # Casi idéntica: cambia una palabra al final
+    palabras = original.split()
+    palabras[-1] = "distinta"
+    return " ".join(palabras)
+
+
+def test_clasifica_original_copia_y_distinto(tmp_path, original, copia):
+    detector = DetectorDuplicados(str(tmp_path / "dup.db"))
+    assert detector.clasificar("idx", "a", original) == {'duplicado': False, 'grupo': 'a', 'similitud': 1.0}
+
+    resultado = detector.clasificar("idx", "b", copia)
+    assert resultado['duplicado'] and resultado['grupo'] == "a"
+    assert resultado['similitud'] >= detector.umbral
+
+    assert not detector.clasificar("idx", "c", texto(2))['duplicado']
+    # Las firmas se comparan solo dentro del mismo índice
+    assert not detector.clasificar("otro", "b", copia)['duplicado']
+    assert detector.estadisticas("idx") == {'documentos': 3, 'duplicados': 1, 'grupos': 2}
+
+
+def test_recarga_conserva_la_clasificacion(tmp_path, original, copia):
+    detector = DetectorDuplicados(str(tmp_path / "dup.db"))
+    detector.clasificar("idx", "a", original)
+    detector.clasificar("idx", "b", copia)
+    assert detector.clasificar("idx", "b", copia)['grupo'] == "a"
+    assert detector.estadisticas("idx")['documentos'] == 2
+
+
+def test_copia_de_un_original_borrado_se_reclasifica(tmp_path, original, copia):
+    existentes = {"a"}
+    detector = DetectorDuplicados(str(tmp_path / "dup.db"), vigencia_sin_verificar=0,
+                                  existe_original=lambda indice, id_documento: id_documento in existentes)
+    detector.clasificar("idx", "a", original)
+    assert detector.clasificar("idx", "b", copia)['duplicado']
+
+    existentes.clear()
+    assert detector.clasificar("idx", "b", copia) == {'duplicado': False, 'grupo': 'b', 'similitud': 1.0}
+    assert detector.grupo("idx", "a") == []
+
+
+def test_error_al_verificar_mantiene_la_clasificacion(tmp_path, original, copia):
+    def sin_conexion(indice, id_documento):
+        raise ConnectionError("Elastic no disponible")
+
+    detector = DetectorDuplicados(str(tmp_path / "dup.db"), vigencia_sin_verificar=0,
+                                  existe_original=sin_conexion)
+    detector.clasificar("idx", "a", original)
+    assert detector.clasificar("idx", "b", copia)['grupo'] == "a"
+
+
+def test_filtrar_segun_modo(tmp_path, original, copia):
+    documentos = [{'id_documento': "a", 'texto_completo': original},
+                  {'id_documento': "b", 'texto_completo': copia},
+                  {'id_documento': "c"}]
+
+    estadisticas = {}
+    unico = DetectorDuplicados(str(tmp_path / "unico.db"))
+    assert [d['id_documento'] for d in unico.filtrar("idx", documentos, estadisticas)] == ["a", "c"]
+    assert estadisticas == {'revisados': 2, 'duplicados': 1}
+
+    version = DetectorDuplicados(str(tmp_path / "version.db"), modo='version')
+    salida = list(version.filtrar("idx", [dict(d) for d in documentos]))
+    assert len(salida) == 3
+    assert salida[1]['version_de'] == "a" and salida[1]['grupo_duplicados'] == "a"
+    assert 'version_de' not in salida[0]
+
+
+def test_modo_invalido(tmp_path):
+    with pytest.raises(ValueError):
+        DetectorDuplicados(str(tmp_path / "dup.db"), modo='borrar')
@@ -0,0 +1,85 @@
+from Helpers.elastic import ElasticSearch
+
+
+class ClienteFalso:
+    """search() sobre 'total' hits ordenados; registra las llamadas de point-in-time"""
+
+    def __init__(self, total: int):
+        self.total = total
+        self.llamadas = []
+
+    def open_point_in_time(self, index, keep_alive):
+        self.llamadas.append(('abrir', index))
+        return {'id': 'pit-1'}
+
+    def close_point_in_time(self, id):
+        self.llamadas.append(('cerrar', id))
+
+    def search(self, **parametros):
+        self.llamadas.append(('buscar', 'pit' in parametros, parametros.get('from'), parametros.get('search_after')))
+        inicio = parametros.get('from', 0)
+        if parametros.get('search_after'):
+            inicio = parametros['search_after'][1] + 1
+        hits = [{'_id': str(i), '_score': 1.0, 'sort': [1.0, i]}
+                for i in range(inicio, min(inicio + parametros['size'], self.total))]
+        resp = {'took': 1, 'hits': {'hits': hits, 'total': {'value': self.total, 'relation': 'eq'}}}
+        if 'pit' in parametros:
+            resp['pit_id'] = parametros['pit']['id']
+        return resp
+
+
+def elastic(total: int) -> ElasticSearch:
+    # Sin conexión real: solo se reemplaza el cliente
+    instancia = ElasticSearch.__new__(ElasticSearch)
+    instancia.client = ClienteFalso(total)
+    return instancia
+
+
+def paginas(instancia: ElasticSearch, size: int):
+    cursor, ids = None, []
+    while True:
+        resultado = instancia.buscar_paginado("idx", {"match_all": {}}, size=size, cursor=cursor)
+        assert resultado['success'], resultado.get('error')
+        ids.extend(hit['_id'] for hit in resultado['hits'])
+        cursor = resultado['cursor']
+        if not cursor:
+            return ids
+
+
+def test_primera_pagina_sin_point_in_time():
+    instancia = elastic(5)
+    resultado = instancia.buscar_paginado("idx", {"match_all": {}}, size=5)
+    assert resultado['total'] == 5 and resultado['cursor'] is None
+    assert instancia.client.llamadas == [('buscar', False, None, None)]
+
+
+def test_point_in_time_desde_la_segunda_pagina():
+    instancia = elastic(25)
+    assert paginas(instancia, 10) == [str(i) for i in range(25)]
+    assert instancia.client.llamadas == [
+        ('buscar', False, None, None),
+        ('abrir', 'idx'),
+        ('buscar', True, 10, None),
+        ('buscar', True, None, [1.0, 19]),
+        ('cerrar', 'pit-1')
+    ]
+
+
+def test_cerrar_cursor_abandonado():
+    instancia = elastic(100)
+    primera = instancia.buscar_paginado("idx", {"match_all": {}}, size=10)
+    # El cursor de la primera página no tiene point-in-time que cerrar
+    assert instancia.cerrar_cursor(primera['cursor'])
+    segunda = instancia.buscar_paginado("idx", {"match_all": {}}, size=10, cursor=primera['cursor'])
+    assert instancia.cerrar_cursor(segunda['cursor'])
+    assert instancia.client.llamadas[-1] == ('cerrar', 'pit-1')
+    assert not instancia.cerrar_cursor("no-es-un-cursor")
+
+
+def test_resaltado_escapa_el_texto():
+    instancia = elastic(1)
+    enviados = []
+    buscar = instancia.client.search
+    instancia.client.search = lambda **parametros: enviados.append(parametros) or buscar(**parametros)
+    instancia.buscar_paginado("idx", {"match_all": {}}, highlight_campos=["texto_completo"])
+    assert enviados[0]["highlight"]["encoder"] == "html"
@@ -0,0 +1,43 @@
+from Helpers.fronteraURL import FronteraURL
+
+
+def test_normalizar():
+    frontera = FronteraURL()
+    assert (frontera.normalizar("HTTPS://Sitio.gov.co:443/a?b=2&utm_source=x&a=1#seccion")
+            == "https://sitio.gov.co/a?a=1&b=2")
+    assert frontera.normalizar("http://sitio.gov.co:8080") == "http://sitio.gov.co:8080/"
+    assert FronteraURL(ignorar_query=True).normalizar("https://sitio.gov.co/a?b=2") == "https://sitio.gov.co/a"
+
+
+def test_cola_por_prioridad_sin_repetidos():
+    frontera = FronteraURL(max_profundidad=1)
+    assert frontera.agregar("https://a.gov.co/", profundidad=0)
+    assert frontera.agregar("https://a.gov.co/uno", profundidad=1)
+    assert not frontera.agregar("https://a.gov.co/uno#otra", profundidad=1)
+    assert not frontera.agregar("https://a.gov.co/dos", profundidad=2)
+    assert frontera.agregar("https://a.gov.co/urgente", profundidad=1, prioridad=0)
+    assert [p['url'] for p in frontera.siguiente_lote(10)] == [
+        "https://a.gov.co/", "https://a.gov.co/urgente", "https://a.gov.co/uno"]
+    assert frontera.pendientes() == 0
+
+
+def test_checkpoint_conserva_el_recorrido(tmp_path):
+    ruta = str(tmp_path / "frontera.json")
+    frontera = FronteraURL(url_inicial="https://A.gov.co/inicio.aspx", dominio_base="https://a.gov.co/")
+    frontera.agregar("https://a.gov.co/uno.aspx", profundidad=1)
+    frontera.registrar_enlace({'url': "https://a.gov.co/doc.pdf", 'type': 'pdf'})
+    assert frontera.guardar(ruta)
+
+    cargada = FronteraURL.cargar(ruta)
+    assert cargada.pendientes() == 1
+    assert cargada.lista_enlaces() == [{'url': "https://a.gov.co/doc.pdf", 'type': 'pdf'}]
+    assert cargada.corresponde_a("https://a.gov.co/inicio.aspx", "https://a.gov.co/")
+    assert not cargada.corresponde_a("https://b.gov.co/inicio.aspx", "https://b.gov.co/")
+    assert not cargada.corresponde_a("https://a.gov.co/otra.aspx", "https://a.gov.co/")
+
+
+def test_checkpoint_sin_recorrido_no_corresponde(tmp_path):
+    ruta = str(tmp_path / "frontera.json")
+    FronteraURL().guardar(ruta)
+    assert not FronteraURL.cargar(ruta).corresponde_a("https://a.gov.co/inicio.aspx", "https://a.gov.co/")
+    assert FronteraURL.cargar(str(tmp_path / "no_existe.json")) is None
@@ -0,0 +1,93 @@
+import json
+
+from Helpers.indexadorBulk import IndexadorBulk
+
+
+class ClienteFalso:
+    """Responde _bulk como Elastic; las primeras 'rechazos' acciones reciben 429"""
+
+    def __init__(self, rechazos: int = 0, took: int = 10):
+        self.rechazos = rechazos
+        self.took = took
+        self.peticiones = []
+
+    def bulk(self, operations):
+        cabeceras = [json.loads(linea) for linea in operations if 'index' in json.loads(linea)]
+        self.peticiones.append(len(cabeceras))
+        items = []
+        for cabecera in cabeceras:
+            estado = 201
+            if self.rechazos:
+                self.rechazos -= 1
+                estado = 429
+            items.append({'index': {'_id': cabecera['index']['_id'], 'status': estado}})
+        return {'took': self.took, 'errors': False, 'items': items}
+
+
+def acciones(n: int, caracteres: int = 100):
+    return [{'_index': 'idx', '_id': str(i), '_source': {'texto': 'x' * caracteres}} for i in range(n)]
+
+
+def test_lote_limitado_por_documentos():
+    indexador = IndexadorBulk(ClienteFalso(), max_docs_por_lote=10)
+    lotes = list(indexador._lotes(acciones(25), []))
+    assert [len(lote) for lote in lotes] == [10, 10, 5]
+
+
+def test_lote_limitado_por_bytes():
+    indexador = IndexadorBulk(ClienteFalso(), max_docs_por_lote=1000, max_mb_por_lote=0.01,
+                              min_mb_por_lote=0.01)
+    lotes = list(indexador._lotes(acciones(50, caracteres=1000), []))
+    assert len(lotes) > 1
+    for lote in lotes:
+        assert sum(IndexadorBulk._tamaño(linea) for linea in lote) <= indexador.lote_bytes
+
+
+def test_documento_mayor_que_el_lote_viaja_solo():
+    indexador = IndexadorBulk(ClienteFalso(), max_mb_por_lote=0.01, min_mb_por_lote=0.01)
+    grande = {'_index': 'idx', '_id': 'grande', '_source': {'texto': 'x' * 50000}}
+    lotes = list(indexador._lotes(acciones(2) + [grande] + acciones(2), []))
+    assert [len(lote) for lote in lotes] == [2, 1, 2]
+
+
+def test_documento_mayor_que_la_peticion_se_rechaza_sin_enviar():
+    cliente = ClienteFalso()
+    indexador = IndexadorBulk(cliente, max_mb_peticion=0.01)
+    grande = {'_index': 'idx', '_id': 'grande', '_source': {'texto': 'x' * 50000}}
+    resultados = list(indexador.ejecutar(acciones(3) + [grande]))
+    assert sum(ok for ok, _ in resultados) == 3
+    fallido = [item for ok, item in resultados if not ok]
+    assert fallido == [{'index': {'_index': 'idx', '_id': 'grande', 'status': 413,
+                                  'error': 'Documento mayor que el tamaño máximo de petición'}}]
+    assert sum(cliente.peticiones) == 3
+
+
+def test_reintenta_solo_las_acciones_rechazadas():
+    cliente = ClienteFalso(rechazos=2)
+    indexador = IndexadorBulk(cliente, max_docs_por_lote=5, backoff_inicial=0)
+    resultados = list(indexador.ejecutar(acciones(5)))
+    assert len(resultados) == 5 and all(ok for ok, _ in resultados)
+    assert cliente.peticiones == [5, 2]
+    assert indexador.estadisticas()['reintentos'] == 1
+
+
+def test_agota_reintentos_y_entrega_el_error():
+    indexador = IndexadorBulk(ClienteFalso(rechazos=100), max_reintentos=2, backoff_inicial=0)
+    resultados = list(indexador.ejecutar(acciones(3)))
+    assert [ok for ok, _ in resultados] == [False] * 3
+    assert all(item['index']['status'] == 429 for _, item in resultados)
+
+
+def test_ajuste_aimd():
+    indexador = IndexadorBulk(ClienteFalso(), max_hilos=4, took_objetivo_ms=1000)
+    inicial = indexador.lote_bytes
+    for _ in range(3):
+        indexador._ajustar(100, rechazado=False)
+    assert indexador.lote_bytes > inicial and indexador.concurrencia == 2
+    assert indexador.lote_bytes <= indexador.max_bytes
+
+    indexador._ajustar(None, rechazado=True)
+    assert indexador.concurrencia == 1
+    for _ in range(50):
+        indexador._ajustar(None, rechazado=True)
+    assert indexador.lote_bytes == indexador.min_bytes
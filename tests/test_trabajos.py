@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from Helpers.trabajos import GestorTrabajos
+
+
+def esperar(condicion, limite=5.0):
+    fin = time.time() + limite
+    while time.time() < fin:
+        if condicion():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+@pytest.fixture
+def workers(tmp_path):
+    """Dos gestores que comparten la base, como dos workers de gunicorn"""
+    ruta = str(tmp_path / "trabajos.db")
+    gestores = [GestorTrabajos(max_trabajadores=1, ruta_db=ruta, intervalo=0.05) for _ in range(2)]
+    yield gestores
+    for gestor in gestores:
+        gestor.close()
+
+
+def test_otro_worker_consulta_progreso_y_resultado(workers):
+    dueño, otro = workers
+    continuar = threading.Event()
+
+    def tarea(trabajo):
+        trabajo.etapa('descarga', total=4)
+        trabajo.avanzar('descarga', 2)
+        continuar.wait(5)
+        return {'success': True}
+
+    trabajo = dueño.enviar('webscraping', tarea, parametros={'url': 'https://ejemplo.gov.co'})
+    assert otro.obtener(trabajo.id) is None
+    assert esperar(lambda: (otro.estado(trabajo.id) or {}).get('etapas', {})
+                   .get('descarga', {}).get('procesados') == 2)
+    assert otro.estado(trabajo.id)['parametros'] == {'url': 'https://ejemplo.gov.co'}
+    assert [t['id'] for t in otro.listar()] == [trabajo.id]
+
+    continuar.set()
+    assert esperar(lambda: otro.estado(trabajo.id)['estado'] == 'completado')
+    assert otro.estado(trabajo.id)['resultado'] == {'success': True}
+    assert otro.estado('inexistente') is None
+
+
+def test_otro_worker_cancela_un_trabajo_en_curso(workers):
+    dueño, otro = workers
+
+    def tarea(trabajo):
+        while True:
+            trabajo.avanzar('crawl')
+            time.sleep(0.01)
+
+    trabajo = dueño.enviar('webscraping', tarea)
+    assert esperar(lambda: trabajo.estado == 'en_curso')
+    assert otro.cancelar(trabajo.id)
+    assert esperar(lambda: otro.estado(trabajo.id)['estado'] == 'cancelado')
+    assert trabajo.estado == 'cancelado'
+    assert not otro.cancelar(trabajo.id)
+
+
+def test_trabajo_de_un_worker_detenido_se_reporta_como_error(workers):
+    dueño, otro = workers
+    continuar = threading.Event()
+    trabajo = dueño.enviar('carga', lambda trabajo: continuar.wait(5))
+    assert esperar(lambda: otro.estado(trabajo.id) is not None)
+
+    # El worker dueño deja de publicar (como si hubiera muerto)
+    dueño._detener.set()
+    otro.max_silencio = 0.2
+    assert esperar(lambda: otro.estado(trabajo.id)['estado'] == 'error')
+    continuar.set()
@@ -0,0 +1,103 @@
+from Helpers.manifiestoCrawl import ManifiestoCrawl
+from Helpers.webScraping import WebScraping
+
+
+def test_nombre_archivo_solo_depende_de_la_url():
+    url = "https://sitio.gov.co/normas/Decreto 1072.pdf?v=2"
+    assert WebScraping._nombre_archivo(url) == "Decreto_1072.pdf"
+    assert WebScraping._nombre_archivo(url) == WebScraping._nombre_archivo(url)
+    assert WebScraping._nombre_archivo("https://sitio.gov.co/descarga/informe") == "informe.pdf"
+
+
+def test_nombre_archivo_unico_agrega_sufijo_estable():
+    a = WebScraping._nombre_archivo("https://a.gov.co/x/informe.pdf", unico=True)
+    b = WebScraping._nombre_archivo("https://a.gov.co/y/informe.pdf", unico=True)
+    assert a != b
+    assert a.startswith("informe_") and a.endswith(".pdf")
+    assert a == WebScraping._nombre_archivo("https://a.gov.co/x/informe.pdf", unico=True)
+
+
+def test_nombre_archivo_drive_usa_el_id():
+    assert WebScraping._nombre_archivo("https://drive.google.com/uc?export=download&id=1AbCdEfGhIjK") == "drive_1AbCdEfGhIjK.pdf"
+    assert WebScraping._nombre_archivo("https://drive.google.com/file/d/1AbCdEfGhIjK/view") == "drive_1AbCdEfGhIjK.pdf"
+
+
+def test_asignar_nombres_no_depende_del_orden():
+    links = [{'url': "https://a.gov.co/x/informe.pdf"},
+             {'url': "https://a.gov.co/y/informe.pdf"},
+             {'url': "https://a.gov.co/z/anexo.pdf"}]
+    nombres = WebScraping._asignar_nombres(links)
+    assert len(set(nombres)) == 3
+    assert nombres[2] == "anexo.pdf"
+    assert WebScraping._asignar_nombres(links[::-1]) == nombres[::-1]
+
+
+def test_asignar_nombres_respeta_el_manifiesto(tmp_path):
+    manifiesto = ManifiestoCrawl(str(tmp_path / "manifiesto.json"))
+    manifiesto.entradas["https://a.gov.co/x/informe.pdf"] = {'archivo': str(tmp_path / "informe.pdf")}
+
+    # La URL registrada conserva su archivo; otra con el mismo nombre base no lo pisa
+    nombres = WebScraping._asignar_nombres([{'url': "https://a.gov.co/y/informe.pdf"},
+                                            {'url': "https://a.gov.co/x/informe.pdf"}], manifiesto)
+    assert nombres[1] == "informe.pdf"
+    assert nombres[0] == WebScraping._nombre_archivo("https://a.gov.co/y/informe.pdf", unico=True)
+
+
+def sitio(host: str, paginas: int):
+    """Páginas encadenadas inicio -> p1 -> p2 ..., cada una con un PDF"""
+    enlaces = {f"https://{host}/inicio.aspx": [{'url': f"https://{host}/p1.aspx", 'type': 'aspx'}]}
+    for i in range(1, paginas):
+        enlaces[f"https://{host}/p{i}.aspx"] = [{'url': f"https://{host}/p{i + 1}.aspx", 'type': 'aspx'},
+                                                {'url': f"https://{host}/doc{i}.pdf", 'type': 'pdf'}]
+    return enlaces
+
+
+def crawler(host: str, visitadas: list) -> WebScraping:
+    scraper = WebScraping(dominio_base=f"https://{host}/", concurrencia=1, peticiones_por_segundo=0)
+    enlaces = {**sitio("a.gov.co", 30), **sitio("b.gov.co", 5)}
+
+    def extract_links(url, listado_extensiones=None):
+        visitadas.append(url)
+        return enlaces.get(url, [])
+
+    scraper.extract_links = extract_links
+    return scraper
+
+
+def test_crawl_incompleto_se_reanuda(tmp_path):
+    json_path = str(tmp_path / "links.json")
+    visitadas = []
+    primero = crawler("a.gov.co", visitadas).extraer_todos_los_links(
+        "https://a.gov.co/inicio.aspx", json_path, max_iteraciones=10)
+    assert not primero['reanudado'] and primero['pendientes'] == 1
+
+    visitadas.clear()
+    segundo = crawler("a.gov.co", visitadas).extraer_todos_los_links(
+        "https://a.gov.co/inicio.aspx", json_path, max_iteraciones=10)
+    assert segundo['reanudado']
+    assert visitadas[0] == "https://a.gov.co/p10.aspx"
+
+
+def test_crawl_de_otro_sitio_no_retoma_el_anterior(tmp_path):
+    json_path = str(tmp_path / "links.json")
+    crawler("a.gov.co", []).extraer_todos_los_links("https://a.gov.co/inicio.aspx", json_path, max_iteraciones=10)
+
+    visitadas = []
+    resultado = crawler("b.gov.co", visitadas).extraer_todos_los_links(
+        "https://b.gov.co/inicio.aspx", json_path, max_iteraciones=10)
+    assert not resultado['reanudado']
+    assert visitadas[0] == "https://b.gov.co/inicio.aspx"
+    assert all(url.startswith("https://b.gov.co/") for url in visitadas)
+    # El JSON de enlaces (lo que después se descarga) tampoco arrastra el otro sitio
+    assert all(link['url'].startswith("https://b.gov.co/") for link in resultado['links'])
+
+
+def test_crawl_sin_reanudar_empieza_en_la_pagina_inicial(tmp_path):
+    json_path = str(tmp_path / "links.json")
+    crawler("a.gov.co", []).extraer_todos_los_links("https://a.gov.co/inicio.aspx", json_path, max_iteraciones=10)
+
+    visitadas = []
+    resultado = crawler("a.gov.co", visitadas).extraer_todos_los_links(
+        "https://a.gov.co/inicio.aspx", json_path, max_iteraciones=10, reanudar=False)
+    assert not resultado['reanudado']
+    assert visitadas[0] == "https://a.gov.co/inicio.aspx"